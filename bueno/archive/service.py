@@ -0,0 +1,79 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+The archive service module.
+'''
+
+from typing import (
+    List
+)
+
+from bueno.core import service
+
+from bueno.public import archive
+from bueno.public import logger
+
+
+class impl(service.Base):  # pylint: disable=invalid-name
+    '''
+    Implements the archive service.
+    '''
+    class _defaults:
+        '''
+        Convenience container for archive service defaults.
+        '''
+        desc = 'The archive service lists and extracts the members of ' \
+               'run data archives (see bueno run --archive).'
+        # The directory members are extracted to.
+        directory = '.'
+
+    def __init__(self, argv: List[str]) -> None:
+        super().__init__(impl._defaults.desc, argv)
+
+    def _addargs(self) -> None:
+        self.argp.add_argument(
+            'action',
+            type=str,
+            help='Lists (list) or extracts (extract) archive members.',
+            choices=['list', 'extract']
+        )
+
+        self.argp.add_argument(
+            '-C', '--directory',
+            type=str,
+            help='Specifies the directory members are extracted to. '
+                 f'Default: {impl._defaults.directory}',
+            default=impl._defaults.directory,
+            required=False,
+            metavar='DIR'
+        )
+
+        self.argp.add_argument(
+            'archive',
+            type=str,
+            help='Specifies the archive.'
+        )
+
+        self.argp.add_argument(
+            'members',
+            nargs='*',
+            help='Specifies the members to extract. Default: all members.'
+        )
+
+    def start(self) -> None:
+        arch = archive.Archive(self.args.archive)
+        if self.args.action == 'list':
+            for mem in arch.members():
+                logger.log(f"{mem['size']:>12} {mem['name']}")
+            return
+        names = self.args.members or None
+        for path in arch.extract(self.args.directory, names):
+            logger.log(path)
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -16,6 +16,12 @@ DATA_DIR: str = 'bueno'
 # The name used to store service logs.
 SERVICE_LOG_NAME: str = 'log.txt'
 
+# The name used to store structured (JSON lines) service logs.
+SERVICE_JSONL_LOG_NAME: str = 'log.jsonl'
+
+# The name of the directory (in the output path) staging service logs.
+SERVICE_STAGING_DIR: str = '.bueno-staging'
+
 # The bash magic used to execute commands in a sub-shell. No longer that
 # magical, but it once was... in an subtlety broken way.
 BASH_MAGIC: str = 'bash -c'
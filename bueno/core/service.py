@@ -77,6 +77,8 @@ class Factory:
     # List of supported service names.
     # Modify this list as services change.
     services = [
+        'archive',
+        'replay',
         'run'
     ]
 
@@ -0,0 +1,251 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Statistics kernels operating on columns of doubles. NumPy is used when it is
+available, falling back to (slower) pure-Python implementations otherwise.
+'''
+
+import array
+import math
+import random
+import typing
+
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Sequence,
+    Tuple
+)
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None  # type: ignore
+
+# The array type code used for all columns.
+TYPECODE: str = 'd'
+
+# Type alias for columns.
+if typing.TYPE_CHECKING:
+    Column = array.array[float]
+else:
+    Column = array.array
+
+
+def have_numpy() -> bool:
+    '''
+    Returns whether or not NumPy is available.
+    '''
+    return numpy is not None
+
+
+def column(values: Iterable[float] = ()) -> Column:
+    '''
+    Returns a new column populated with the provided values.
+    '''
+    col: Column = array.array(TYPECODE)
+    extend(col, values)
+    return col
+
+
+def extend(col: Column, values: Iterable[float]) -> None:
+    '''
+    Appends the provided values to col. NumPy arrays are appended as raw bytes,
+    avoiding per-element conversions.
+    '''
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        vals = numpy.ascontiguousarray(values, dtype=numpy.float64)
+        col.frombytes(vals.tobytes())
+        return
+    col.extend(float(v) for v in values)
+
+
+def concat(cols: Sequence[Column]) -> Column:
+    '''
+    Returns a new column containing the concatenation of the provided columns.
+    '''
+    res: Column = array.array(TYPECODE)
+    for col in cols:
+        res.extend(col)
+    return res
+
+
+def view(col: Column) -> Any:
+    '''
+    Returns a zero-copy NumPy view of col if NumPy is available. Otherwise, col
+    is returned.
+    '''
+    if numpy is None:
+        return col
+    return numpy.frombuffer(col, dtype=numpy.float64)
+
+
+def _percentiles_py(
+        svals: Sequence[float],
+        pcts: Sequence[float]
+) -> List[float]:
+    '''
+    Returns the requested percentiles of the sorted values using linear
+    interpolation (the NumPy default).
+    '''
+    nvals = len(svals)
+    res = []
+    for pct in pcts:
+        pos = (nvals - 1) * pct / 100.0
+        low = math.floor(pos)
+        high = math.ceil(pos)
+        res.append(svals[low] + (svals[high] - svals[low]) * (pos - low))
+    return res
+
+
+def summarize(
+        col: Column,
+        percentiles: Sequence[float] = ()
+) -> Dict[str, float]:
+    '''
+    Returns a dictionary of summary statistics for the values in col: count,
+    mean, median, stddev (sample), min, max, and any requested percentiles
+    (keyed as pN). Raises ValueError if col is empty.
+    '''
+    nvals = len(col)
+    if nvals == 0:
+        raise ValueError('Cannot summarize an empty column.')
+    for pct in percentiles:
+        if not 0.0 <= pct <= 100.0:
+            raise ValueError(f'Percentile out of range [0, 100]: {pct}')
+
+    pcts = [50.0] + [float(p) for p in percentiles]
+    if numpy is not None:
+        vals = view(col)
+        mean = float(vals.mean())
+        stddev = float(vals.std(ddof=1)) if nvals > 1 else 0.0
+        vmin = float(vals.min())
+        vmax = float(vals.max())
+        qvals = [float(q) for q in numpy.percentile(vals, pcts)]
+    else:
+        svals = sorted(col)
+        mean = math.fsum(svals) / nvals
+        stddev = 0.0
+        if nvals > 1:
+            sqs = math.fsum((v - mean) ** 2 for v in svals)
+            stddev = math.sqrt(sqs / (nvals - 1))
+        vmin = svals[0]
+        vmax = svals[-1]
+        qvals = _percentiles_py(svals, pcts)
+
+    res: Dict[str, float] = {
+        'count': nvals,
+        'mean': mean,
+        'median': qvals[0],
+        'stddev': stddev,
+        'min': vmin,
+        'max': vmax
+    }
+    for pct, qval in zip(pcts[1:], qvals[1:]):
+        res[f'p{pct:g}'] = qval
+    return res
+
+
+def median(values: Sequence[float]) -> float:
+    '''
+    Returns the median of the provided values. Raises ValueError if values is
+    empty.
+    '''
+    if len(values) == 0:
+        raise ValueError('Cannot compute the median of no values.')
+    if numpy is not None:
+        return float(numpy.median(numpy.asarray(values, dtype=numpy.float64)))
+    return _percentiles_py(sorted(values), [50.0])[0]
+
+
+def _ranks(values: Sequence[float]) -> List[float]:
+    '''
+    Returns the (1-based) ranks of the provided values, averaging ties.
+    '''
+    order = sorted(range(len(values)), key=lambda i: values[i])
+    ranks = [0.0] * len(values)
+    idx = 0
+    while idx < len(order):
+        end = idx
+        while end + 1 < len(order) and \
+                values[order[end + 1]] == values[order[idx]]:
+            end += 1
+        for jdx in range(idx, end + 1):
+            ranks[order[jdx]] = (idx + end) / 2.0 + 1.0
+        idx = end + 1
+    return ranks
+
+
+def mann_whitney_u(
+        xvals: Sequence[float],
+        yvals: Sequence[float]
+) -> Tuple[float, float]:
+    '''
+    Performs a two-sided Mann-Whitney U test, using the normal approximation
+    with tie and continuity corrections. Returns the U statistic of xvals and
+    the p-value. The approximation is crude for fewer than about eight values
+    per sample.
+    '''
+    nxs = len(xvals)
+    nys = len(yvals)
+    if nxs == 0 or nys == 0:
+        raise ValueError('Mann-Whitney U requires non-empty samples.')
+    allv = list(xvals) + list(yvals)
+    ranks = _ranks(allv)
+    ustat = sum(ranks[:nxs]) - nxs * (nxs + 1) / 2.0
+    # Tie correction.
+    counts: Dict[float, int] = {}
+    for val in allv:
+        counts[val] = counts.get(val, 0) + 1
+    ntot = nxs + nys
+    tcorr = sum(c ** 3 - c for c in counts.values()) / (ntot * (ntot - 1))
+    var = nxs * nys / 12.0 * ((ntot + 1) - tcorr)
+    if var <= 0.0:
+        return ustat, 1.0
+    mean = nxs * nys / 2.0
+    zval = max(abs(ustat - mean) - 0.5, 0.0) / math.sqrt(var)
+    return ustat, math.erfc(zval / math.sqrt(2.0))
+
+
+def bootstrap_median_ratio(  # pylint: disable=too-many-locals
+        xvals: Sequence[float],
+        yvals: Sequence[float],
+        nboot: int = 2000,
+        conf: float = 0.95,
+        seed: int = 0
+) -> Tuple[float, float]:
+    '''
+    Returns a bootstrap confidence interval (percentile method) for the ratio of
+    the median of yvals to the median of xvals.
+    '''
+    if len(xvals) == 0 or len(yvals) == 0:
+        raise ValueError('Bootstrapping requires non-empty samples.')
+    alpha = (1.0 - conf) / 2.0 * 100.0
+    if numpy is not None:
+        rng = numpy.random.default_rng(seed)
+        xarr = numpy.asarray(xvals, dtype=numpy.float64)
+        yarr = numpy.asarray(yvals, dtype=numpy.float64)
+        xmeds = numpy.median(rng.choice(xarr, (nboot, len(xarr))), axis=1)
+        ymeds = numpy.median(rng.choice(yarr, (nboot, len(yarr))), axis=1)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            ratios = ymeds / xmeds
+        low, high = numpy.percentile(ratios, [alpha, 100.0 - alpha])
+        return float(low), float(high)
+    rng = random.Random(seed)  # nosec
+    ratios = []
+    for _ in range(nboot):
+        xmed = median(rng.choices(xvals, k=len(xvals)))
+        ymed = median(rng.choices(yvals, k=len(yvals)))
+        ratios.append(ymed / xmed if xmed else math.inf)
+    pcts = _percentiles_py(sorted(ratios), [alpha, 100.0 - alpha])
+    return pcts[0], pcts[1]
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
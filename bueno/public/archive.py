@@ -0,0 +1,335 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Single-file (tar) archives of run data, written as a stream.
+
+The first member of every archive is an index (INDEX_NAME) listing the other
+members along with their sizes and their offsets into the (uncompressed) tar
+stream. Readers can therefore list an archive's contents by reading only its
+first member and can read individual members without parsing the members
+preceding them.
+'''
+
+import gzip
+import io
+import json
+import os
+import stat
+import tarfile
+import time
+
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    cast
+)
+
+try:
+    import zstandard
+    _HAVE_ZSTD = True
+except ImportError:  # pragma: no cover
+    _HAVE_ZSTD = False
+
+# Supported compression types.
+COMPRESSIONS = ('none', 'gz', 'zst')
+
+# The name of the index member.
+INDEX_NAME: str = '.bueno-index.json'
+
+# Archive file name suffixes, by compression type.
+_SUFFIXES = {
+    'none': '.tar',
+    'gz': '.tar.gz',
+    'zst': '.tar.zst'
+}
+
+# Leading bytes identifying compressed archives.
+_MAGICS = {
+    b'\x1f\x8b': 'gz',
+    b'\x28\xb5\x2f\xfd': 'zst'
+}
+
+# Tar stream parameters (the PAX format is used). Used to precompute member
+# offsets.
+_ENCODING = 'utf-8'
+_ERRORS = 'surrogateescape'
+
+
+def have_zstd() -> bool:
+    '''
+    Returns whether or not zstd compression (the zstandard package) is
+    available.
+    '''
+    return _HAVE_ZSTD
+
+
+def suffix(compression: str) -> str:
+    '''
+    Returns the file name suffix used for archives of the provided compression
+    type. Raises ValueError if the compression type is not supported.
+    '''
+    if compression not in _SUFFIXES:
+        raise ValueError(f'Unknown compression: {compression}. '
+                         f'Choose one of {COMPRESSIONS}.')
+    if compression == 'zst' and not have_zstd():
+        raise ValueError('zst compression requires the zstandard package.')
+    return _SUFFIXES[compression]
+
+
+def suffixes() -> List[str]:
+    '''
+    Returns all archive file name suffixes.
+    '''
+    return list(_SUFFIXES.values())
+
+
+class Member:
+    '''
+    An archive member: its name (a relative path), its size, and a callable
+    that opens a binary stream of its contents.
+    '''
+    def __init__(
+            self,
+            name: str,
+            size: int,
+            opener: Callable[[], BinaryIO],
+            mtime: Optional[float] = None
+    ) -> None:
+        self.name = os.path.normpath(name)
+        self.size = size
+        self.opener = opener
+        self.mtime = time.time() if mtime is None else mtime
+
+    @staticmethod
+    def from_file(path: str, name: str) -> 'Member':
+        '''
+        Returns a member backed by the provided file. Files that are not
+        regular or that report no size (e.g., procfs and sysfs pseudo-files)
+        are read when the member is created, since their sizes are not known
+        in advance.
+        '''
+        sinfo = os.stat(path)
+        if sinfo.st_size == 0 or not stat.S_ISREG(sinfo.st_mode):
+            with open(path, 'rb') as file:
+                member = Member.from_bytes(name, file.read())
+            member.mtime = sinfo.st_mtime
+            return member
+        return Member(
+            name, sinfo.st_size, lambda: open(path, 'rb'), sinfo.st_mtime
+        )
+
+    @staticmethod
+    def from_bytes(name: str, data: bytes) -> 'Member':
+        '''
+        Returns a member holding the provided bytes.
+        '''
+        return Member(name, len(data), lambda: io.BytesIO(data))
+
+    def tarinfo(self) -> tarfile.TarInfo:
+        '''
+        Returns the member's tar header.
+        '''
+        tinfo = tarfile.TarInfo(self.name)
+        tinfo.size = self.size
+        tinfo.mtime = int(self.mtime)
+        tinfo.mode = 0o644
+        return tinfo
+
+
+def _padded(size: int) -> int:
+    '''
+    Returns size rounded up to a multiple of the tar block size.
+    '''
+    return -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+def _index(members: Sequence[Member]) -> bytes:
+    '''
+    Returns the index of the provided members. Offsets are relative to the end
+    of the index member.
+    '''
+    entries = []
+    offset = 0
+    for mem in members:
+        hlen = len(mem.tarinfo().tobuf(tarfile.PAX_FORMAT, _ENCODING, _ERRORS))
+        entries.append({
+            'name': mem.name,
+            'size': mem.size,
+            'offset': offset + hlen
+        })
+        offset += hlen + _padded(mem.size)
+    return json.dumps({'members': entries}, indent=1).encode('utf8')
+
+
+def _open_stream(path: str, compression: str) -> BinaryIO:
+    '''
+    Opens the provided path for writing a stream of the given compression.
+    '''
+    if compression == 'gz':
+        return cast(BinaryIO, gzip.open(path, 'wb'))
+    if compression == 'zst':
+        return cast(BinaryIO, zstandard.ZstdCompressor().stream_writer(
+            open(path, 'wb')  # pylint: disable=consider-using-with
+        ))
+    return open(path, 'wb')  # pylint: disable=consider-using-with
+
+
+def write(
+        path: str,
+        members: Sequence[Member],
+        compression: str = 'gz'
+) -> int:
+    '''
+    Writes the provided members (preceded by an index) as a tar archive to
+    path, compressed as specified. Members are streamed into the archive. The
+    archive is written under a temporary name and renamed when complete.
+    Returns the number of (uncompressed) member bytes written.
+    '''
+    suffix(compression)
+    index = Member.from_bytes(INDEX_NAME, _index(members))
+    tmpp = f'{path}.part'
+    try:
+        with _open_stream(tmpp, compression) as stream, \
+             tarfile.open(fileobj=stream, mode='w|', format=tarfile.PAX_FORMAT,
+                          encoding=_ENCODING, errors=_ERRORS) as tar:
+            for mem in [index, *members]:
+                with mem.opener() as src:
+                    tar.addfile(mem.tarinfo(), src)
+        os.replace(tmpp, path)
+    except BaseException:
+        if os.path.exists(tmpp):
+            os.unlink(tmpp)
+        raise
+    return sum(m.size for m in members)
+
+
+class Archive:
+    '''
+    Reads archives written by write().
+    '''
+    def __init__(self, path: str) -> None:
+        # Path to the archive.
+        self.path = path
+        with open(path, 'rb') as file:
+            head = file.read(4)
+        # The archive's compression type.
+        self.compression = 'none'
+        for magic, comp in _MAGICS.items():
+            if head.startswith(magic):
+                self.compression = comp
+        if self.compression == 'zst' and not have_zstd():
+            raise RuntimeError(f'Reading {path} requires zstandard.')
+        # Offset of the first member after the index.
+        self._base = 0
+        # Maps member names to their index entries.
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._load_index()
+
+    def _open(self) -> BinaryIO:
+        '''
+        Returns a (decompressed) stream of the archive's contents.
+        '''
+        if self.compression == 'gz':
+            return cast(BinaryIO, gzip.open(self.path, 'rb'))
+        if self.compression == 'zst':
+            return cast(BinaryIO, zstandard.ZstdDecompressor().stream_reader(
+                open(self.path, 'rb'),  # pylint: disable=consider-using-with
+                closefd=True
+            ))
+        return open(self.path, 'rb')  # pylint: disable=consider-using-with
+
+    def _load_index(self) -> None:
+        '''
+        Loads the archive's index, its first member.
+        '''
+        with self._open() as stream, \
+             tarfile.open(fileobj=stream, mode='r|') as tar:
+            tinfo = tar.next()
+            if tinfo is None or tinfo.name != INDEX_NAME:
+                raise RuntimeError(f'{self.path} has no index.')
+            idxf = tar.extractfile(tinfo)
+            assert idxf is not None  # nosec
+            index = json.loads(idxf.read())
+            self._base = tinfo.offset_data + _padded(tinfo.size)
+        # Later members replace earlier members with the same name.
+        for entry in index['members']:
+            self._index[entry['name']] = entry
+
+    def names(self) -> List[str]:
+        '''
+        Returns the names of the archive's members.
+        '''
+        return list(self._index)
+
+    def members(self) -> List[Dict[str, Any]]:
+        '''
+        Returns the index entries (name, size, and offset) of the archive's
+        members.
+        '''
+        return list(self._index.values())
+
+    def read(self, name: str) -> bytes:
+        '''
+        Returns the contents of the named member. Raises KeyError if no such
+        member exists.
+        '''
+        entry = self._index[os.path.normpath(name)]
+        with self._open() as stream:
+            # Compressed streams are decompressed up to the offset, but no tar
+            # headers are parsed along the way.
+            stream.seek(self._base + entry['offset'])
+            return stream.read(entry['size'])
+
+    def extract(
+            self,
+            dest: str,
+            names: Optional[Sequence[str]] = None
+    ) -> List[str]:
+        '''
+        Extracts the named members (all members if names is None) to the
+        provided directory. Returns the paths of the extracted files. Raises
+        ValueError if a member would be extracted outside of dest.
+        '''
+        wanted = None
+        if names is not None:
+            wanted = {os.path.normpath(n) for n in names}
+            missing = wanted - set(self._index)
+            if missing:
+                raise KeyError(f'No such members: {sorted(missing)}')
+        dest = os.path.abspath(dest)
+        res = []
+        with self._open() as stream, \
+             tarfile.open(fileobj=stream, mode='r|') as tar:
+            for tinfo in tar:
+                if tinfo.name == INDEX_NAME or not tinfo.isfile():
+                    continue
+                if wanted is not None and tinfo.name not in wanted:
+                    continue
+                opath = os.path.abspath(os.path.join(dest, tinfo.name))
+                if os.path.commonpath([dest, opath]) != dest:
+                    raise ValueError(f'Unsafe member name: {tinfo.name}')
+                os.makedirs(os.path.dirname(opath), 0o755, exist_ok=True)
+                src = tar.extractfile(tinfo)
+                assert src is not None  # nosec
+                with open(opath, 'wb') as file:
+                    while True:
+                        chunk = src.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        file.write(chunk)
+                os.utime(opath, (tinfo.mtime, tinfo.mtime))
+                res.append(opath)
+        return res
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -10,12 +10,18 @@
 Public container activation interfaces.
 '''
 
+import hashlib
 import os
+import threading
 
+from contextlib import contextmanager
 from typing import (
     Any,
     Callable,
+    Dict,
+    Iterator,
     List,
+    Optional,
     Union
 )
 
@@ -24,6 +30,7 @@ from bueno.core import constants
 from bueno.core import metacls
 
 from bueno.public import host
+from bueno.public import logger
 from bueno.public import utils
 
 # Type aliases.
@@ -31,6 +38,104 @@ StagingHookCb = Callable[[], str]
 ActionCb = Union[Callable[..., None], None]
 
 
+class _TheCommandLog(metaclass=metacls.Singleton):
+    '''
+    Records the commands launched by run() and prun().
+    '''
+    def __init__(self) -> None:
+        # Records of the commands launched, in order.
+        self.records: List[Dict[str, Any]] = []
+        # Whether or not command execution is stubbed out.
+        self.dry_run = False
+        # The number of concurrent batches started thus far.
+        self.nbatches = 0
+        self.lock = threading.Lock()
+        # Thread-local state that holds the calling thread's lane.
+        self.tls = threading.local()
+
+    def record(self, cmd: str, timer: Optional[utils.Timer] = None) -> None:
+        '''
+        Records the provided command and, if provided, its timing information.
+        '''
+        rec = {
+            'command': cmd,
+            'id': command_id(cmd),
+            'start_time': None,
+            'exectime_ns': None,
+            'lane': getattr(self.tls, 'lane', None)
+        }
+        if timer is not None and timer.start_time is not None:
+            rec['start_time'] = timer.start_time.isoformat()
+            rec['exectime_ns'] = timer.elapsed_ns
+        with self.lock:
+            self.records.append(rec)
+
+
+def command_id(cmd: str) -> str:
+    '''
+    Returns the identity of the provided command string: a digest of its
+    whitespace-normalized form.
+    '''
+    ncmd = ' '.join(cmd.split())
+    return hashlib.sha256(ncmd.encode('utf8')).hexdigest()[:16]
+
+
+def commands() -> List[Dict[str, Any]]:
+    '''
+    Returns a list of records describing the commands launched by run() and
+    prun() thus far. Each record contains the command string, its identity,
+    its wall-clock start time and its execution time in nanoseconds (both None
+    during dry runs), and its lane (None unless run concurrently).
+    '''
+    clog = _TheCommandLog()
+    with clog.lock:
+        return list(clog.records)
+
+
+def dry_run(enable: Optional[bool] = None) -> Optional[bool]:
+    '''
+    Dry-run mode getter/setter. If a boolean is provided, then it acts as a
+    setter, acting as a getter otherwise. In dry-run mode, commands passed to
+    run() and prun() are recorded, but neither they nor their pre- or
+    post-actions are executed.
+    '''
+    if enable is None:
+        return _TheCommandLog().dry_run
+    _TheCommandLog().dry_run = bool(enable)
+    return None
+
+
+def new_batch() -> int:
+    '''
+    Returns a new identifier for a batch of concurrently executed lanes.
+    '''
+    clog = _TheCommandLog()
+    with clog.lock:
+        clog.nbatches += 1
+        return clog.nbatches
+
+
+@contextmanager
+def lane(batch: int, line: int, demand: int, slots: int) -> Iterator[None]:
+    '''
+    Context manager that tags commands launched by the calling thread as part of
+    a concurrently executed lane: line number line of the given batch, which
+    occupies demand of the batch's slots resource slots.
+    '''
+    tls = _TheCommandLog().tls
+    prev = getattr(tls, 'lane', None)
+    tls.lane = {
+        'batch': batch,
+        'line': line,
+        'demand': demand,
+        'slots': slots
+    }
+    try:
+        yield
+    finally:
+        tls.lane = prev
+
+
 def _runi(  # pylint: disable=too-many-arguments
         cmds: List[str],
         echo: bool = True,
@@ -46,6 +151,13 @@ def _runi(  # pylint: disable=too-many-arguments
 
     cmdstr = ' '.join(cmds)
 
+    clog = _TheCommandLog()
+    if clog.dry_run:
+        clog.record(cmdstr)
+        if echo:
+            logger.log(f'# (dry run) $ {cmdstr}')
+        return
+
     if preaction is not None:
         preargs = {
             'command': cmdstr,
@@ -53,21 +165,24 @@ def _runi(  # pylint: disable=too-many-arguments
         }
         preaction(**preargs)
 
-    stime = utils.now()
-    coutput = cntrimg.activator().run(
-        cmds,
-        echo=echo,
-        capture=capture_output,
-        check_exit_code=check_exit_code
-    )
-    etime = utils.now()
+    timer = utils.Timer(wallclock=True).start()
+    with logger.command(command_id(cmdstr)):
+        coutput = cntrimg.activator().run(
+            cmds,
+            echo=echo,
+            capture=capture_output,
+            check_exit_code=check_exit_code
+        )
+    timer.stop()
+    clog.record(cmdstr, timer)
 
     if postaction is not None:
         postargs = {
             'command': cmdstr,
-            'start_time': stime,
-            'end_time': etime,
-            'exectime': (etime - stime).total_seconds(),
+            'start_time': timer.start_time,
+            'end_time': timer.end_time,
+            'exectime': timer.elapsed,
+            'exectime_ns': timer.elapsed_ns,
             'output': coutput,
             'user_data': user_data
         }
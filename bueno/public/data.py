@@ -5,15 +5,28 @@
 # This file is part of the bueno project. See the LICENSE file at the
 # top-level directory of this distribution for more information.
 #
+# pylint: disable=too-many-lines
 
 '''
 Core data types.
 '''
 
+import atexit
+import concurrent.futures
 import copy
+import errno
+import functools
+import hashlib
+import heapq
 import io
+import mmap
 import os
 import shutil
+import stat
+import sys
+import tempfile
+import threading
+import weakref
 
 from abc import ABC, abstractmethod
 from pathlib import Path
@@ -21,22 +34,414 @@ from types import ModuleType
 
 from typing import (
     Any,
+    BinaryIO,
+    Callable,
     Dict,
     List,
+    Optional,
+    Set,
+    Tuple,
     Union
 )
 
+import yaml
+
+try:
+    import xxhash
+    _HAVE_XXHASH = True
+except ImportError:  # pragma: no cover
+    _HAVE_XXHASH = False
+
 from bueno.core import constants
 from bueno.core import metacls
 
+from bueno.public import archive
 from bueno.public import logger
 from bueno.public import utils
 
 
+# The name of the manifest listing the files placed from an object store.
+OBJECTS_MANIFEST: str = 'objects.yaml'
+
+# The default name of the object store directory, rooted at the output path.
+OBJECTS_DIR: str = '.bueno-objects'
+
+# The name of the manifest listing the files written to an output directory.
+MANIFEST: str = 'manifest.yaml'
+
+# Files at least this large are hashed through a memory map.
+_MMAP_THRESHOLD: int = 1024 * 1024
+
+# The Linux FICLONE ioctl request number (_IOW(0x94, 9, int)).
+_FICLONE: int = 0x40049409
+
+# Errors indicating that a copy acceleration is not supported between the
+# given files, in which case we fall back to a regular copy.
+_COPY_FALLBACK_ERRNOS = {
+    errno.EBADF,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EPERM,
+    errno.EXDEV
+}
+
+
+def digest_algorithm() -> str:
+    '''
+    Returns the name of the algorithm used for manifest digests: xxh3_128 if
+    the xxhash package is available, blake2b otherwise.
+    '''
+    return 'xxh3_128' if _HAVE_XXHASH else 'blake2b'
+
+
+def _hasher() -> Any:
+    '''
+    Returns a new hash object of the manifest digest algorithm.
+    '''
+    if _HAVE_XXHASH:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b()
+
+
+def digest_bytes(data: bytes) -> str:
+    '''
+    Returns the manifest digest of the provided bytes.
+    '''
+    hsh = _hasher()
+    hsh.update(data)
+    return f'{digest_algorithm()}:{hsh.hexdigest()}'
+
+
+def digest_file(path: str) -> str:
+    '''
+    Returns the manifest digest of the provided file. Large files are hashed
+    through a memory map, others in large chunks.
+    '''
+    hsh = _hasher()
+    with open(path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size >= _MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mmp:
+                hsh.update(mmp)
+        else:
+            hsh.update(file.read())
+    return f'{digest_algorithm()}:{hsh.hexdigest()}'
+
+
+def _reflink(src: BinaryIO, dst: BinaryIO) -> bool:
+    '''
+    Attempts to clone src into dst using the FICLONE ioctl. Returns whether or
+    not the clone succeeded.
+    '''
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl  # pylint: disable=import-outside-toplevel
+    try:
+        fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+    except OSError as exception:
+        if exception.errno in _COPY_FALLBACK_ERRNOS:
+            return False
+        raise
+    return True
+
+
+def _copy_range(src: BinaryIO, dst: BinaryIO, size: int) -> bool:
+    '''
+    Attempts to copy size bytes from src to dst in the kernel using
+    os.copy_file_range(). Returns whether or not the copy succeeded.
+    '''
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    copied = 0
+    try:
+        while copied < size:
+            ncopied = os.copy_file_range(
+                src.fileno(), dst.fileno(), size - copied
+            )
+            if ncopied == 0:
+                break
+            copied += ncopied
+    except OSError as exception:
+        if exception.errno not in _COPY_FALLBACK_ERRNOS:
+            raise
+        # Start over from scratch.
+        src.seek(0)
+        dst.seek(0)
+        dst.truncate()
+        return False
+    return True
+
+
+def copyfile(srcf: str, dstf: str) -> int:
+    '''
+    Copies the contents and metadata of srcf to dstf, like shutil.copy2(). A
+    reflink (FICLONE) is attempted first, then an in-kernel copy
+    (os.copy_file_range), and finally a regular copy. Sources that are not
+    regular files or that report no size (e.g., procfs and sysfs pseudo-files,
+    whose sizes are not known in advance) are always copied regularly.
+    Returns the number of bytes copied.
+    '''
+    with open(srcf, 'rb') as src, open(dstf, 'wb') as dst:
+        sinfo = os.fstat(src.fileno())
+        size = sinfo.st_size
+        accel = size > 0 and stat.S_ISREG(sinfo.st_mode)
+        if not accel or (not _reflink(src, dst) and
+                         not _copy_range(src, dst, size)):
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        dst.flush()
+        size = os.fstat(dst.fileno()).st_size
+    shutil.copystat(srcf, dstf)
+    return size
+
+
+def _makedirs(path: str) -> None:
+    '''
+    Creates the provided directory and its parents, if they do not yet exist.
+    '''
+    if not os.path.isdir(path):
+        os.makedirs(path, 0o755, exist_ok=True)
+
+
+def _unlink_quiet(path: str) -> None:
+    '''
+    Removes the provided file, ignoring files that no longer exist.
+    '''
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _sizeof(obj: Any) -> int:
+    '''
+    Returns the approximate number of bytes used by the provided object and by
+    the objects it contains.
+    '''
+    seen: Set[int] = set()
+    todo = [obj]
+    res = 0
+    while todo:
+        item = todo.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        res += sys.getsizeof(item)
+        if isinstance(item, dict):
+            todo.extend(item.keys())
+            todo.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            todo.extend(item)
+    return res
+
+
+class ObjectStore:
+    '''
+    A content-addressed object store. Files are stored once, by their SHA-256
+    digest, and linked into place: using hard links (falling back to symbolic
+    links when a hard link cannot be made, e.g., across file systems) or
+    symbolic links. Stored objects are read-only, since they may be shared by
+    many runs.
+    '''
+    links = ('hardlink', 'symlink')
+
+    def __init__(self, root: str, link: str = 'hardlink') -> None:
+        if link not in ObjectStore.links:
+            raise ValueError(
+                f'Unknown link type: {link}. Choose one of {ObjectStore.links}.'
+            )
+        # Absolute path to the store's root directory.
+        self.root = os.path.abspath(root)
+        # The type of link used to place stored objects.
+        self.link = link
+        # Records (relative path, digest, size, link) of the files placed since
+        # the last call to entries().
+        self._entries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(path: str) -> str:
+        '''
+        Returns the SHA-256 digest of the provided file, read in chunks.
+        '''
+        sha = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+    def objpath(self, digest: str) -> str:
+        '''
+        Returns the path of the object with the provided digest.
+        '''
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def put(self, srcf: str) -> Tuple[str, int]:
+        '''
+        Stores the provided file, if not already stored. Returns its digest and
+        size.
+        '''
+        digest = ObjectStore.digest(srcf)
+        objp = self.objpath(digest)
+        if os.path.exists(objp):
+            return digest, os.path.getsize(objp)
+        _makedirs(os.path.dirname(objp))
+        # Copy under a temporary name, then rename, so that concurrent stores
+        # never expose partially written objects.
+        fdesc, tmpp = tempfile.mkstemp(dir=os.path.dirname(objp))
+        os.close(fdesc)
+        try:
+            size = copyfile(srcf, tmpp)
+            os.chmod(tmpp, 0o444)
+            os.replace(tmpp, objp)
+        except BaseException:
+            _unlink_quiet(tmpp)
+            raise
+        return digest, size
+
+    def place(self, srcf: str, dstf: str, basep: str) -> int:
+        '''
+        Stores the provided file and links it to dstf. The placement is recorded
+        relative to basep. Returns the file's size.
+        '''
+        digest, size = self.put(srcf)
+        objp = self.objpath(digest)
+        _unlink_quiet(dstf)
+        link = self.link
+        if link == 'hardlink':
+            try:
+                os.link(objp, dstf)
+            except OSError as exception:
+                if exception.errno not in (errno.EXDEV, errno.EMLINK,
+                                           errno.EPERM):
+                    raise
+                link = 'symlink'
+        if link == 'symlink':
+            os.symlink(objp, dstf)
+        with self._lock:
+            self._entries.append({
+                'path': os.path.relpath(dstf, basep),
+                'digest': f'sha256:{digest}',
+                'size': size,
+                'link': link
+            })
+        return size
+
+    def entries(self) -> List[Dict[str, Any]]:
+        '''
+        Returns (and forgets) the records of the files placed thus far, sorted
+        by path.
+        '''
+        with self._lock:
+            res = sorted(self._entries, key=lambda e: str(e['path']))
+            self._entries = []
+        return res
+
+
 class BaseAsset(ABC):
     '''
     Abstract base data asset class.
     '''
+    # Whether or not the asset may be written concurrently with other assets.
+    # Assets that are not are written in the order they were added, after all
+    # assets added before them.
+    concurrent: bool = False
+
+    def __init__(self) -> None:
+        # The number of bytes written by write(), if known.
+        self.nbytes = 0
+        # Maps the paths of the files written by write() to their sizes and
+        # digests, if recorded.
+        self.digests: Dict[str, Tuple[int, str]] = {}
+        # Path to the file holding the asset's spilled contents, if spilled.
+        self._spillp: Optional[str] = None
+
+    def record(self, path: str, data: Optional[bytes] = None) -> None:
+        '''
+        Records the size and digest of a file written by write(). If provided,
+        data are the file's contents, which are then not read back.
+        '''
+        if data is not None:
+            self.digests[path] = (len(data), digest_bytes(data))
+            return
+        self.digests[path] = (os.path.getsize(path), digest_file(path))
+
+    def outdir(self, basep: str) -> Optional[str]:
+        '''
+        Returns the subdirectory (rooted at the specified base path) the asset
+        is written to, if any. By default, this is determined by the asset's
+        optional subd attribute.
+        '''
+        subd = getattr(self, 'subd', None)
+        if subd:
+            return os.path.join(basep, subd)
+        return None
+
+    def resident(self) -> int:
+        '''
+        Returns the (approximate) number of bytes of asset contents held in
+        memory until the asset is written. By default, none are.
+        '''
+        return 0
+
+    def spill(  # pylint: disable=unused-argument
+            self,
+            spilld: Optional[str] = None
+    ) -> int:
+        '''
+        Moves the asset's in-memory contents to a temporary file in spilld (the
+        default temporary directory if None) that is moved into place when the
+        asset is written. Returns the number of bytes released from memory. By
+        default, assets have nothing to spill.
+        '''
+        return 0
+
+    @property
+    def spilled(self) -> bool:
+        '''
+        Returns whether or not the asset's contents were spilled to disk.
+        '''
+        return self._spillp is not None
+
+    def spilled_bytes(self) -> int:
+        '''
+        Returns the size of the asset's spilled contents, if any.
+        '''
+        if self._spillp is None or not os.path.exists(self._spillp):
+            return 0
+        return os.path.getsize(self._spillp)
+
+    def _spill_data(self, sdata: bytes, spilld: Optional[str]) -> None:
+        '''
+        Writes the provided contents to a new spill file.
+        '''
+        fdesc, self._spillp = tempfile.mkstemp(
+            prefix='bueno-asset-', dir=spilld
+        )
+        # Remove the temporary file if the asset is never written.
+        weakref.finalize(self, _unlink_quiet, self._spillp)
+        with open(fdesc, 'wb') as file:
+            file.write(sdata)
+
+    def _place_spilled(self, opath: str) -> None:
+        '''
+        Moves the spill file into place at opath.
+        '''
+        assert self._spillp is not None  # nosec
+        # Avoid the owner-only permissions given to temporary files.
+        os.chmod(self._spillp, 0o644)
+        shutil.move(self._spillp, opath)
+        self.nbytes = os.path.getsize(opath)
+        self.record(opath)
+
+    def snapshot(self) -> None:
+        '''
+        Captures the asset's sources when a background write of the asset is
+        requested (see background_writes()), so that they are written as they
+        were then. By default, assets already hold snapshots of their contents.
+        '''
+
     @abstractmethod
     def write(self, basep: str) -> None:
         '''
@@ -44,11 +449,32 @@ class BaseAsset(ABC):
         location rooted at the specified base path.
         '''
 
+    def members(self) -> List[archive.Member]:
+        '''
+        Returns the archive members holding the asset's contents, named
+        relative to the base path. By default, the asset is written to a
+        temporary directory (removed once the asset is no longer referenced)
+        from which the files written are streamed.
+        '''
+        tmpd = tempfile.mkdtemp(prefix='bueno-asset-', dir=_Assets().staging)
+        weakref.finalize(self, shutil.rmtree, tmpd, True)
+        self.write(tmpd)
+        res = []
+        for root, _, files in os.walk(tmpd):
+            for fname in sorted(files):
+                path = os.path.join(root, fname)
+                res.append(archive.Member.from_file(
+                    path, os.path.relpath(path, tmpd)
+                ))
+        return res
+
 
 class FileAsset(BaseAsset):
     '''
     File asset.
     '''
+    concurrent = True
+
     def __init__(self, srcf: str, subd: Union[str, None] = None):
         super().__init__()
         # Absolute path to source file asset.
@@ -59,13 +485,46 @@ class FileAsset(BaseAsset):
     def _get_fname(self) -> str:
         return os.path.basename(self.srcf)
 
+    def snapshot(self) -> None:
+        '''
+        Copies the source file (using a reflink, if possible) to a temporary
+        file in the staging directory (see memory_budget()), from which it is
+        written.
+        '''
+        if self._spillp is not None:
+            return
+        fdesc, spillp = tempfile.mkstemp(
+            prefix='bueno-asset-', dir=_Assets().staging
+        )
+        os.close(fdesc)
+        # Remove the temporary file if the asset is never written.
+        weakref.finalize(self, _unlink_quiet, spillp)
+        copyfile(self.srcf, spillp)
+        self._spillp = spillp
+
     def write(self, basep: str) -> None:
-        realbasep = basep
-        if self.subd:
-            realbasep = os.path.join(basep, self.subd)
-            os.makedirs(realbasep, 0o755, exist_ok=True)
+        realbasep = self.outdir(basep) or basep
+        _makedirs(realbasep)
         opath = os.path.join(realbasep, self._get_fname())
-        shutil.copy2(self.srcf, opath)
+        srcf = self.srcf if self._spillp is None else self._spillp
+        store = _Assets().store
+        if store is not None:
+            self.nbytes = store.place(srcf, opath, basep)
+        elif self._spillp is not None:
+            # The snapshot already holds the source's metadata.
+            shutil.move(self._spillp, opath)
+            self.nbytes = os.path.getsize(opath)
+        else:
+            self.nbytes = copyfile(srcf, opath)
+        if self._spillp is not None:
+            _unlink_quiet(self._spillp)
+        # Hashed right after the copy, while the data are in the page cache.
+        self.record(opath)
+
+    def members(self) -> List[archive.Member]:
+        name = os.path.join(self.subd or '', self._get_fname())
+        srcf = self.srcf if self._spillp is None else self._spillp
+        return [archive.Member.from_file(srcf, name)]
 
 
 class PythonModuleAsset(FileAsset):
@@ -85,8 +544,18 @@ class PythonModuleAsset(FileAsset):
 
 class StringIOAsset(BaseAsset):
     '''
-    StringIO asset.
+    StringIO asset. The contents of the provided StringIO instance are
+    snapshotted once, at construction, as an immutable string. Snapshots larger
+    than spill_threshold characters are spilled to a temporary file (in
+    spill_dir, or the default temporary directory if None) that is moved into
+    place when the asset is written, so large outputs are not kept in memory.
     '''
+    concurrent = True
+    # Snapshot size (in characters) above which contents are spilled to disk.
+    spill_threshold: int = 8 * 1024 * 1024
+    # Directory used for spilled snapshots. None selects the default.
+    spill_dir: Optional[str] = None
+
     def __init__(
             self,
             srcios: io.StringIO,
@@ -94,36 +563,81 @@ class StringIOAsset(BaseAsset):
             subd: Union[str, None] = None
     ):
         super().__init__()
-        # XXX(skg): Are there any file-descriptor-like pylint: disable=W0511
-        # structures that cannot be safely copied here? The print() in write()
-        # should make a copy of the data, so maybe that's enough?
-        # The StringIO instance of which we are storing its contents.
-        self.srcios = copy.deepcopy(srcios)
+        # Snapshot of the provided StringIO instance's contents, if in memory.
+        self._value: Optional[str] = srcios.getvalue()
+        if len(self._value) > self.spill_threshold:
+            self.spill(self.spill_dir)
         # The name used to store the contents of the provided StringIO instance.
         self.fname = fname
         # Optional subdirectory to store the specified data.
         self.subd = subd
 
+    def resident(self) -> int:
+        if self._value is None:
+            return 0
+        return sys.getsizeof(self._value)
+
+    def spill(self, spilld: Optional[str] = None) -> int:
+        if self._value is None:
+            return 0
+        nbytes = self.resident()
+        self._spill_data(self._value.encode('utf8'), spilld)
+        self._value = None
+        return nbytes
+
+    def getvalue(self) -> str:
+        '''
+        Returns the snapshot of the StringIO instance's contents.
+        '''
+        if self._value is not None:
+            return self._value
+        assert self._spillp is not None  # nosec
+        with open(self._spillp, encoding='utf8') as file:
+            return file.read()
+
+    @property
+    def srcios(self) -> io.StringIO:
+        '''
+        Returns a new StringIO instance holding the snapshot.
+        '''
+        return io.StringIO(self.getvalue())
+
     def write(self, basep: str) -> None:
-        realbasep = basep
-        if self.subd:
-            realbasep = os.path.join(basep, self.subd)
-            os.makedirs(realbasep, 0o755, exist_ok=True)
+        realbasep = self.outdir(basep) or basep
+        _makedirs(realbasep)
         opath = os.path.join(realbasep, self.fname)
-        with open(opath, mode='w', encoding='utf8') as file:
-            print(self.srcios.getvalue(), file=file, end='')
+        if self._spillp is not None:
+            self._place_spilled(opath)
+            return
+        sdata = str(self._value).encode('utf8')
+        with open(opath, mode='wb') as file:
+            file.write(sdata)
+        self.nbytes = len(sdata)
+        self.record(opath, sdata)
+
+    def members(self) -> List[archive.Member]:
+        name = os.path.join(self.subd or '', self.fname)
+        if self._spillp is not None:
+            return [archive.Member.from_file(self._spillp, name)]
+        return [
+            archive.Member.from_bytes(name, str(self._value).encode('utf8'))
+        ]
 
 
 class YAMLDictAsset(BaseAsset):
     '''
     Convenience YAML (from a dict()) asset.
     '''
+    concurrent = True
+
     def __init__(self, ydict: Dict[Any, Any], fname: str) -> None:
         super().__init__()
-        # A deep copy of the provided YAML dictionary.
-        self.ydict = copy.deepcopy(ydict)
+        # A deep copy of the provided YAML dictionary (None once spilled).
+        self.ydict: Optional[Dict[Any, Any]] = copy.deepcopy(ydict)
         # Output file name.
         self.fname = fname
+        # The estimated size of ydict, computed on demand.
+        self._size: Optional[int] = None
 
     @property
     def fname(self) -> str:
@@ -149,8 +663,77 @@ class YAMLDictAsset(BaseAsset):
         specified path.
         '''
         target = os.path.join(basep, self._fname)
-        with open(target, 'w+', encoding='utf8') as file:
-            file.write(utils.yamls(self.ydict))
+        if self._spillp is not None:
+            self._place_spilled(target)
+            return
+        ydata = utils.yamls(self.ydict).encode('utf8')
+        with open(target, 'wb') as file:
+            file.write(ydata)
+        self.nbytes = len(ydata)
+        self.record(target, ydata)
+
+    def resident(self) -> int:
+        if self.ydict is None:
+            return 0
+        if self._size is None:
+            self._size = _sizeof(self.ydict)
+        return self._size
+
+    def spill(self, spilld: Optional[str] = None) -> int:
+        if self.ydict is None:
+            return 0
+        nbytes = self.resident()
+        self._spill_data(utils.yamls(self.ydict).encode('utf8'), spilld)
+        self.ydict = None
+        return nbytes
+
+    def members(self) -> List[archive.Member]:
+        if self._spillp is not None:
+            return [archive.Member.from_file(self._spillp, self._fname)]
+        ydata = utils.yamls(self.ydict).encode('utf8')
+        return [archive.Member.from_bytes(self._fname, ydata)]
+
+
+class JSONAsset(BaseAsset):
+    '''
+    JSON (from a dict()) asset. A faster alternative to YAMLDictAsset: the
+    provided dictionary is serialized when the asset is created, which also
+    takes the place of a deep copy.
+    '''
+    concurrent = True
+
+    def __init__(self, jdict: Dict[Any, Any], fname: str) -> None:
+        super().__init__()
+        # The serialized JSON dictionary.
+        self.jdata = utils.jsons(jdict).encode('utf8')
+        # Output file name.
+        self.fname = fname if fname.endswith('.json') else fname + '.json'
+
+    def write(self, basep: str) -> None:
+        target = os.path.join(basep, self.fname)
+        if self._spillp is not None:
+            self._place_spilled(target)
+            return
+        with open(target, 'wb') as file:
+            file.write(self.jdata)
+        self.nbytes = len(self.jdata)
+        self.record(target, self.jdata)
+
+    def resident(self) -> int:
+        return len(self.jdata)
+
+    def spill(self, spilld: Optional[str] = None) -> int:
+        nbytes = self.resident()
+        if nbytes == 0:
+            return 0
+        self._spill_data(self.jdata, spilld)
+        self.jdata = b''
+        return nbytes
+
+    def members(self) -> List[archive.Member]:
+        if self._spillp is not None:
+            return [archive.Member.from_file(self._spillp, self.fname)]
+        return [archive.Member.from_bytes(self.fname, self.jdata)]
 
 
 class LoggerAsset(BaseAsset):
@@ -160,23 +743,211 @@ class LoggerAsset(BaseAsset):
     def __init__(self) -> None:
         super().__init__()
         self.buildo = constants.SERVICE_LOG_NAME
+        # The size of the log when snapshotted, if it was.
+        self._size: Optional[int] = None
+
+    def snapshot(self) -> None:
+        '''
+        Records the size of the log, so that only the messages logged thus far
+        are written.
+        '''
+        _, self._size = logger.snapshot()
+
+    def write(self, basep: str) -> None:
+        target = os.path.join(basep, self.buildo)
+        # Only the bytes logged since the last write to target are appended.
+        self.nbytes = logger.write(target, self._size)
+        self.record(target)
+
+    def members(self) -> List[archive.Member]:
+        logp, size = logger.snapshot()
+        mem = archive.Member.from_file(logp, self.buildo)
+        # Only archive the messages logged thus far.
+        mem.size = size if self._size is None else self._size
+        return [mem]
+
+
+class StructuredLoggerAsset(BaseAsset):
+    '''
+    bueno structured (JSON lines) logger asset.
+    '''
+    def __init__(self) -> None:
+        super().__init__()
+        self.buildo = constants.SERVICE_JSONL_LOG_NAME
+        # The size of the structured log when snapshotted, if it was.
+        self._size: Optional[int] = None
+
+    def snapshot(self) -> None:
+        _, self._size = logger.snapshot(structured_log=True)
 
     def write(self, basep: str) -> None:
-        logger.write(os.path.join(basep, self.buildo))
+        target = os.path.join(basep, self.buildo)
+        self.nbytes = logger.write_structured(target, self._size)
+        self.record(target)
+
+    def members(self) -> List[archive.Member]:
+        logp, size = logger.snapshot(structured_log=True)
+        mem = archive.Member.from_file(logp, self.buildo)
+        mem.size = size if self._size is None else self._size
+        return [mem]
+
+
+class _TheFlusher(metaclass=metacls.Singleton):
+    '''
+    Writes data in the background: one write at a time, in submission order,
+    on a dedicated writer thread.
+    '''
+    def __init__(self) -> None:
+        # Whether or not data are written in the background.
+        self.enabled = False
+        # The paths of the writes not yet waited for.
+        self.reserved: Set[str] = set()
+        self._pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._futures: List['concurrent.futures.Future[None]'] = []
+        self._lock = threading.Lock()
+
+    def submit(self, job: Callable[[], None], path: str) -> None:
+        '''
+        Submits a write of the provided path. Raises the error of any failed
+        earlier write first.
+        '''
+        self._raise_failed()
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ThreadPoolExecutor(
+                    1, thread_name_prefix='bueno-flush'
+                )
+                atexit.register(_wait_at_exit)
+            self.reserved.add(path)
+            self._futures.append(self._pool.submit(job))
+
+    @staticmethod
+    def _raise(errors: List[BaseException]) -> None:
+        if not errors:
+            return
+        estr = f'{len(errors)} background data write(s) failed: {errors[0]}'
+        raise RuntimeError(estr) from errors[0]
+
+    def _raise_failed(self) -> None:
+        '''
+        Raises an error if any completed write failed.
+        '''
+        with self._lock:
+            done = [f for f in self._futures if f.done()]
+            self._futures = [f for f in self._futures if not f.done()]
+        _TheFlusher._raise(
+            [e for e in (f.exception() for f in done) if e is not None]
+        )
+
+    def wait(self) -> None:
+        '''
+        Waits for all submitted writes to complete. Raises an error if any
+        failed.
+        '''
+        with self._lock:
+            futures = self._futures
+            self._futures = []
+        errors = [e for e in (f.exception() for f in futures) if e is not None]
+        with self._lock:
+            self.reserved.clear()
+        _TheFlusher._raise(errors)
+
+
+def _wait_at_exit() -> None:
+    '''
+    Waits for background writes at interpreter exit, reporting any errors.
+    '''
+    try:
+        _TheFlusher().wait()
+    except RuntimeError as exception:
+        print(f'bueno: {exception}', file=sys.stderr)
+
+
+def _write_manifest(basep: str, assets: List[BaseAsset]) -> None:
+    '''
+    Adds the files recorded by the provided assets to the manifest at basep,
+    creating it if necessary. Files recorded by earlier writes are kept, so
+    the manifest describes everything written to basep.
+    '''
+    manp = os.path.join(basep, MANIFEST)
+    files: Dict[str, Dict[str, Any]] = {}
+    if os.path.exists(manp):
+        with open(manp, encoding='utf8') as file:
+            mdata = yaml.safe_load(file) or {}
+        for entry in (mdata.get('Manifest') or {}).get('files') or []:
+            files[entry['path']] = entry
+    for asset in assets:
+        for path, (size, digest) in getattr(asset, 'digests', {}).items():
+            relp = os.path.relpath(path, basep)
+            files[relp] = {'path': relp, 'size': size, 'digest': digest}
+    mdict = {'Manifest': {'files': [files[k] for k in sorted(files)]}}
+    with open(manp, 'w', encoding='utf8') as file:
+        file.write(utils.yamls(mdict))
+
+
+def verify(basep: str) -> List[str]:
+    '''
+    Verifies the files listed in the manifest at basep against their recorded
+    sizes and digests. Returns the paths (relative to basep) of the files that
+    are missing or differ.
+    '''
+    with open(os.path.join(basep, MANIFEST), encoding='utf8') as file:
+        entries = yaml.safe_load(file)['Manifest']['files']
+
+    def _differs(entry: Dict[str, Any]) -> bool:
+        path = os.path.join(basep, entry['path'])
+        if not os.path.isfile(path):
+            return True
+        if os.path.getsize(path) != entry['size']:
+            return True
+        algo = entry['digest'].split(':', 1)[0]
+        if algo != digest_algorithm():
+            raise RuntimeError(f'Cannot verify {algo} digests.')
+        return bool(digest_file(path) != entry['digest'])
+
+    with concurrent.futures.ThreadPoolExecutor() as pool:
+        differs = list(pool.map(_differs, entries))
+    return [e['path'] for e, dif in zip(entries, differs) if dif]
 
 
 class _Data:
     def __init__(self, basep: str) -> None:
         # The base path where data are stored.
         self._basep = basep
-        os.makedirs(self.basep, 0o755, exist_ok=True)
+        if _Assets().archive is None:
+            os.makedirs(self.basep, 0o755, exist_ok=True)
+        else:
+            _makedirs(os.path.dirname(self.basep))
 
-    def write(self) -> None:
+    def write(self) -> str:
         '''
-        Writes out all the data assets.
+        Writes out all the data assets, in the background if so configured.
+        Returns the path written to: the base path or, when writing archives,
+        the archive's path.
         '''
         _Data._add_default_assets()
-        _Assets().write(self.basep)
+        assets = _Assets().take()
+        flusher = _TheFlusher()
+        comp = _Assets().archive
+        if comp is None:
+            path = self.basep
+            job = functools.partial(_Assets().write, path, assets)
+        else:
+            # Subsequent writes to the same base path get their own archive.
+            path = self.basep + archive.suffix(comp)
+            part = 1
+            while os.path.exists(path) or path in flusher.reserved:
+                path = f'{self.basep}.{part}{archive.suffix(comp)}'
+                part += 1
+            job = functools.partial(_Assets.write_archive, path, comp, assets)
+        if flusher.enabled:
+            # Written as they are now, not as they are when the writer runs.
+            for asset in assets:
+                asset.snapshot()
+            flusher.submit(job, path)
+        else:
+            job()
+        return path
 
     @staticmethod
     def _add_default_assets() -> None:
@@ -184,6 +955,8 @@ class _Data:
         Adds default data assets to _Assets collection.
         '''
         _Assets().add(LoggerAsset())
+        if logger.structured():
+            _Assets().add(StructuredLoggerAsset())
 
     @property
     def basep(self) -> str:
@@ -200,33 +973,225 @@ class _Data:
         self._basep = basep
 
 
-class _Assets(metaclass=metacls.Singleton):
+class _Assets(  # pylint: disable=too-many-instance-attributes
+        metaclass=metacls.Singleton
+):
     '''
     Data asset collection.
     '''
     def __init__(self) -> None:
         self.assets: List[BaseAsset] = []
+        # The maximum number of threads used to write concurrent assets. None
+        # selects the ThreadPoolExecutor default.
+        self.max_workers: Optional[int] = None
+        # The object store used to deduplicate file assets, if any.
+        self.store: Optional[ObjectStore] = None
+        # The compression type of the archives written, if writing archives.
+        self.archive: Optional[str] = None
+        # The number of bytes pending assets may hold in memory, if limited.
+        self.budget: Optional[int] = None
+        # Directory used for assets spilled to honor the budget. None selects
+        # the default temporary directory.
+        self.staging: Optional[str] = None
+        # The number of bytes held in memory by pending assets, tracked while
+        # a budget is set.
+        self.resident = 0
+        # Heap of the pending assets holding contents in memory, largest
+        # first, as (-resident bytes, sequence number, asset) entries.
+        self._heap: List[Tuple[int, int, BaseAsset]] = []
+        self._lock = threading.Lock()
 
     def add(self, asset: BaseAsset) -> None:
         '''
-        Adds provided asset to assets.
+        Adds provided asset to assets. If a budget is set and exceeded as a
+        result, then the largest in-memory assets are spilled to disk.
         '''
-        self.assets.append(asset)
+        with self._lock:
+            self.assets.append(asset)
+            if self.budget is None:
+                return
+            self._track(asset)
+            self._spill()
+
+    def _track(self, asset: BaseAsset) -> None:
+        '''
+        Accounts for the memory held by the provided asset.
+        '''
+        nbytes = asset.resident()
+        if nbytes > 0:
+            self.resident += nbytes
+            heapq.heappush(self._heap, (-nbytes, len(self.assets), asset))
+
+    def _spill(self) -> None:
+        '''
+        Spills the largest in-memory assets until the budget is honored.
+        '''
+        assert self.budget is not None  # nosec
+        while self.resident > self.budget and self._heap:
+            nbytes, _, asset = heapq.heappop(self._heap)
+            asset.spill(self.staging)
+            self.resident += nbytes
+
+    def limit(self, budget: Optional[int], staging: Optional[str]) -> None:
+        '''
+        Sets (or, if budget is None, removes) the memory budget of pending
+        assets, applying it to those already collected.
+        '''
+        with self._lock:
+            self.budget = budget
+            self.staging = staging
+            self.resident = 0
+            self._heap = []
+            if budget is None:
+                return
+            assets = self.assets
+            self.assets = []
+            for asset in assets:
+                self.assets.append(asset)
+                self._track(asset)
+            self._spill()
 
     def clear(self) -> None:
         '''
         Removes all assets from collection.
         '''
         self.assets = []
+        self.resident = 0
+        self._heap = []
 
-    def write(self, basep: str) -> None:
+    def take(self) -> List[BaseAsset]:
+        '''
+        Removes all assets from collection, returning them.
         '''
-        Writes data contained in assets.
+        with self._lock:
+            assets = self.assets
+            self.clear()
+        return assets
+
+    def pending(self) -> Dict[str, int]:
+        '''
+        Returns the number of pending assets, the number of bytes they hold in
+        memory, and the number of bytes they spilled to disk.
+        '''
+        with self._lock:
+            assets = list(self.assets)
+        return {
+            'assets': len(assets),
+            'resident': sum(a.resident() for a in assets),
+            'spilled': sum(a.spilled_bytes() for a in assets)
+        }
+
+    @staticmethod
+    def _write_concurrent(
+            pool: concurrent.futures.ThreadPoolExecutor,
+            assets: List[BaseAsset],
+            basep: str
+    ) -> None:
+        '''
+        Writes the provided assets using the provided thread pool, returning
+        once all are written. Raises the first error encountered, if any.
+        '''
+        if len(assets) == 1:
+            assets[0].write(basep)
+            return
+        futures = [pool.submit(a.write, basep) for a in assets]
+        for future in futures:
+            future.result()
+
+    def write(self, basep: str, assets: List[BaseAsset]) -> None:
+        '''
+        Writes data contained in the provided assets. Output directories are
+        created up front. Concurrent assets (see BaseAsset.concurrent) are
+        written in parallel, while the others act as barriers: each is written
+        only after all assets added before it, and before any added after it.
+        This way the log asset, which is added last, is written last.
         '''
         logger.log(f'# Writing Data Assets at {utils.nows()}')
-        for asset in self.assets:
-            asset.write(basep)
-        self.clear()
+        timer = utils.Timer().start()
+        dirs: Set[str] = {basep}
+        for asset in assets:
+            outdir = asset.outdir(basep)
+            if outdir is not None:
+                dirs.add(outdir)
+        for outdir in sorted(dirs):
+            _makedirs(outdir)
+
+        written: List[BaseAsset] = []
+        pending: List[BaseAsset] = []
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as pool:
+            for asset in assets:
+                if asset.concurrent:
+                    pending.append(asset)
+                    continue
+                _Assets._write_concurrent(pool, pending, basep)
+                written.extend(pending)
+                pending = []
+                if isinstance(asset, LoggerAsset):
+                    written.extend(self._write_objects(basep))
+                    self._log_stats(written, timer)
+                asset.write(basep)
+                written.append(asset)
+            _Assets._write_concurrent(pool, pending, basep)
+            written.extend(pending)
+        _write_manifest(basep, written)
+
+    @staticmethod
+    def write_archive(
+            path: str,
+            compression: str,
+            assets: List[BaseAsset]
+    ) -> None:
+        '''
+        Streams data contained in the provided assets into a single archive at
+        path.
+        '''
+        logger.log(f'# Writing Data Assets to {path} at {utils.nows()}')
+        timer = utils.Timer().start()
+        members: List[archive.Member] = []
+        for asset in assets:
+            if isinstance(asset, LoggerAsset):
+                logger.log(f'# Archiving {len(members)} Members')
+            members.extend(asset.members())
+        nbytes = archive.write(path, members, compression)
+        secs = timer.stop() / 1e9
+        rate = nbytes / secs if secs > 0 else 0.0
+        logger.log(
+            f'# Wrote {len(members)} Archive Members ({nbytes} B, '
+            f'{os.path.getsize(path)} B Compressed) in {secs:.6f} s '
+            f'({rate / 1e6:.2f} MB/s)'
+        )
+
+    def _write_objects(self, basep: str) -> List[BaseAsset]:
+        '''
+        Writes the manifest of the files placed from the object store, if any.
+        Returns the assets written.
+        '''
+        if self.store is None:
+            return []
+        entries = self.store.entries()
+        if not entries:
+            return []
+        odict = {'Objects': {'store': self.store.root, 'files': entries}}
+        asset = YAMLDictAsset(odict, OBJECTS_MANIFEST)
+        asset.write(basep)
+        nbytes = sum(e['size'] for e in entries)
+        logger.log(f'# Placed {len(entries)} Files ({nbytes} B) from '
+                   f'Object Store {self.store.root}')
+        return [asset]
+
+    @staticmethod
+    def _log_stats(assets: List[BaseAsset], timer: utils.Timer) -> None:
+        '''
+        Logs the number of bytes written by the provided assets and the
+        resulting throughput.
+        '''
+        nbytes = sum(getattr(a, 'nbytes', 0) for a in assets)
+        secs = timer.stop() / 1e9
+        rate = nbytes / secs if secs > 0 else 0.0
+        logger.log(
+            f'# Wrote {len(assets)} Data Assets ({nbytes} B) in {secs:.6f} s '
+            f'({rate / 1e6:.2f} MB/s)'
+        )
 
 
 def clear() -> None:
@@ -236,11 +1201,98 @@ def clear() -> None:
     _Assets().clear()
 
 
-def write(basep: str) -> None:
+def object_store(
+        store: Optional[ObjectStore] = None
+) -> Optional[ObjectStore]:
+    '''
+    Object store getter/setter. If a store is provided, then it acts as a
+    setter, acting as a getter otherwise. When set, file assets are stored in
+    (and linked from) the object store, and each data write records the files
+    placed in a manifest (objects.yaml).
+    '''
+    if store is None:
+        return _Assets().store
+    if not isinstance(store, ObjectStore):
+        estr = f'{__name__}.object_store() expects an ObjectStore.'
+        raise ValueError(estr)
+    _Assets().store = store
+    return None
+
+
+def memory_budget(
+        nbytes: Optional[int] = None,
+        staging: Optional[str] = None
+) -> Optional[int]:
+    '''
+    Memory budget getter/setter. If a number of bytes is provided, then it acts
+    as a setter, acting as a getter otherwise. When set, whenever the data
+    assets pending a write hold more than nbytes in memory, the largest of them
+    are spilled to files in staging (the default temporary directory if None),
+    which are moved into place when written. Staging directories on the output
+    path's file system make those moves cheap renames.
+    '''
+    if nbytes is None:
+        return _Assets().budget
+    if nbytes < 0:
+        raise ValueError(f'{__name__}.memory_budget() expects nbytes >= 0.')
+    _Assets().limit(nbytes, staging)
+    return None
+
+
+def pending_bytes() -> Dict[str, int]:
+    '''
+    Returns a dictionary describing the data assets pending a write: their
+    number (assets), the bytes they hold in memory (resident), and the bytes
+    they spilled to disk (spilled).
+    '''
+    return _Assets().pending()
+
+
+def archive_output(compression: Optional[str] = None) -> Optional[str]:
+    '''
+    Archive output getter/setter. If a compression type (see
+    archive.COMPRESSIONS) is provided, then it acts as a setter, acting as a
+    getter otherwise. When set, each data write streams all assets into a
+    single archive (see the archive module) instead of a directory.
+    '''
+    if compression is None:
+        return _Assets().archive
+    archive.suffix(compression)
+    _Assets().archive = compression
+    return None
+
+
+def background_writes(enable: Optional[bool] = None) -> Optional[bool]:
+    '''
+    Background writes getter/setter. If a value is provided, then it acts as
+    a setter, acting as a getter otherwise. When enabled, write() snapshots
+    the collected assets (see BaseAsset.snapshot()) and returns immediately,
+    while a writer thread writes them. File sources are copied, and the log is
+    written as it was when write() was called: messages logged later,
+    including those of the writer thread, go to the next write of the log.
+    Use wait_for_writes() to wait for the writes to complete. Errors are
+    raised by the next write() or wait_for_writes() call.
+    '''
+    if enable is None:
+        return _TheFlusher().enabled
+    _TheFlusher().enabled = enable
+    return None
+
+
+def wait_for_writes() -> None:
+    '''
+    Waits for all background writes to complete. Raises RuntimeError if any
+    failed.
+    '''
+    _TheFlusher().wait()
+
+
+def write(basep: str) -> str:
     '''
-    Writes data rooted at basep.
+    Writes data rooted at basep. Returns the path written to: basep or, when
+    writing archives, the archive's path.
     '''
-    _Data(basep).write()
+    return _Data(basep).write()
 
 
 def add_asset(asset: BaseAsset) -> None:
@@ -5,6 +5,7 @@
 # This file is part of the bueno project. See the LICENSE file at the
 # top-level directory of this distribution for more information.
 #
+# pylint: disable=too-many-lines
 
 '''
 Convenience data sinks.
@@ -13,24 +14,40 @@ Convenience data sinks.
 from abc import ABC, abstractmethod
 from typing import (
     Any,
+    Callable,
+    Deque,
     Dict,
+    Iterable,
     List,
     Optional,
+    Tuple,
+    TypeVar,
     Union
 )
 
+import atexit
 import collections
-import copy
 from datetime import datetime
+import hashlib
 import logging
+import os
+import re
 import ssl
+import sys
+import tempfile
+import threading
 import time
+import weakref
 
 import json
 import pika  # type: ignore
 import lark
 
+from bueno.core import metacls
+
+from bueno.public import experiment
 from bueno.public import logger
+from bueno.public import outbox
 from bueno.public import utils
 
 # InfluxDBMeasurement value types
@@ -39,6 +56,19 @@ _InfluxDBValueType = Dict[str, Union[_IDBSimple, Dict[str, _IDBSimple]]]
 
 _JSONValueType = Dict[Any, Any]
 
+_T = TypeVar('_T')
+
+# Errors after which a publish is retried on a new connection. Delivery
+# failures (e.g., unroutable or nacked messages) are not retried.
+_RECONNECT_ERRORS = (
+    pika.exceptions.AMQPConnectionError,
+    pika.exceptions.ChannelClosed,
+    pika.exceptions.ChannelWrongStateError
+)
+
+# The number of seconds publishers are given to drain at exit.
+EXIT_DRAIN_TIMEOUT: float = 30.0
+
 
 class Table:
     '''
@@ -114,8 +144,15 @@ class Measurement(ABC):
 
 
 class _InfluxLineProtocolParser():
-    def __init__(self) -> None:
-        self.grammar = '''
+    '''
+    Validates InfluxDB line protocol. Lines are first matched against a
+    precompiled regular expression accepting common, valid lines. Only the
+    lines it does not accept are parsed by the (slower) Lark parser, which
+    either accepts them or raises an exception detailing the error. The Lark
+    parser is built once per process, and its grammar analysis is cached on
+    disk (see _cache_path()).
+    '''
+    grammar = '''
             line: name SPACE fields SPACE UNIX_TIME NEWLINE
                 | name COMMA tags SPACE fields SPACE UNIX_TIME NEWLINE
 
@@ -170,6 +207,21 @@ class _InfluxLineProtocolParser():
             %import common.SIGNED_INT
         '''
 
+    # A subset of the grammar's language, as a regular expression.
+    _name = r'[A-Za-z0-9][A-Za-z0-9_.\-]*'
+    _tag_value = r'(?:[A-Za-z0-9_.\-]+|\+[0-9]+)'
+    _number = r'[+\-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+\-]?[0-9]+)?'
+    _string = r'"(?:[^"\\\n]|\\[^\n])*"'
+    _field_value = f'(?:{_number}|{_string}|True|False)'
+    _fast = re.compile(
+        f'{_name}(?:,{_name}={_tag_value})* '
+        f'{_name}={_field_value}(?:,{_name}={_field_value})* '
+        r'[+\-]?[0-9]+\n'
+    )
+    # The Lark parser, once built.
+    _lark: Optional[lark.Lark] = None
+    _lark_lock = threading.Lock()
+
     class _Transformer(lark.Transformer):  # type: ignore
         def INFLUX_NAME(  # pylint: disable=invalid-name,no-self-use
             self,
@@ -188,59 +240,102 @@ class _InfluxLineProtocolParser():
                 raise SyntaxError(ers)
             return tok
 
+    @classmethod
+    def _cache_path(cls) -> str:
+        '''
+        Returns the path of the on-disk parser cache, which is specific to the
+        grammar and the Lark and Python versions.
+        '''
+        key = f'{cls.grammar}{lark.__version__}{sys.version_info[:2]}'
+        digest = hashlib.sha256(key.encode('utf8')).hexdigest()[:16]
+        cached = os.environ.get('XDG_CACHE_HOME') or \
+            os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cached, 'bueno', f'influx-line-protocol-{digest}')
+
+    @classmethod
+    def _build(cls) -> lark.Lark:
+        '''
+        Returns a Lark parser, loaded from the on-disk cache if possible.
+        Otherwise, the parser is built and saved to the cache. Cache failures
+        are not fatal.
+        '''
+        cachep = cls._cache_path()
+        try:
+            with open(cachep, 'rb') as file:
+                return lark.Lark.load(file)  # type: ignore
+        except Exception:  # pylint: disable=broad-except
+            pass
+        parser = lark.Lark(cls.grammar, parser='lalr', start='line')
+        try:
+            os.makedirs(os.path.dirname(cachep), 0o700, exist_ok=True)
+            fdesc, tmpp = tempfile.mkstemp(dir=os.path.dirname(cachep))
+            with os.fdopen(fdesc, 'wb') as file:
+                parser.save(file)  # type: ignore
+            os.replace(tmpp, cachep)
+        except OSError:
+            pass
+        return parser
+
+    @classmethod
+    def _parser(cls) -> lark.Lark:
+        '''
+        Returns the Lark parser, building it if needed.
+        '''
+        with cls._lark_lock:
+            if cls._lark is None:
+                cls._lark = cls._build()
+            return cls._lark
+
     def parse(self, istr: str) -> None:
         '''
         Attempts to parse the provided input. Raises an exception if parsing
         fails.
         '''
-        parser = lark.Lark(
-            self.grammar,
-            parser='lalr',
-            start='line',
-            transformer=_InfluxLineProtocolParser._Transformer()
-        )
-        parser.parse(istr)
-
-
-def _unroll_dict_impl(
-    indict: Dict[str, Any], udict: Dict[str, Any]
-) -> Dict[str, Any]:
-    # Base case
-    if len(indict) == 0:
-        return udict
-    # Not base case
-    inkey = list(indict.keys())[0]
-    inval = indict[inkey]
-    # inval is not dictionary.
-    if not isinstance(inval, dict):
-        if inkey in udict.keys():
-            pvw = f'Previous value was {udict[inkey]}.'
-            raise ValueError(
-                f'Duplicate key generated for {{{inkey}: {inval}}}. {pvw}'
-            )
-        udict[inkey] = inval
-        del indict[inkey]
-        return _unroll_dict_impl(indict, udict)
-    # inval is a dictionary.
-    if len(inval) == 0:
-        del indict[inkey]
-        return _unroll_dict_impl(indict, udict)
-    valkey = list(inval.keys())[0]
-    valval = inval.pop(valkey)
-    new_key = f'{inkey}_{valkey}'
-    if new_key in indict.keys():
-        pvw = f'Previous value was {indict[new_key]}.'
-        raise ValueError(
-            f'Duplicate key generated for {{{new_key}: {valval}}}. {pvw}'
-        )
-    indict[new_key] = valval
-    return _unroll_dict_impl(indict, udict)
+        if self._fast.fullmatch(istr):
+            return
+        tree = self._parser().parse(istr)
+        try:
+            _InfluxLineProtocolParser._Transformer().transform(tree)
+        except lark.exceptions.VisitError as exception:
+            raise exception.orig_exc from exception
 
 
 def _unroll_dict(indict: Dict[str, Any]) -> Dict[str, Any]:
-    tmpd: Dict[str, Any] = {}
-    indict_copy = copy.deepcopy(indict)
-    return _unroll_dict_impl(indict_copy, tmpd)
+    '''
+    Returns a flattened copy of the provided dictionary: nested dictionaries
+    are replaced by their items, keyed by their keys joined to the enclosing
+    key with an underscore. Entries are processed first in, first out, with
+    the items of a nested dictionary queued after all entries pending, so
+    keys are ordered breadth first. Raises ValueError if a generated key
+    duplicates a key pending or already produced. The input is not modified
+    and leaf values are not copied.
+    '''
+    queue: Deque[Tuple[Any, Any]] = collections.deque(indict.items())
+    # Maps the keys of entries not yet processed to their values.
+    pending = dict(indict)
+    res: Dict[str, Any] = {}
+    while queue:
+        key, val = queue.popleft()
+        if not isinstance(val, dict):
+            if key in res:
+                pvw = f'Previous value was {res[key]}.'
+                raise ValueError(
+                    f'Duplicate key generated for {{{key}: {val}}}. {pvw}'
+                )
+            res[key] = val
+        else:
+            for valkey, valval in val.items():
+                new_key = f'{key}_{valkey}'
+                if new_key in pending:
+                    pvw = f'Previous value was {pending[new_key]}.'
+                    raise ValueError(
+                        f'Duplicate key generated for {{{new_key}: {valval}}}. '
+                        f'{pvw}'
+                    )
+                pending[new_key] = valval
+                queue.append((new_key, valval))
+        del pending[key]
+    return res
 
 
 class JSONMeasurement(Measurement):
@@ -408,10 +503,159 @@ class RabbitMQConnectionParams:
         self.tls_config = tls_config
 
 
+def _line(measurement: Measurement) -> bytes:
+    '''
+    Returns the measurement's data as a newline-terminated line.
+    '''
+    msg = measurement.data()
+    if not msg.endswith('\n'):
+        msg += '\n'
+    return msg.encode('utf8')
+
+
+class _RabbitMQConnection:  # pylint: disable=too-many-instance-attributes
+    '''
+    Keeps a single connection to a RabbitMQ broker, along with a channel in
+    confirm mode, open across publishes. Connections are established on
+    demand, so closed or failed connections (e.g., those closed by the broker
+    after a long idle period) are transparently replaced. While connected, a
+    keepalive thread services heartbeats between publishes. Access is
+    serialized, since pika connections are not thread-safe.
+    '''
+    def __init__(
+            self,
+            params: pika.ConnectionParameters,
+            retries: int = 1
+    ) -> None:
+        # The parameters used to connect.
+        self.params = params
+        # The number of times a failed call is retried on a new connection.
+        self.retries = retries
+        # The number of connections established thus far.
+        self.nconnects = 0
+        self.connection: Any = None
+        self.channel: Any = None
+        self.lock = threading.RLock()
+        # Stops the keepalive thread of the current connection.
+        self._stop = threading.Event()
+
+    def _connect(self) -> Any:
+        '''
+        Returns an open channel, connecting if necessary.
+        '''
+        if self.channel is not None and self.channel.is_open and \
+                self.connection.is_open:
+            return self.channel
+        self._reset()
+        self.connection = pika.BlockingConnection(self.params)
+        self.channel = self.connection.channel()
+        self.channel.confirm_delivery()
+        self.nconnects += 1
+        self._start_keepalive()
+        return self.channel
+
+    def _reset(self) -> None:
+        '''
+        Stops the connection's keepalive thread and closes the connection, if
+        open, ignoring errors.
+        '''
+        self._stop.set()
+        conn = self.connection
+        self.connection = None
+        self.channel = None
+        if conn is not None and conn.is_open:
+            try:
+                conn.close()
+            except (pika.exceptions.AMQPError, OSError):
+                pass
+
+    def _start_keepalive(self) -> None:
+        '''
+        Starts a keepalive thread for the new connection, if heartbeats are
+        enabled. Each connection gets its own stop event, set once the
+        connection is reset.
+        '''
+        self._stop = threading.Event()
+        heartbeat = self.params.heartbeat
+        if not isinstance(heartbeat, (int, float)) or heartbeat <= 0:
+            return
+        threading.Thread(
+            target=_RabbitMQConnection._keep_alive,
+            args=(weakref.ref(self), self._stop, max(heartbeat / 2.0, 0.5)),
+            name='bueno-rabbitmq-keepalive',
+            daemon=True
+        ).start()
+
+    @staticmethod
+    def _keep_alive(
+            ref: 'weakref.ref[_RabbitMQConnection]',
+            stop: threading.Event,
+            interval: float
+    ) -> None:
+        '''
+        Services heartbeats every interval seconds until stopped or until the
+        connection manager is no longer referenced.
+        '''
+        while not stop.wait(interval):
+            conn = ref()
+            if conn is None:
+                return
+            with conn.lock:
+                # The connection may have been replaced while waiting.
+                if stop.is_set():
+                    return
+                if conn.connection is None or not conn.connection.is_open:
+                    continue
+                try:
+                    conn.connection.process_data_events(time_limit=0)
+                except (pika.exceptions.AMQPError, OSError):
+                    # Reconnect at the next call.
+                    conn._reset()  # pylint: disable=protected-access
+            del conn
+
+    def call(self, fun: Callable[[Any], _T]) -> _T:
+        '''
+        Calls fun with an open channel, returning its result. If the connection
+        fails, then fun is retried on a new connection (up to retries times),
+        so messages may be published more than once.
+        '''
+        with self.lock:
+            attempt = 0
+            while True:
+                try:
+                    return fun(self._connect())
+                except _RECONNECT_ERRORS:
+                    self._reset()
+                    if attempt >= self.retries:
+                        raise
+                    attempt += 1
+
+    def close(self) -> None:
+        '''
+        Stops the keepalive thread and closes the connection. Later calls
+        reconnect.
+        '''
+        with self.lock:
+            self._reset()
+
+
 class RabbitMQBlockingClient:  # pylint: disable=too-many-instance-attributes
     '''
     A straightforward AMQP 0-9-1 blocking client interface that ultimately wraps
-    Pika.
+    Pika. A single connection is kept open across sends (see close()).
+
+    Measurements sent in batches (see send_batch() and add()) are packed into
+    newline-delimited messages (line protocol or NDJSON) of at most batch_size
+    measurements and batch_bytes bytes. Measurements added to the buffer are
+    sent once either limit is reached or once the oldest buffered measurement
+    is batch_age seconds old, even if no more are added. Buffered
+    measurements that cannot be sent (when there is no spool) are kept
+    buffered for the next attempt.
+
+    If a spool (an outbox.Outbox) is provided, measurements that cannot be
+    sent because the MQ server is unreachable are appended to it instead, to
+    be sent later by a replay (see bueno replay). If defer is True, all
+    measurements are appended to the spool without contacting the server.
     '''
     def __init__(  # pylint: disable=too-many-arguments
         self,
@@ -420,23 +664,51 @@ class RabbitMQBlockingClient:  # pylint: disable=too-many-instance-attributes
         exchange: str,
         routing_key: str,
         verbose: bool = False,
+        *,
+        batch_size: int = 1000,
+        batch_bytes: int = 1024 * 1024,
+        batch_age: float = 1.0,
+        spool: Optional[outbox.Outbox] = None,
+        defer: bool = False
     ) -> None:
+        if defer and spool is None:
+            raise ValueError('Deferring measurements requires a spool.')
         self.conn_params = conn_params
         self.queue_name = queue_name
         self.exchange = exchange
         self.routing_key = routing_key
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.batch_age = batch_age
+        self.spool = spool
+        self.defer = defer
+        # The number of measurements appended to the spool.
+        self.spooled = 0
+        # Buffered measurement data and their total size.
+        self._buffer: List[bytes] = []
+        self._buffer_bytes = 0
+        # When the oldest buffered measurement was added.
+        self._buffer_time = 0.0
+        self._buffer_lock = threading.Lock()
+        # Sends the buffered measurements once they are batch_age seconds old.
+        self._timer: Optional[threading.Timer] = None
 
         # Set pika logging level based on verbosity level.
         if not verbose:
             logging.getLogger("pika").setLevel(logging.WARNING)
+        # The connection manager, which connects at the first send.
+        self._conn = _RabbitMQConnection(self._connection_params())
 
-    def send(self, measurement: Measurement, verbose: bool = False) -> None:
+    def __enter__(self) -> 'RabbitMQBlockingClient':
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def _connection_params(self) -> pika.ConnectionParameters:
         '''
-        Sends the contexts of measurement to the MQ server.
+        Returns the pika connection parameters.
         '''
-        # Establish the connection for each send. We do this because if the main
-        # thread creates an instance and we initialize a connection there, then
-        # long-running jobs may cause timeouts. This gets around that problem.
         connp = self.conn_params
         ssl_options = None
         if connp.tls_config is not None:
@@ -454,22 +726,568 @@ class RabbitMQBlockingClient:  # pylint: disable=too-many-instance-attributes
             credentials=credentials,
             ssl_options=ssl_options
         )
+        return connection_params
 
-        with pika.BlockingConnection(connection_params) as connection:
-            channel = connection.channel()
-            channel.confirm_delivery()
-            msg = measurement.data()
+    @property
+    def connections(self) -> int:
+        '''
+        Returns the number of connections established thus far.
+        '''
+        return self._conn.nconnects
+
+    def _publish(self, body: Union[str, bytes]) -> None:
+        '''
+        Publishes a message with mandatory routing, waiting for its confirm.
+        '''
+        self._conn.call(lambda channel: channel.basic_publish(
+            exchange=self.exchange,
+            routing_key=self.routing_key,
+            body=body,
+            mandatory=True
+        ))
+
+    def _spool(
+            self,
+            lines: List[bytes],
+            exception: Optional[Exception] = None
+    ) -> int:
+        '''
+        Appends the provided lines to the spool. Returns the number appended.
+        Raises the provided exception if there is no spool.
+        '''
+        if self.spool is None:
+            assert exception is not None  # nosec
+            raise exception
+        count = self.spool.append(lines)
+        self.spooled += count
+        if exception is not None:
+            logger.log(f'# {type(self).__name__}: Appended {count} '
+                       f'measurement(s) to {self.spool.path}: {exception!r}')
+        return count
+
+    def send(self, measurement: Measurement, verbose: bool = False) -> None:
+        '''
+        Sends the contexts of measurement to the MQ server.
+        '''
+        msg = measurement.data()
+        if self.defer:
+            self._spool([_line(measurement)])
+            return
+        try:
+            self._publish(msg)
+            if verbose:
+                logger.log(f'{type(self).__name__} sent: ({msg.rstrip()})')
+        except pika.exceptions.UnroutableError:
+            logger.log(f'Error sending the following message: {msg}')
+        except _RECONNECT_ERRORS as exception:
+            self._spool([_line(measurement)], exception)
+
+    def _pack(self, lines: List[bytes]) -> Iterable[Tuple[bytes, int]]:
+        '''
+        Yields message bodies packing the provided lines within the batch
+        limits, along with the number of lines each holds.
+        '''
+        start = 0
+        nbytes = 0
+        for idx, line in enumerate(lines):
+            if idx > start and (idx - start >= self.batch_size or
+                                nbytes + len(line) > self.batch_bytes):
+                yield b''.join(lines[start:idx]), idx - start
+                start = idx
+                nbytes = 0
+            nbytes += len(line)
+        if start < len(lines):
+            yield b''.join(lines[start:]), len(lines) - start
+
+    def send_lines(self, lines: List[bytes], verbose: bool = False) -> int:
+        '''
+        Sends the provided (newline-terminated) measurement data lines in
+        batches. Returns the number sent or appended to the spool. Connection
+        failures are raised if there is no spool.
+        '''
+        if self.defer:
+            return self._spool(lines)
+        sent, done, exception = self._publish_lines(lines, verbose)
+        if exception is not None:
+            return sent + self._spool(lines[done:], exception)
+        return sent
+
+    def _publish_lines(
+            self,
+            lines: List[bytes],
+            verbose: bool
+    ) -> Tuple[int, int, Optional[Exception]]:
+        '''
+        Publishes the provided lines in batches, stopping at the first
+        connection failure. Returns the number of lines sent, the number
+        handled (sent or reported unroutable), and the failure, if any.
+        '''
+        sent = 0
+        done = 0
+        for body, count in self._pack(lines):
             try:
-                channel.basic_publish(
-                    exchange=self.exchange,
-                    routing_key=self.routing_key,
-                    body=msg,
-                    mandatory=True
-                )
+                self._publish(body)
+                sent += count
                 if verbose:
-                    logger.log(f'{type(self).__name__} sent: ({msg.rstrip()})')
+                    logger.log(f'{type(self).__name__} sent {count} '
+                               f'measurement(s) ({len(body)} B)')
             except pika.exceptions.UnroutableError:
-                logger.log(f'Error sending the following message: {msg}')
+                logger.log(f'Error sending a batch of {count} measurement(s) '
+                           f'({len(body)} B)')
+            except _RECONNECT_ERRORS as exception:
+                return sent, done, exception
+            done += count
+        return sent, done, None
+
+    def send_batch(
+            self,
+            measurements: Iterable[Measurement],
+            verbose: bool = False
+    ) -> int:
+        '''
+        Sends the provided measurements to the MQ server in as few messages as
+        the batch limits allow. Each message is published with mandatory
+        routing and confirmed, so routing failures are reported per batch.
+        Returns the number of measurements sent.
+        '''
+        return self.send_lines([_line(m) for m in measurements], verbose)
+
+    def add(self, measurement: Measurement, verbose: bool = False) -> None:
+        '''
+        Adds the provided measurement to the buffer, sending the buffered
+        measurements if a batch limit is reached (see flush()).
+        '''
+        line = _line(measurement)
+        with self._buffer_lock:
+            if not self._buffer:
+                self._buffer_time = time.monotonic()
+                self._start_timer()
+            self._buffer.append(line)
+            self._buffer_bytes += len(line)
+            due = len(self._buffer) >= self.batch_size or \
+                self._buffer_bytes >= self.batch_bytes or \
+                time.monotonic() - self._buffer_time >= self.batch_age
+        if due:
+            self.flush(verbose)
+
+    def _start_timer(self) -> None:
+        '''
+        Starts a timer that sends the buffered measurements in batch_age
+        seconds. Called with the buffer lock held.
+        '''
+        self._timer = threading.Timer(
+            self.batch_age,
+            RabbitMQBlockingClient._flush_aged,
+            args=(weakref.ref(self),)
+        )
+        self._timer.name = 'bueno-rabbitmq-batch-age'
+        self._timer.daemon = True
+        self._timer.start()
+
+    @staticmethod
+    def _flush_aged(ref: 'weakref.ref[RabbitMQBlockingClient]') -> None:
+        '''
+        Sends the buffered measurements of the referenced client, if it still
+        exists. Failures are logged, and the measurements stay buffered.
+        '''
+        client = ref()
+        if client is None:
+            return
+        try:
+            client.flush()
+        except Exception as exception:  # pylint: disable=broad-except
+            logger.log(f'# {type(client).__name__}: Failed to send buffered '
+                       f'measurement(s): {exception!r}')
+
+    def flush(self, verbose: bool = False) -> int:
+        '''
+        Sends the buffered measurements. Returns the number sent. Connection
+        failures are raised if there is no spool, in which case the
+        measurements not sent are kept buffered.
+        '''
+        with self._buffer_lock:
+            lines = self._buffer
+            btime = self._buffer_time
+            self._buffer = []
+            self._buffer_bytes = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not lines:
+            return 0
+        if self.defer or self.spool is not None:
+            return self.send_lines(lines, verbose)
+        sent, done, exception = self._publish_lines(lines, verbose)
+        if exception is not None:
+            unsent = lines[done:]
+            with self._buffer_lock:
+                # Ahead of any measurements added in the meantime.
+                self._buffer[:0] = unsent
+                self._buffer_bytes += sum(len(ln) for ln in unsent)
+                self._buffer_time = btime
+            raise exception
+        return sent
+
+    def close(self) -> None:
+        '''
+        Sends the buffered measurements, then closes the connection to the MQ
+        server, if open. Later sends reconnect.
+        '''
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
+
+
+class BackgroundPublisher:  # pylint: disable=too-many-instance-attributes
+    '''
+    Sends measurements to the MQ server from a worker thread, so callers do not
+    wait on the server. Measurements are queued in a bounded queue (of maxsize
+    measurements) and sent in batches (see RabbitMQBlockingClient). When the
+    queue is full, the policy determines the fate of new measurements: 'block'
+    waits for room, 'drop-oldest' discards the oldest queued measurement, and
+    'spill' appends the new measurement to a spill file (in spill_dir, or the
+    default temporary directory if None) that is sent once the queue empties.
+    With the 'spill' policy, measurements that fail to send are spilled, too,
+    and retried every retry_interval seconds.
+
+    Publishers are drained (see drain()) at the start of every
+    experiment.flush_data() call and at exit. With the 'spill' policy, a drain
+    stops at the first failed send, leaving the measurements not yet sent in
+    the spill file.
+    '''
+    policies = ('block', 'drop-oldest', 'spill')
+
+    def __init__(  # pylint: disable=too-many-arguments
+            self,
+            client: RabbitMQBlockingClient,
+            maxsize: int = 10000,
+            policy: str = 'block',
+            spill_dir: Optional[str] = None,
+            retry_interval: float = 5.0
+    ) -> None:
+        if policy not in self.policies:
+            raise ValueError(f'Unknown policy: {policy}. '
+                             f'Choose one of {self.policies}.')
+        if maxsize <= 0:
+            raise ValueError('maxsize must be positive.')
+        self.client = client
+        self.maxsize = maxsize
+        self.policy = policy
+        self.spill_dir = spill_dir
+        self.retry_interval = retry_interval
+        # The number of measurements sent, appended to the client's outbox
+        # (see RabbitMQBlockingClient), dropped (by the drop-oldest policy),
+        # spilled (by the spill policy, to make room in the queue or when a
+        # drain stops), and failed (not sent).
+        self.sent = 0
+        self.outboxed = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.failed = 0
+        # The number of failed sends thus far.
+        self.failures = 0
+        # Path to the spill file, if any.
+        self.spillp: Optional[str] = None
+        self._queue: Deque[bytes] = collections.deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        # Whether or not the last send failed.
+        self._failing = False
+        # Whether or not the worker stopped, and the error that stopped it.
+        self._stopped = False
+        self._error: Optional[Exception] = None
+        self._worker = threading.Thread(
+            target=self._run, name='bueno-publisher', daemon=True
+        )
+        self._worker.start()
+        _ThePublishers().add(self)
+
+    @property
+    def queued(self) -> int:
+        '''
+        Returns the number of measurements queued.
+        '''
+        with self._cond:
+            return len(self._queue)
+
+    def counters(self) -> Dict[str, int]:
+        '''
+        Returns the numbers of measurements queued, sent, appended to the
+        client's outbox, dropped, spilled, and failed.
+        '''
+        with self._cond:
+            return {
+                'queued': len(self._queue),
+                'sent': self.sent,
+                'outboxed': self.outboxed,
+                'dropped': self.dropped,
+                'spilled': self.spilled,
+                'failed': self.failed
+            }
+
+    def publish(self, measurement: Measurement) -> None:
+        '''
+        Queues the provided measurement for sending. Raises RuntimeError if the
+        publisher is closed or its worker stopped.
+        '''
+        line = _line(measurement)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Publishing to a closed publisher.')
+            while True:
+                if self._stopped:
+                    raise RuntimeError("The publisher's worker stopped.")
+                if len(self._queue) < self.maxsize:
+                    break
+                if self.policy == 'block':
+                    self._cond.wait()
+                elif self.policy == 'drop-oldest':
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    self._spill([line])
+                    self.spilled += 1
+                    self._cond.notify_all()
+                    return
+            self._queue.append(line)
+            self._cond.notify_all()
+
+    def _spill(self, lines: Iterable[bytes]) -> None:
+        '''
+        Appends the provided lines to the spill file. Called with the lock
+        held.
+        '''
+        if self.spillp is None:
+            fdesc, self.spillp = tempfile.mkstemp(
+                prefix='bueno-spill-', suffix='.txt', dir=self.spill_dir
+            )
+            os.close(fdesc)
+        with open(self.spillp, 'ab') as file:
+            file.writelines(lines)
 
+    def _next(self) -> Tuple[List[bytes], Optional[str]]:
+        '''
+        Waits for work, returning the next batch of queued lines or, once the
+        queue is empty, the spill file to send. Returns no lines and no file
+        once closed and idle. Called with the lock held.
+        '''
+        while not self._queue and self.spillp is None and not self._closed:
+            self._cond.wait()
+        if self._queue:
+            count = min(len(self._queue), self.client.batch_size)
+            return [self._queue.popleft() for _ in range(count)], None
+        spillp = self.spillp
+        self.spillp = None
+        return [], spillp
+
+    def _run(self) -> None:
+        '''
+        The worker thread's main function. Should the worker stop on an
+        unexpected error, publish() and drain() no longer wait for it.
+        '''
+        try:
+            self._loop()
+        except Exception as exception:  # pylint: disable=broad-except
+            logger.log(f'# {type(self).__name__}: Stopped: {exception!r}')
+            self._error = exception
+        finally:
+            with self._cond:
+                self._stopped = True
+                self._cond.notify_all()
+
+    def _loop(self) -> None:
+        '''
+        The worker thread's main loop.
+        '''
+        while True:
+            with self._cond:
+                lines, spillp = self._next()
+                if not lines and spillp is None:
+                    return
+                self._busy = True
+                # There is room in the queue now.
+                self._cond.notify_all()
+            try:
+                if spillp is None:
+                    self._send(lines)
+                else:
+                    self._send_spilled(spillp)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _send(self, lines: List[bytes]) -> bool:
+        '''
+        Sends the provided lines, spilling or counting them as failed on
+        failure (including, e.g., negative acknowledgments by the server and
+        outbox errors). Returns whether or not they were sent. Only the first
+        of consecutive failures is logged.
+        '''
+        spooled = self.client.spooled
+        try:
+            nsent = self.client.send_lines(lines)
+        except (pika.exceptions.AMQPError, OSError, ValueError) as exception:
+            with self._cond:
+                if self.policy == 'spill':
+                    self._spill(lines)
+                else:
+                    self.failed += len(lines)
+                self.failures += 1
+                failing = self._failing
+                self._failing = True
+                self._cond.notify_all()
+            if not failing:
+                logger.log(f'# {type(self).__name__}: Failed to send '
+                           f'{len(lines)} measurement(s): {exception!r}')
+            if self.policy == 'spill':
+                self._back_off()
+            return False
+        outboxed = self.client.spooled - spooled
+        with self._cond:
+            self.sent += nsent - outboxed
+            self.outboxed += outboxed
+            # Unroutable measurements are reported by the client.
+            self.failed += len(lines) - nsent
+            failing = self._failing
+            self._failing = False
+        if failing:
+            logger.log(f'# {type(self).__name__}: Sending again')
+        return True
+
+    def _back_off(self) -> None:
+        '''
+        Waits retry_interval seconds before the next send, unless closed.
+        '''
+        deadline = time.monotonic() + self.retry_interval
+        with self._cond:
+            while not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+    def _send_spilled(self, spillp: str) -> None:
+        '''
+        Sends the contents of the provided spill file in batches, then removes
+        it. Lines not sent are spilled again.
+        '''
+        with open(spillp, 'rb') as file:
+            while True:
+                lines = [
+                    ln for _, ln in zip(range(self.client.batch_size), file)
+                ]
+                if not lines:
+                    break
+                if not self._send(lines):
+                    with self._cond:
+                        self._spill(file)
+                    break
+        os.unlink(spillp)
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        '''
+        Waits until all queued and spilled measurements are sent (or have
+        failed). Returns False if the timeout (in seconds) expired first, if
+        the worker stopped on an error, or if, with the 'spill' policy, a send
+        failed: queued measurements are then spilled, and retries continue in
+        the background.
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            failures = self.failures
+            while self._queue or self.spillp is not None or self._busy:
+                if self._stopped:
+                    return False
+                if self.policy == 'spill' and self.failures != failures:
+                    self._spill(self._queue)
+                    self.spilled += len(self._queue)
+                    self._queue.clear()
+                    return False
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                self._cond.wait(remaining)
+            # Measurements were lost if the worker stopped on an error.
+            return self._error is None
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        '''
+        Drains the publisher, stops its worker, and closes its client. Returns
+        False if the timeout (in seconds) expired before the publisher drained,
+        in which case spilled measurements remain in the spill file.
+        '''
+        drained = self.drain(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if drained or self._stopped:
+            self._worker.join()
+            self.client.close()
+        _ThePublishers().discard(self)
+        return drained
+
+
+class _ThePublishers(metaclass=metacls.Singleton):
+    '''
+    The background publishers not yet closed.
+    '''
+    def __init__(self) -> None:
+        self.publishers: 'weakref.WeakSet[BackgroundPublisher]' = \
+            weakref.WeakSet()
+        self.lock = threading.Lock()
+        experiment.add_flush_hook(drain)
+        atexit.register(_drain_at_exit)
+
+    def add(self, publisher: BackgroundPublisher) -> None:
+        '''
+        Adds the provided publisher.
+        '''
+        with self.lock:
+            self.publishers.add(publisher)
+
+    def discard(self, publisher: BackgroundPublisher) -> None:
+        '''
+        Removes the provided publisher, if present.
+        '''
+        with self.lock:
+            self.publishers.discard(publisher)
+
+    def all(self) -> List[BackgroundPublisher]:
+        '''
+        Returns the publishers.
+        '''
+        with self.lock:
+            return list(self.publishers)
+
+
+def drain(timeout: Optional[float] = None) -> bool:
+    '''
+    Drains all background publishers (see BackgroundPublisher.drain()),
+    logging their counters and any spill files left. Returns False if any
+    publisher did not drain.
+    '''
+    res = True
+    for pub in _ThePublishers().all():
+        res = pub.drain(timeout) and res
+        counts = ', '.join(f'{k}={v}' for k, v in pub.counters().items())
+        logger.log(f'# {type(pub).__name__} Counters: {counts}')
+        if pub.spillp is not None:
+            logger.log(f'# Unsent measurements remain in {pub.spillp}')
+    return res
+
+
+def _drain_at_exit() -> None:
+    '''
+    Closes all background publishers, giving each EXIT_DRAIN_TIMEOUT seconds
+    to drain.
+    '''
+    for pub in _ThePublishers().all():
+        if not pub.close(EXIT_DRAIN_TIMEOUT) and pub.spillp is not None:
+            logger.log(f'# Unsent measurements remain in {pub.spillp}')
 
 # vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -5,7 +5,7 @@
 # top-level directory of this distribution for more information.
 #
 
-# pylint: disable=fixme
+# pylint: disable=fixme,too-many-lines
 
 '''
 Public experiment utilities for good.
@@ -13,35 +13,53 @@ Public experiment utilities for good.
 
 import argparse
 import ast
+import concurrent.futures
 import copy
+import csv
+import io
 import os
 import re
 import shlex
+import shutil
+import sys
+import tempfile
+import threading
 import typing
+import weakref
 
 from abc import abstractmethod
 
 from typing import (
     Any,
+    Callable,
     Dict,
     Iterable,
     List,
     Tuple,
     Type,
-    Optional
+    Optional,
+    Union
 )
 
 from bueno.core import mathex
 from bueno.core import metacls
+from bueno.core import stats
 
+from bueno.public import archive
+from bueno.public import container
 from bueno.public import data
 from bueno.public import host
 from bueno.public import logger
+from bueno.public import results
+from bueno.public import resultsdb
 from bueno.public import utils
 
 
 _DEV_NULL: str = '/dev/null'
 
+# Type alias for (sorted) FOM sweep parameters.
+_FOMParams = Tuple[Tuple[str, Any], ...]
+
 
 class _TheExperiment(metaclass=metacls.Singleton):
     '''
@@ -51,6 +69,9 @@ class _TheExperiment(metaclass=metacls.Singleton):
         self._name = 'unnamed-experiment'
         self._output_path = os.getcwd()
         self._foutput = '%n/%u/%d/%h/%i'
+        self._results_db: Optional[str] = None
+        # Callables called at the start of every flush_data().
+        self.flush_hooks: List[Callable[[], Any]] = []
 
     @property
     def name(self) -> str:
@@ -103,6 +124,23 @@ class _TheExperiment(metaclass=metacls.Singleton):
             raise RuntimeError(estr)
         self._foutput = fmt
 
+    @property
+    def results_db(self) -> Optional[str]:
+        '''
+        Returns the path to the experiment's results database, if any.
+        '''
+        return self._results_db
+
+    @results_db.setter
+    def results_db(self, path: Optional[str]) -> None:
+        '''
+        Sets the path to the experiment's results database. None disables it.
+        '''
+        if path is not None and utils.emptystr(path):
+            estr = 'Experiment results database path cannot be empty.'
+            raise RuntimeError(estr)
+        self._results_db = path
+
 
 class _TheFOutputCache(metaclass=metacls.Singleton):
     '''
@@ -153,7 +191,9 @@ class _TheFOutputCache(metaclass=metacls.Singleton):
             maxt = 2048*2048
             for subd in range(0, maxt):
                 path = os.path.join(basep, str(subd))
-                if not os.path.isdir(path):
+                if not os.path.isdir(path) and not any(
+                        os.path.exists(path + s) for s in archive.suffixes()
+                ):
                     return str(subd)
             errs = f'Cannot find usable data directory after {maxt} tries.\n' \
                    f'Base output directory searched was: {basep}'
@@ -179,26 +219,100 @@ def flush_data(opath: Optional[str] = None) -> str:
     '''
      Writes cached data to disk at specified or default path rooted at the
      output directory determined at run-time. Returns full path of output.
-
+     When background writes are enabled (see data.background_writes()), the
+     data are written by a writer thread; see wait_for_flush().
     '''
+    for hook in _TheExperiment().flush_hooks:
+        hook()
     based = str(output_path())
+    real_opath = _flush_path(based, opath)
+    logger.log(f'# Flushing Data to {real_opath}')
+    # Clear all cached data because /dev/null was requested as output path.
+    if based == _DEV_NULL:
+        data.clear()
+    else:
+        if len(foms()) > 0:
+            data.add_asset(_FOMCollectionAsset(foms()))
+        cmds = container.commands()
+        if cmds:
+            data.add_asset(data.YAMLDictAsset({'Commands': cmds}, 'commands'))
+        real_opath = data.write(real_opath)
+        if results_db() is not None:
+            _add_results(real_opath, cmds)
+    return real_opath
+
+
+def _flush_path(based: str, opath: Optional[str]) -> str:
+    '''
+    Returns the absolute path, rooted at based, to which data are flushed.
+    '''
     # Default output path. Should match foutput(), but cached. That way the data
     # are flushed to the same spot by default.
     iopath = str(foutput())
     if opath is not None:
         iopath = opath
     cached_path = _TheFOutputCache().path(iopath)
-    real_opath = os.path.join(based, cached_path)
-    real_opath = os.path.abspath(real_opath)
-    logger.log(f'# Flushing Data to {real_opath}')
-    # Clear all cached data because /dev/null was requested as output path.
-    if based == _DEV_NULL:
-        data.clear()
-    else:
-        data.write(real_opath)
+    return os.path.abspath(os.path.join(based, cached_path))
+
+
+def flush_log(opath: Optional[str] = None) -> Optional[str]:
+    '''
+    Writes only the log (and the structured log, if enabled) to the path
+    flush_data() uses, for example, after a run fails, so that the messages
+    logged up to the failure remain on disk. Other cached data are left in
+    place. Returns full path of output, or None if data are not written.
+    '''
+    based = output_path()
+    if based is None or based == _DEV_NULL:
+        return None
+    real_opath = _flush_path(based, opath)
+    logger.log(f'# Flushing Log to {real_opath}')
+    os.makedirs(real_opath, 0o755, exist_ok=True)
+    assets: List[data.BaseAsset] = [data.LoggerAsset()]
+    if logger.structured():
+        assets.append(data.StructuredLoggerAsset())
+    for asset in assets:
+        asset.write(real_opath)
     return real_opath
 
 
+def add_flush_hook(hook: Callable[[], Any]) -> None:
+    '''
+    Adds a callable that is called (without arguments) at the start of every
+    flush_data() call, for example, to complete pending work whose results or
+    log messages belong in the flushed data. Hooks are called in the order
+    added; a hook already added is not added again.
+    '''
+    hooks = _TheExperiment().flush_hooks
+    if hook not in hooks:
+        hooks.append(hook)
+
+
+def wait_for_flush() -> None:
+    '''
+    Waits for the data flushed in the background (see data.background_writes())
+    to be written. Raises RuntimeError if any background write failed.
+    '''
+    data.wait_for_writes()
+
+
+def _add_results(opath: str, cmds: List[Dict[str, Any]]) -> None:
+    '''
+    Adds the run's results to the results database.
+    '''
+    dbpath = str(results_db())
+    logger.log(f'# Adding Results to {dbpath}')
+    run = {
+        'name': name(),
+        'user': host.whoami(),
+        'host': host.hostname(),
+        'date': utils.dates(),
+        'flush_time': utils.nows(),
+        'output_path': opath
+    }
+    resultsdb.ResultsDB(dbpath).add_run(run, cmds, foms().items())
+
+
 class FOM:
     '''
     Figure of Merit data class.
@@ -216,6 +330,289 @@ class FOM:
         self.value = float(value)
 
 
+class FOMCollection:
+    '''
+    A columnar figure of merit store. Values are kept column-wise, as contiguous
+    doubles, keyed by FOM name and sweep parameters (keyword arguments). This
+    allows for vectorized group-by aggregations over many samples.
+    '''
+    def __init__(self) -> None:
+        # Maps (FOM name, sweep parameters) to a column of values.
+        self._cols: Dict[Tuple[str, _FOMParams], stats.Column] = {}
+        # Maps FOM names to their (description, units).
+        self._meta: Dict[str, Tuple[str, str]] = {}
+
+    def __len__(self) -> int:
+        '''
+        Returns the total number of values stored.
+        '''
+        return sum(len(col) for col in self._cols.values())
+
+    @staticmethod
+    def _params(params: Dict[str, Any]) -> _FOMParams:
+        return tuple(sorted(params.items()))
+
+    def _column(
+            self,
+            fname: str,
+            description: str,
+            units: str,
+            params: Dict[str, Any]
+    ) -> stats.Column:
+        pmeta = self._meta.setdefault(fname, (description, units))
+        if pmeta[1] != units:
+            estr = f"Inconsistent units for FOM '{fname}': " \
+                   f"'{pmeta[1]}' != '{units}'"
+            raise ValueError(estr)
+        key = (fname, FOMCollection._params(params))
+        col = self._cols.get(key)
+        if col is None:
+            col = self._cols[key] = stats.column()
+        return col
+
+    def add(self, fom: FOM, **params: Any) -> None:
+        '''
+        Adds the provided FOM, recorded under the given sweep parameters.
+        '''
+        col = self._column(fom.name, fom.description, fom.units, params)
+        col.append(fom.value)
+
+    def extend(  # pylint: disable=too-many-arguments
+            self,
+            fname: str,
+            description: str,
+            units: str,
+            values: Iterable[float],
+            **params: Any
+    ) -> None:
+        '''
+        Adds many values for the named FOM, recorded under the given sweep
+        parameters. NumPy arrays are accepted and appended without per-element
+        conversions.
+        '''
+        stats.extend(self._column(fname, description, units, params), values)
+
+    def items(self) -> Iterable[
+            Tuple[str, str, str, Dict[str, Any], stats.Column]
+    ]:
+        '''
+        Yields (name, description, units, sweep parameters, values) tuples for
+        every column stored.
+        '''
+        for (fname, params), col in self._cols.items():
+            desc, units = self._meta[fname]
+            yield fname, desc, units, dict(params), col
+
+    def names(self) -> List[str]:
+        '''
+        Returns the names of the FOMs stored, in order of first appearance.
+        '''
+        return list(self._meta)
+
+    def clear(self) -> None:
+        '''
+        Removes all values from the collection.
+        '''
+        self._cols = {}
+        self._meta = {}
+
+    def nbytes(self) -> int:
+        '''
+        Returns the (approximate) number of bytes used to store the values.
+        '''
+        return sum(sys.getsizeof(col) for col in self._cols.values())
+
+    def copy(self) -> 'FOMCollection':
+        '''
+        Returns a copy of the collection.
+        '''
+        res = FOMCollection()
+        # pylint: disable=protected-access
+        res._meta = dict(self._meta)
+        res._cols = {k: stats.column(v) for k, v in self._cols.items()}
+        return res
+
+    def _groups(
+            self,
+            fname: str,
+            params: Dict[str, Any]
+    ) -> Iterable[Tuple[_FOMParams, stats.Column]]:
+        for (cname, cparams), col in self._cols.items():
+            if cname != fname:
+                continue
+            cparamsd = dict(cparams)
+            if all(cparamsd.get(k) == v for k, v in params.items()):
+                yield cparams, col
+
+    def values(self, fname: str, **params: Any) -> Any:
+        '''
+        Returns the values of the named FOM recorded under sweep parameters
+        matching the ones provided. A NumPy array is returned if NumPy is
+        available, an array.array otherwise. Either holds a copy, so the
+        collection can grow while it is in use.
+        '''
+        cols = [col for _, col in self._groups(fname, params)]
+        return stats.view(stats.concat(cols))
+
+    def summarize(
+            self,
+            by: Optional[Iterable[str]] = None,  # pylint: disable=invalid-name
+            percentiles: Iterable[float] = (5.0, 95.0)
+    ) -> List[Dict[str, Any]]:
+        '''
+        Returns a list of summary statistics (count, mean, median, stddev, min,
+        max, and the requested percentiles) for each FOM, grouped by all of the
+        recorded sweep parameters or, if provided, only by the parameter names
+        in by.
+        '''
+        pcts = list(percentiles)
+        # Maps (FOM name, grouping parameters) to columns in that group.
+        groups: Dict[Tuple[str, _FOMParams], List[stats.Column]] = {}
+        bys = None if by is None else list(by)
+        for (fname, params), col in self._cols.items():
+            gparams = params
+            if bys is not None:
+                paramsd = dict(params)
+                gparams = tuple((k, paramsd.get(k)) for k in bys)
+            groups.setdefault((fname, gparams), []).append(col)
+
+        res = []
+        for (fname, gparams), cols in groups.items():
+            col = cols[0] if len(cols) == 1 else stats.concat(cols)
+            if len(col) == 0:
+                continue
+            desc, units = self._meta[fname]
+            res.append({
+                'name': fname,
+                'description': desc,
+                'units': units,
+                'params': dict(gparams),
+                'stats': stats.summarize(col, pcts)
+            })
+        return res
+
+    def write_csv(self, fileobj: typing.TextIO) -> None:
+        '''
+        Writes all values in long format (name, sweep parameters..., value) as
+        CSV to the provided file object.
+        '''
+        pnames: List[str] = []
+        for _, params in self._cols:
+            for pname, _ in params:
+                if pname not in pnames:
+                    pnames.append(pname)
+        writer = csv.writer(fileobj, lineterminator='\n')
+        writer.writerow(['name'] + pnames + ['value'])
+        for (fname, params), col in self._cols.items():
+            paramsd = dict(params)
+            # Format the (constant) row prefix once per column.
+            prefio = io.StringIO()
+            csv.writer(prefio, lineterminator='').writerow(
+                [fname] + [paramsd.get(p, '') for p in pnames] + ['']
+            )
+            prefix = prefio.getvalue()
+            fileobj.write(str().join(f'{prefix}{v!r}\n' for v in col))
+
+
+class _TheFOMCollection(FOMCollection, metaclass=metacls.Singleton):
+    '''
+    The experiment-wide FOM collection singleton.
+    '''
+
+
+class _FOMCollectionAsset(data.BaseAsset):
+    '''
+    Data asset that stores a snapshot of a FOM collection as a YAML summary and
+    a CSV file containing all recorded values.
+    '''
+    def __init__(self, fomc: FOMCollection) -> None:
+        super().__init__()
+        # A copy of the provided collection (None once spilled).
+        self.fomc: Optional[FOMCollection] = fomc.copy()
+        # Base name of the generated files.
+        self.fname = 'foms'
+
+    def _fnames(self) -> List[str]:
+        '''
+        Returns the names of the generated files.
+        '''
+        return [f'{self.fname}.yaml', f'{self.fname}.csv']
+
+    def _write_files(self, basep: str) -> None:
+        '''
+        Writes the generated files to basep.
+        '''
+        assert self.fomc is not None  # nosec
+        sump, csvp = (os.path.join(basep, f) for f in self._fnames())
+        with open(sump, 'w+', encoding='utf8') as file:
+            file.write(utils.yamls({'FOMs': self.fomc.summarize()}))
+        with open(csvp, 'w+', encoding='utf8', newline='') as file:
+            self.fomc.write_csv(file)
+
+    def write(self, basep: str) -> None:
+        if self._spillp is None:
+            self._write_files(basep)
+        self.nbytes = 0
+        for fname in self._fnames():
+            opath = os.path.join(basep, fname)
+            if self._spillp is not None:
+                shutil.move(os.path.join(self._spillp, fname), opath)
+            self.nbytes += os.path.getsize(opath)
+            self.record(opath)
+        if self._spillp is not None:
+            os.rmdir(self._spillp)
+
+    def resident(self) -> int:
+        if self.fomc is None:
+            return 0
+        return self.fomc.nbytes()
+
+    def spill(self, spilld: Optional[str] = None) -> int:
+        '''
+        Writes the generated files to a temporary directory in spilld (the
+        default temporary directory if None), from which they are moved into
+        place when the asset is written.
+        '''
+        if self.fomc is None:
+            return 0
+        nbytes = self.resident()
+        tmpd = tempfile.mkdtemp(prefix='bueno-asset-', dir=spilld)
+        # Remove the directory if the asset is never written.
+        weakref.finalize(self, shutil.rmtree, tmpd, True)
+        self._write_files(tmpd)
+        self._spillp = tmpd
+        self.fomc = None
+        return nbytes
+
+    def members(self) -> List[archive.Member]:
+        '''
+        Returns the archive members holding the generated files, which are
+        streamed from disk: the collection is spilled first, if it is not yet.
+        '''
+        self.spill()
+        assert self._spillp is not None  # nosec
+        return [
+            archive.Member.from_file(os.path.join(self._spillp, f), f)
+            for f in self._fnames()
+        ]
+
+    def spilled_bytes(self) -> int:
+        if self._spillp is None or not os.path.isdir(self._spillp):
+            return 0
+        return sum(
+            os.path.getsize(os.path.join(self._spillp, f))
+            for f in os.listdir(self._spillp)
+        )
+
+
+def foms() -> FOMCollection:
+    '''
+    Returns the experiment-wide FOM collection. Its contents are written (in
+    their entirety) to the output directory during flush_data().
+    '''
+    return _TheFOMCollection()
+
+
 class CLIAddArgsAction:
     '''
     Base action class used to add additional arguments to a CLIConfiguration
@@ -341,6 +738,22 @@ def name(ename: Optional[str] = None) -> Optional[str]:
     return None
 
 
+def results_db(path: Optional[str] = None) -> Optional[str]:
+    '''
+    Experiment results database path getter/setter. If a path is provided,
+    then it acts as a setter, acting as a getter otherwise. When set,
+    flush_data() also adds the run, its commands, and its FOMs to the SQLite
+    database at that path (see bueno.public.resultsdb).
+    '''
+    if path is None:
+        return _TheExperiment().results_db
+    if not isinstance(path, str):
+        estr = f'{__name__}.results_db() expects a string.'
+        raise ValueError(estr)
+    _TheExperiment().results_db = path
+    return None
+
+
 def output_path(path: Optional[str] = None) -> Optional[str]:
     '''
     Experiment data output path getter/setter. If a path is provided, then it
@@ -380,19 +793,13 @@ def _expand_all_shell_vars(instr: str) -> str:
     return instr
 
 
-def readgs(
+def _readgs_lines(
         gspath: str,
         config: Optional[CLIConfiguration] = None
-) -> Iterable[str]:
+) -> Iterable[Tuple[str, List[str]]]:
     '''
-    A convenience routine for reading generate specification files.
-
-    TODO(skg) Add description of formatting rules, semantics, etc. Don't forget
-    about yield!
-
-    We accept the following forms:
-    # -a/--aarg [ARG_PARAMS] -b/--bargs [ARG PARAMS]
-    # -c/--carg [ARG PARAMS] [positional arguments]
+    Private generator that yields (generate specification, argument list)
+    pairs read from the provided generate specification file.
     '''
     logger.emlog(f'# Reading Generate Specification File: {gspath}')
     # Emit contents of gs file.
@@ -400,8 +807,12 @@ def readgs(
     logger.log(utils.chomp(str().join(utils.cat(gspath))))
     logger.log('# End Generate Specification\n')
 
+    if config is not None and not isinstance(config, CLIConfiguration):
+        estr = f'{__name__} expects an instance of CLIConfiguration'
+        raise ValueError(estr)
+
     with open(gspath, encoding='utf8') as file:
-        argv = []
+        argv: List[str] = []
         lines = [x.strip() for x in utils.read_logical_lines(file)]
         for line in lines:
             # Interpret as special comment used to specify run-time arguments.
@@ -414,20 +825,174 @@ def readgs(
             # Skip comments and empty lines.
             if line.startswith('#') or utils.emptystr(line):
                 continue
-            # Parse arguments if provided an argument parser.
-            gsargs = None
-            if config is not None:
-                if not isinstance(config, CLIConfiguration):
-                    estr = f'{__name__} expects an instance of CLIConfiguration'
-                    raise ValueError(estr)
-                gsargs = parsedargs(config.argparser, argv)
-                config.update(gsargs)
             # Not a comment; yield generate specification string.
-            yield _expand_all_shell_vars(line)
+            yield _expand_all_shell_vars(line), argv
             # Clear out argument list for next round.
             argv = []
 
 
+def readgs(
+        gspath: str,
+        config: Optional[CLIConfiguration] = None
+) -> Iterable[str]:
+    '''
+    A convenience routine for reading generate specification files.
+
+    TODO(skg) Add description of formatting rules, semantics, etc. Don't forget
+    about yield!
+
+    We accept the following forms:
+    # -a/--aarg [ARG_PARAMS] -b/--bargs [ARG PARAMS]
+    # -c/--carg [ARG PARAMS] [positional arguments]
+    '''
+    for genspec, argv in _readgs_lines(gspath, config):
+        # Parse arguments if provided an argument parser.
+        if config is not None:
+            config.update(parsedargs(config.argparser, argv))
+        yield genspec
+
+
+class GSResult:
+    '''
+    The result of executing a single generate specification line.
+    '''
+    def __init__(
+            self,
+            genspec: str,
+            config: Optional[CLIConfiguration]
+    ) -> None:
+        # The generate specification string.
+        self.genspec = genspec
+        # The configuration resolved for this line.
+        self.config = config
+        # Messages logged while executing this line.
+        self.output: List[str] = []
+        # The value returned by the line's callback.
+        self.value: Any = None
+
+
+# Type aliases.
+GSLineCb = Callable[[str, Optional[CLIConfiguration]], Any]
+GSDemandCb = Callable[[str, Optional[CLIConfiguration]], int]
+
+
+class GSExecutor:
+    '''
+    Executes generate specification lines concurrently. Each line is given its
+    own resolved configuration (a copy of the configuration as readgs() would
+    have updated it) and is run on a worker pool bounded by a number of resource
+    slots (e.g., cores, nodes, or GB of memory). A line runs only once the slots
+    it demands are available. Lines are started in order, and their output is
+    emitted to the log in order, one line at a time.
+    '''
+    def __init__(
+            self,
+            slots: int,
+            demand: Union[int, GSDemandCb] = 1
+    ) -> None:
+        if slots < 1:
+            raise ValueError(f'{type(self).__name__} requires slots > 0.')
+        # The total number of resource slots available.
+        self.slots = slots
+        # The number of slots required by a line, or a callback returning it.
+        self.demand = demand
+        # The number of slots currently available.
+        self._avail = slots
+        self._cond = threading.Condition()
+        # Futures and results of the lines submitted, in order.
+        self._futures: List['concurrent.futures.Future[None]'] = []
+        self._results: List[GSResult] = []
+
+    def _demand(self, genspec: str, config: Optional[CLIConfiguration]) -> int:
+        need = self.demand
+        if callable(need):
+            need = need(genspec, config)
+        if not 0 < need <= self.slots:
+            estr = f"'{genspec}' demands {need} resource slot(s), " \
+                   f'but only {self.slots} are available.'
+            raise ValueError(estr)
+        return need
+
+    def _runline(  # pylint: disable=too-many-arguments
+            self,
+            fun: GSLineCb,
+            res: GSResult,
+            batch: int,
+            line: int,
+            need: int
+    ) -> None:
+        try:
+            with logger.capture() as output, \
+                 container.lane(batch, line, need, self.slots):
+                res.output = output
+                res.value = fun(res.genspec, res.config)
+        finally:
+            with self._cond:
+                self._avail += need
+                self._cond.notify_all()
+
+    def _emit_done(self, nextl: int) -> int:
+        '''
+        Emits, in order, the output of completed lines starting at index nextl.
+        Returns the index of the first line that was not emitted.
+        '''
+        while nextl < len(self._futures) and self._futures[nextl].done():
+            self._emit(nextl)
+            nextl += 1
+        return nextl
+
+    def _emit(self, lidx: int) -> None:
+        '''
+        Waits for the given line to complete and emits its output. Raises the
+        line's exception, if any.
+        '''
+        future = self._futures[lidx]
+        concurrent.futures.wait([future])
+        for msg in self._results[lidx].output:
+            logger.log(msg)
+        future.result()
+
+    def run(
+            self,
+            gspath: str,
+            fun: GSLineCb,
+            config: Optional[CLIConfiguration] = None
+    ) -> List[GSResult]:
+        '''
+        Calls fun(genspec, config) for every line in the provided generate
+        specification file, where config is the line's resolved configuration.
+        Returns a list of GSResult instances, in line order. If a line raises an
+        exception, it is raised here after the running lines complete.
+        '''
+        runconf = copy.deepcopy(config)
+        self._futures = []
+        self._results = []
+        nextl = 0
+        batch = container.new_batch()
+        with concurrent.futures.ThreadPoolExecutor(self.slots) as pool:
+            for genspec, argv in _readgs_lines(gspath, runconf):
+                lconf = None
+                if runconf is not None:
+                    runconf.update(parsedargs(runconf.argparser, argv))
+                    lconf = copy.deepcopy(runconf)
+                need = self._demand(genspec, lconf)
+                with self._cond:
+                    while self._avail < need:
+                        self._cond.wait()
+                        nextl = self._emit_done(nextl)
+                    self._avail -= need
+                res = GSResult(genspec, lconf)
+                line = len(self._results)
+                self._results.append(res)
+                self._futures.append(pool.submit(
+                    self._runline, fun, res, batch, line, need
+                ))
+                nextl = self._emit_done(nextl)
+            for lidx in range(nextl, len(self._futures)):
+                self._emit(lidx)
+        return self._results
+
+
 def parsedargs(
         argprsr: argparse.ArgumentParser,
         argv: List[str]
@@ -591,6 +1156,21 @@ class DefaultCLIConfiguration(CLIConfiguration):
             opt_default=self.defaults.runcmds
         )
 
+    def results_writer(
+            self,
+            columns: Optional[results.Columns] = None
+    ) -> results.ResultsWriter:
+        '''
+        Returns a streaming results writer for the file named by --csv-output.
+        Its format is determined by the file's extension (CSV by default).
+        Raises ValueError if no file name was provided.
+        '''
+        fname = self.args.csv_output
+        if utils.emptystr(fname):
+            raise ValueError('No --csv-output file name provided.')
+        fmt = None if os.path.splitext(fname)[1] in results.FORMATS else 'csv'
+        return results.ResultsWriter(fname, columns, fmt)
+
 
 def _runcmds_nargs(line: str, res: str) -> int:
     '''
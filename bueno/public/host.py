@@ -180,7 +180,7 @@ def run(  # pylint: disable=too-many-arguments
             if capture_output:
                 olst.append(stdout)
             if verbose:
-                logger.log(utils.chomp(stdout))
+                logger.output(utils.chomp(stdout))
 
         wrc = spo.wait()
         if wrc != os.EX_OK and check_exit_code:
@@ -10,15 +10,69 @@
 Logging utilities for good.
 '''
 
+import atexit
+import collections
+import json
 import logging
+import logging.handlers
+import os
+import queue
 import shutil
 import sys
+import tempfile
+import threading
+import time
 
-from io import StringIO
-from typing import Any
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    IO,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    cast
+)
 
 from bueno.core import metacls
 
+# The number of most recently logged messages kept in memory.
+TAIL_LINES: int = 128
+
+# The maximum number of messages queued for writing. Logging blocks while the
+# queue is full.
+QUEUE_SIZE: int = 8192
+
+# The maximum number of queued messages written at once.
+_BATCH_SIZE: int = 512
+
+# Message sources: bueno (and its programs' own messages) and the output of the
+# commands programs run.
+SOURCES = ('bueno', 'program')
+
+# Console modes: show messages from all sources, only bueno's, or bueno's and a
+# rate-limited tail of program output. Messages from all sources are logged
+# regardless of the console mode.
+CONSOLE_MODES = ('all', 'bueno', 'tail')
+
+
+# Encodes structured log records.
+_JSON_ENCODE = json.JSONEncoder(
+    ensure_ascii=False, check_circular=False, separators=(',', ':')
+).encode
+
+
+class _Message(str):
+    '''
+    A captured message, which remembers its source, the identity of the command
+    that produced it (if any), and when it was logged.
+    '''
+    source = 'bueno'
+    command: Optional[str] = None
+    mono: Optional[float] = None
+
 
 def emlog(msg: str, *args: Any, **kwargs: Any) -> None:
     '''
@@ -35,23 +89,424 @@ def log(msg: str, *args: Any, **kwargs: Any) -> None:
     _TheLogger().log(msg, *args, **kwargs)
 
 
-def write(topath: str) -> None:
+def output(msg: str) -> None:
+    '''
+    Logs the provided line of program (command) output to a central logger.
+    Whether or not it is also shown on the console depends on the console mode.
+    '''
+    _TheLogger().log(msg, source='program')
+
+
+def console(
+        mode: Optional[str] = None,
+        rate: Optional[float] = None
+) -> Optional[str]:
+    '''
+    Console mode getter/setter. If a mode (see CONSOLE_MODES) is provided, then
+    it acts as a setter, acting as a getter otherwise. In 'tail' mode, at most
+    rate lines of program output per second (on average) are shown.
+    '''
+    handler = _TheLogger().console
+    if mode is None:
+        return handler.mode
+    if mode not in CONSOLE_MODES:
+        raise ValueError(f'Unknown console mode: {mode}. '
+                         f'Choose one of {CONSOLE_MODES}.')
+    if rate is not None:
+        if rate <= 0:
+            raise ValueError('The console tail rate must be positive.')
+        handler.rate = rate
+    handler.mode = mode
+    return None
+
+
+@contextmanager
+def capture() -> Iterator[List[str]]:
+    '''
+    Context manager that diverts messages logged by the calling thread into the
+    yielded list instead of the central logger. Other threads are unaffected.
+    Captured messages can be logged later, for example, in a particular order.
+    '''
+    tls = _TheLogger().tls
+    prev = getattr(tls, 'capture', None)
+    tls.capture = []
+    try:
+        yield tls.capture
+    finally:
+        tls.capture = prev
+
+
+@contextmanager
+def command(cid: str) -> Iterator[None]:
+    '''
+    Context manager that tags messages logged by the calling thread with the
+    identity of the command producing them (see container.command_id()).
+    '''
+    tls = _TheLogger().tls
+    prev = getattr(tls, 'command', None)
+    tls.command = cid
+    try:
+        yield
+    finally:
+        tls.command = prev
+
+
+def structured(enable: Optional[bool] = None) -> Optional[bool]:
+    '''
+    Structured logging getter/setter. If a value is provided, then it acts as a
+    setter, acting as a getter otherwise. When enabled, messages logged from
+    then on are also recorded as JSON lines (see write_structured()), each an
+    object holding a monotonic timestamp (mono, in seconds), the wall-clock
+    time (wall, in seconds since the epoch), the message's source, the
+    identity of the command that produced it (command, or null), its severity
+    (level), and the message itself (msg).
+    '''
+    if enable is None:
+        return _TheLogger().structured()
+    _TheLogger().structured(enable)
+    return None
+
+
+def flush() -> None:
+    '''
+    Waits until all messages logged thus far are written.
+    '''
+    _TheLogger().flush()
+
+
+def write(topath: str, size: Optional[int] = None) -> int:
+    '''
+    Writes the current contents of the log (or, if size is provided, only its
+    first size bytes; see snapshot()) to the path provided. Returns the number
+    of bytes written.
+    '''
+    return _TheLogger().write(topath, size=size)
+
+
+def write_structured(topath: str, size: Optional[int] = None) -> int:
+    '''
+    Writes the current contents of the structured log (JSON lines) to the path
+    provided, like write(). Returns the number of bytes written. Raises
+    RuntimeError if structured logging was never enabled.
+    '''
+    jhandler = _TheLogger().jhandler
+    if jhandler is None:
+        raise RuntimeError('Structured logging is not enabled.')
+    return _TheLogger().write(topath, jhandler, size)
+
+
+def stage(dirp: str) -> None:
+    '''
+    Moves the files staging the log (and the structured log) to the provided
+    directory, creating it if needed, for example, one next to the data
+    written. The log is then staged there until exit. Staged files not
+    written (see write()) by then, such as those of runs that were killed, are
+    kept, so the log remains on disk.
+    '''
+    _TheLogger().stage(dirp)
+
+
+def tail(nlines: Optional[int] = None) -> List[str]:
+    '''
+    Returns (up to nlines of) the most recently logged messages. At most
+    TAIL_LINES are kept.
+    '''
+    _TheLogger().flush()
+    recent = list(_TheLogger().handler.recent)
+    if nlines is None:
+        return recent
+    return recent[-nlines:] if nlines > 0 else []
+
+
+def snapshot(structured_log: bool = False) -> Tuple[str, int]:
+    '''
+    Returns the path to the file backing the log (or the structured log) and
+    its current size. Only that many bytes of the file are guaranteed to hold
+    complete messages.
+    '''
+    if not structured_log:
+        return _TheLogger().snapshot()
+    jhandler = _TheLogger().jhandler
+    if jhandler is None:
+        raise RuntimeError('Structured logging is not enabled.')
+    return _TheLogger().snapshot(jhandler)
+
+
+def _copy(src: IO[bytes], dst: IO[bytes], nbytes: int) -> None:
+    '''
+    Copies nbytes from src to dst.
+    '''
+    while nbytes > 0:
+        chunk = src.read(min(nbytes, 1024 * 1024))
+        if not chunk:
+            break
+        dst.write(chunk)
+        nbytes -= len(chunk)
+
+
+class _BatchHandler(logging.StreamHandler):  # type: ignore[type-arg]
     '''
-    Writes the current contents of the log to the path provided.
+    Writes messages to a stream in batches, flushing the stream once per batch.
     '''
-    _TheLogger().write(topath)
+    def emit(self, record: logging.LogRecord) -> None:
+        self.emit_batch([record])
 
+    def emit_batch(self, records: List[logging.LogRecord]) -> None:
+        '''
+        Writes the provided messages.
+        '''
+        self.acquire()
+        try:
+            for record in records:
+                try:
+                    self.stream.write(self.format(record) + self.terminator)
+                except Exception:  # pylint: disable=broad-except
+                    self.handleError(record)
+            self.flush()
+        finally:
+            self.release()
+
+
+class _FileHandler(_BatchHandler):
+    '''
+    Appends logged messages to a new staging file (in the default temporary
+    directory until moved; see move()), flushing after each batch, and keeps
+    the most recent of them in memory.
+    '''
+    def __init__(self, suffix: str) -> None:
+        # Path to the append-only staging file.
+        fdesc, self.path = tempfile.mkstemp(prefix='bueno-log-', suffix=suffix)
+        stream = open(  # pylint: disable=consider-using-with
+            fdesc, 'a', encoding='utf8'
+        )
+        super().__init__(stream)
+        # The most recently logged messages.
+        self.recent: Deque[str] = collections.deque(maxlen=TAIL_LINES)
+        # Whether or not the staging file is kept until written (see move()).
+        self.keep = False
+        # The number of staging file bytes written to a destination thus far.
+        self.written = 0
+
+    def format(self, record: logging.LogRecord) -> str:
+        msg = super().format(record)
+        self.recent.append(msg)
+        return msg
+
+    def size(self) -> int:
+        '''
+        Returns the size of the staging file, once all messages handled thus
+        far are in it.
+        '''
+        self.acquire()
+        try:
+            self.flush()
+            return os.fstat(self.stream.fileno()).st_size
+        finally:
+            self.release()
+
+    def move(self, dirp: str) -> None:
+        '''
+        Moves the staging file to the provided directory, creating it if
+        needed. From then on, the staging file is kept at exit unless it was
+        written to a destination, so a log that was never written, for example
+        that of a run killed by a signal, remains on disk.
+        '''
+        os.makedirs(dirp, 0o755, exist_ok=True)
+        path = os.path.join(dirp, os.path.basename(self.path))
+        self.acquire()
+        try:
+            self.flush()
+            self.stream.close()
+            shutil.move(self.path, path)
+            self.path = path
+            self.stream = open(  # pylint: disable=consider-using-with
+                path, 'a', encoding='utf8'
+            )
+            self.keep = True
+        finally:
+            self.release()
+
+    def discard(self) -> bool:
+        '''
+        Closes the staging file and removes it, unless it must be kept (see
+        move()). Returns whether or not it was removed.
+        '''
+        self.close()
+        self.stream.close()
+        if self.keep and self.written == 0:
+            return False
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        return True
+
+
+class _JSONLinesHandler(_FileHandler):
+    '''
+    Appends logged messages to a staging file as JSON lines.
+    '''
+    def emit_batch(self, records: List[logging.LogRecord]) -> None:
+        lines = []
+        for record in records:
+            try:
+                lines.append(_JSON_ENCODE({
+                    'mono': getattr(record, 'mono', None),
+                    'wall': record.created,
+                    'source': getattr(record, 'source', 'bueno'),
+                    'command': getattr(record, 'command', None),
+                    'level': record.levelname,
+                    'msg': record.getMessage()
+                }))
+            except Exception:  # pylint: disable=broad-except
+                self.handleError(record)
+        lines.append('')
+        self.acquire()
+        try:
+            self.stream.write('\n'.join(lines))
+            self.flush()
+        finally:
+            self.release()
 
-class _TheLogger(metaclass=metacls.Singleton):
+
+class _ConsoleHandler(_BatchHandler):
+    '''
+    Writes messages to the console according to the console mode. In 'tail'
+    mode, a token bucket limits the rate at which program output is shown and
+    the number of lines not shown is noted before the next line shown.
+    '''
+    def __init__(self, stream: Any) -> None:
+        super().__init__(stream)
+        # The console mode.
+        self.mode = 'all'
+        # The average number of program output lines per second shown in
+        # 'tail' mode.
+        self.rate = 10.0
+        # The number of program output lines not shown since the last shown.
+        self.skipped = 0
+        self._tokens = self.rate
+        self._last = time.monotonic()
+
+    def _show(self, record: logging.LogRecord) -> bool:
+        '''
+        Returns whether or not the provided message is shown.
+        '''
+        if self.mode == 'all' or getattr(record, 'source', '') != 'program':
+            return True
+        if self.mode == 'bueno':
+            return False
+        now = time.monotonic()
+        self._tokens = min(
+            self.rate, self._tokens + (now - self._last) * self.rate
+        )
+        self._last = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        self.skipped += 1
+        return False
+
+    def skipped_record(self) -> Optional[logging.LogRecord]:
+        '''
+        Returns a message noting the lines of program output not shown since
+        the last one shown, if any, resetting the count.
+        '''
+        if self.skipped == 0:
+            return None
+        msg = f'# [{self.skipped} lines of program output not shown]'
+        self.skipped = 0
+        return logging.makeLogRecord({'msg': msg, 'source': 'bueno'})
+
+    def emit_batch(self, records: List[logging.LogRecord]) -> None:
+        shown = []
+        for record in records:
+            if not self._show(record):
+                continue
+            if getattr(record, 'source', '') == 'program':
+                note = self.skipped_record()
+                if note is not None:
+                    shown.append(note)
+            shown.append(record)
+        if shown:
+            super().emit_batch(shown)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    '''
+    Queues logged messages, blocking while the queue is full rather than
+    dropping messages.
+    '''
+    def enqueue(self, record: logging.LogRecord) -> None:
+        cast('queue.Queue[Any]', self.queue).put(record)
+
+
+class _Listener(threading.Thread):
+    '''
+    Writes queued messages to the provided handlers in batches, off the threads
+    logging them. Besides messages, the queue holds events, which are set once
+    the messages queued before them are written, and None, which stops the
+    listener.
+    '''
+    def __init__(
+            self,
+            mqueue: 'queue.Queue[Any]',
+            handlers: List[_BatchHandler]
+    ) -> None:
+        super().__init__(name='bueno-logger', daemon=True)
+        self.mqueue = mqueue
+        self.handlers = handlers
+
+    def run(self) -> None:
+        done = False
+        while not done:
+            batch = [self.mqueue.get()]
+            while len(batch) < _BATCH_SIZE:
+                try:
+                    batch.append(self.mqueue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [r for r in batch if isinstance(r, logging.LogRecord)]
+            if records:
+                for handler in tuple(self.handlers):
+                    handler.emit_batch(records)
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is None:
+                    done = True
+
+
+class _TheLogger(  # pylint: disable=too-many-instance-attributes
+        metaclass=metacls.Singleton
+):
     '''
     The central logger singleton used indirectly (via calls to log(), etc.) by
-    all bueno services.
+    all bueno services. Logged events are queued (in a bounded queue) and
+    written to stdout and to a staging file (in the default temporary
+    directory, or in the directory provided to stage()) in batches by a
+    listener thread, so threads logging messages, for example those relaying
+    command output, do not wait on slow terminals or file systems. The staging
+    file keeps memory use from growing with the log and is removed at exit,
+    once the queue is drained, unless it was staged but never written.
+    Destinations are updated incrementally: each write() appends only the
+    bytes logged since the previous write() to the same destination. The
+    structured log, if enabled, is staged and written the same way.
     '''
     def __init__(self) -> None:
         # Default logging level.
         self.loglvl = logging.INFO
-        # The in-memory buffer used to store logged events.
-        self.logsio = StringIO()
+        # Handler appending logged events to the staging file.
+        self.handler = _FileHandler('.txt')
+        # Handler recording the structured log, if ever enabled.
+        self.jhandler: Optional[_JSONLinesHandler] = None
+        # The directory holding the staging files, if provided.
+        self.staging: Optional[str] = None
+        # Maps destination paths to the number of staging file bytes written
+        # to them.
+        self.offsets: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        # Thread-local state used for capturing messages.
+        self.tls = threading.local()
         # Setup the root logger first.
         logging.basicConfig(
             # Emit to stdout, not stderr.
@@ -59,25 +514,154 @@ class _TheLogger(metaclass=metacls.Singleton):
             level=self.loglvl,
             format='%(message)s'
         )
+        # Queue of messages waiting to be written.
+        self.queue: 'queue.Queue[Any]' = queue.Queue(QUEUE_SIZE)
+        self.console = _ConsoleHandler(sys.stdout)
+        self.listener = _Listener(self.queue, [self.console, self.handler])
+        self.listener.start()
         # Now instantiate the logger used by derived services.
         self.logger = logging.getLogger(__name__)
-        self.logger.addHandler(logging.StreamHandler(self.logsio))
+        self.qhandler = _QueueHandler(self.queue)
+        self.logger.addHandler(self.qhandler)
+        # The listener writes messages to stdout, not the root logger.
+        self.logger.propagate = False
         self.logger.setLevel(self.loglvl)
+        atexit.register(self.close)
+
+    def log(
+            self,
+            msg: str,
+            *args: Any,
+            source: Optional[str] = None,
+            **kwargs: Any
+    ) -> None:
+        '''
+        A thin wrapper around internal logger's interface. The source defaults
+        to that of captured messages, or bueno otherwise.
+        '''
+        if source is None:
+            source = getattr(msg, 'source', 'bueno')
+        elif source not in SOURCES:
+            raise ValueError(f'Unknown message source: {source}. '
+                             f'Choose one of {SOURCES}.')
+        cid = getattr(msg, 'command', None) or \
+            getattr(self.tls, 'command', None)
+        mono = getattr(msg, 'mono', None) or time.monotonic()
+        cap = getattr(self.tls, 'capture', None)
+        if cap is not None:
+            capmsg = _Message(msg % args if args else msg)
+            capmsg.source = source
+            capmsg.command = cid
+            capmsg.mono = mono
+            cap.append(capmsg)
+            return
+        extra = dict(
+            kwargs.pop('extra', None) or {},
+            source=source, command=cid, mono=mono
+        )
+        self.logger.info(msg, *args, extra=extra, **kwargs)
+
+    def structured(self, enable: Optional[bool] = None) -> Optional[bool]:
+        '''
+        Structured logging getter/setter.
+        '''
+        handlers = self.listener.handlers
+        if enable is None:
+            return self.jhandler is not None and self.jhandler in handlers
+        # Change handlers only between batches of messages.
+        self.flush()
+        if not enable:
+            if self.jhandler in handlers:
+                handlers.remove(self.jhandler)
+            return None
+        if self.jhandler is None:
+            self.jhandler = _JSONLinesHandler('.jsonl')
+            if self.staging is not None:
+                self.jhandler.move(self.staging)
+        if self.jhandler not in handlers:
+            handlers.append(self.jhandler)
+        return None
+
+    def flush(self) -> None:
+        '''
+        Waits until all messages queued thus far are written.
+        '''
+        if not self.listener.is_alive() or \
+                threading.current_thread() is self.listener:
+            return
+        marker = threading.Event()
+        self.queue.put(marker)
+        marker.wait()
+
+    def snapshot(
+            self,
+            handler: Optional[_FileHandler] = None
+    ) -> Tuple[str, int]:
+        '''
+        Returns the path to the provided handler's (by default, the log's)
+        staging file and its size, once all logged events are in it.
+        '''
+        handler = handler or self.handler
+        self.flush()
+        return handler.path, handler.size()
+
+    def write(
+            self,
+            topath: str,
+            handler: Optional[_FileHandler] = None,
+            size: Optional[int] = None
+    ) -> int:
+        '''
+        Writes the contents of the log (or of the provided handler's staging
+        file), up to size bytes if provided, to the specified path, appending
+        only the new contents if the path holds what the previous write to it
+        left. Returns the number of bytes written.
+        '''
+        handler = handler or self.handler
+        srcp, cursize = self.snapshot(handler)
+        size = cursize if size is None else min(size, cursize)
+        dest = os.path.abspath(topath)
+        with self.lock:
+            start = self.offsets.get(dest)
+            mode = 'ab'
+            if start is None or not os.path.isfile(dest) or \
+                    os.path.getsize(dest) != start:
+                start, mode = 0, 'wb'
+            elif start >= size:
+                # An earlier write already got this far.
+                return 0
+            with open(srcp, 'rb') as src, open(dest, mode) as dst:
+                src.seek(start)
+                _copy(src, dst, size - start)
+            self.offsets[dest] = size
+            handler.written = max(handler.written, size)
+        return size - start
 
-    def log(self, msg: str, *args: Any, **kwargs: Any) -> None:
+    def close(self) -> None:
         '''
-        A thin wrapper around internal logger's interface.
+        Drains the queue, then closes and removes the staging file. Messages
+        logged afterwards go to the root logger.
         '''
-        self.logger.info(msg, *args, **kwargs)
+        self.logger.removeHandler(self.qhandler)
+        self.logger.propagate = True
+        if self.listener.is_alive():
+            self.queue.put(None)
+            self.listener.join()
+        note = self.console.skipped_record()
+        if note is not None:
+            self.console.emit_batch([note])
+        for handler in (self.handler, self.jhandler):
+            if handler is not None and not handler.discard():
+                print(f'bueno: The unwritten log remains at {handler.path}',
+                      file=sys.stderr)
 
-    def write(self, topath: str) -> None:
+    def stage(self, dirp: str) -> None:
         '''
-        Writes the contents of the log to the specified path.
+        Moves the staging files to the provided directory.
         '''
-        # Start from the beginning.
-        self.logsio.seek(0)
-        # Note: will seek to end automatically when done.
-        with open(topath, 'w+', encoding='utf8') as file:
-            shutil.copyfileobj(self.logsio, file)
+        self.staging = os.path.abspath(dirp)
+        for handler in (self.handler, self.jhandler):
+            if handler is not None:
+                handler.move(self.staging)
 
 # vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,366 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Durable, append-only on-disk outboxes of measurement data.
+
+An outbox is a directory of segment files. Each segment starts with MAGIC and
+holds a sequence of records, each a RECORD_HEADER (the payload's length and
+CRC-32) followed by the payload. Every writer (process) appends to its own
+segment, named so that segments sort by creation time, with an OPEN_SUFFIX
+until it is sealed (renamed with a SEGMENT_SUFFIX) at rotation or close.
+Replays send sealed segments in order, recording their progress in a cursor
+file, so an interrupted replay resumes where it stopped. Records are therefore
+delivered at least once.
+'''
+
+import atexit
+import contextlib
+import fcntl
+import os
+import socket
+import struct
+import threading
+import time
+import weakref
+import zlib
+
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple
+)
+
+from bueno.public import logger
+
+# Leading bytes of every segment.
+MAGIC: bytes = b'BUENOOB1'
+
+# Record header: payload length and CRC-32, both unsigned big-endian.
+RECORD_HEADER = struct.Struct('>II')
+
+# Segment file name suffixes.
+OPEN_SUFFIX: str = '.open'
+SEGMENT_SUFFIX: str = '.seg'
+# Suffix given to segments found corrupt during a replay.
+BAD_SUFFIX: str = '.bad'
+
+# Names of the replay cursor and lock files.
+_CURSOR_NAME = 'cursor'
+_LOCK_NAME = 'replay.lock'
+
+
+def _records(
+        path: str,
+        offset: int = len(MAGIC)
+) -> Generator[Tuple[bytes, int], None, None]:
+    '''
+    Yields the records of the provided segment starting at offset, along with
+    the offset following each. A truncated record (for example, one being
+    written when its writer died) ends the segment. Raises ValueError if the
+    segment or a record is corrupt.
+    '''
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not an outbox segment.')
+        file.seek(max(offset, len(MAGIC)))
+        pos = file.tell()
+        while True:
+            head = file.read(RECORD_HEADER.size)
+            if len(head) < RECORD_HEADER.size:
+                return
+            size, crc = RECORD_HEADER.unpack(head)
+            payload = file.read(size)
+            if len(payload) < size:
+                return
+            if zlib.crc32(payload) != crc:
+                raise ValueError(f'{path}: corrupt record at offset {pos}.')
+            pos += RECORD_HEADER.size + size
+            yield payload, pos
+
+
+def _close_outbox(ref: 'weakref.ref[Outbox]') -> None:
+    '''
+    Closes the referenced outbox, if it still exists.
+    '''
+    obox = ref()
+    if obox is not None:
+        obox.close()
+
+
+class Outbox:  # pylint: disable=too-many-instance-attributes
+    '''
+    A durable, append-only outbox at path (a directory, created if needed).
+    Segments are rotated once they reach segment_bytes. The fsync policy
+    determines when appended records are forced to disk: after every append()
+    ('append'), at most every fsync_interval seconds ('interval'), or only
+    when segments are sealed ('never').
+    '''
+    fsyncs = ('append', 'interval', 'never')
+
+    def __init__(
+            self,
+            path: str,
+            segment_bytes: int = 64 * 1024 * 1024,
+            fsync: str = 'append',
+            fsync_interval: float = 1.0
+    ) -> None:
+        if fsync not in self.fsyncs:
+            raise ValueError(f'Unknown fsync policy: {fsync}. '
+                             f'Choose one of {self.fsyncs}.')
+        # Path to the outbox directory.
+        self.path = os.path.abspath(path)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        # The number of records appended by this writer.
+        self.appended = 0
+        os.makedirs(self.path, 0o755, exist_ok=True)
+        self._writer = f'{socket.gethostname()}-{os.getpid()}'
+        self._file: Optional[BinaryIO] = None
+        self._filep = ''
+        self._size = 0
+        self._synced = 0.0
+        self._lock = threading.Lock()
+        atexit.register(_close_outbox, weakref.ref(self))
+
+    def __enter__(self) -> 'Outbox':
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def _open(self) -> BinaryIO:
+        '''
+        Returns the active segment, creating one if needed.
+        '''
+        if self._file is None:
+            name = f'{time.time_ns():020d}-{self._writer}{OPEN_SUFFIX}'
+            self._filep = os.path.join(self.path, name)
+            # Closed when sealed.
+            self._file = open(  # pylint: disable=consider-using-with
+                self._filep, 'xb'
+            )
+            self._file.write(MAGIC)
+            self._size = len(MAGIC)
+        return self._file
+
+    def _seal(self) -> None:
+        '''
+        Syncs, closes, and renames the active segment, if any.
+        '''
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        sealp = self._filep[:-len(OPEN_SUFFIX)] + SEGMENT_SUFFIX
+        os.replace(self._filep, sealp)
+
+    def append(self, payloads: Iterable[bytes]) -> int:
+        '''
+        Appends the provided payloads as records. Returns the number appended.
+        '''
+        count = 0
+        with self._lock:
+            for payload in payloads:
+                rlen = RECORD_HEADER.size + len(payload)
+                if self._file is not None and self._size > len(MAGIC) and \
+                        self._size + rlen > self.segment_bytes:
+                    self._seal()
+                file = self._open()
+                crc = zlib.crc32(payload)
+                file.write(RECORD_HEADER.pack(len(payload), crc))
+                file.write(payload)
+                self._size += rlen
+                count += 1
+            if self._file is not None:
+                self._file.flush()
+                now = time.monotonic()
+                if self.fsync == 'append' or (
+                        self.fsync == 'interval' and
+                        now - self._synced >= self.fsync_interval
+                ):
+                    os.fsync(self._file.fileno())
+                    self._synced = now
+            self.appended += count
+        return count
+
+    def rotate(self) -> None:
+        '''
+        Seals the active segment, making its records available to replays.
+        '''
+        with self._lock:
+            self._seal()
+
+    def close(self) -> None:
+        '''
+        Seals the active segment. Later appends start a new segment.
+        '''
+        self.rotate()
+
+    def segments(self, stale: Optional[float] = None) -> List[str]:
+        '''
+        Returns the paths of the sealed segments, oldest first. If stale is
+        provided, unsealed segments not modified in stale seconds (those of
+        writers that died) are included.
+        '''
+        res = []
+        now = time.time()
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            if name.endswith(SEGMENT_SUFFIX):
+                res.append(path)
+            elif name.endswith(OPEN_SUFFIX) and stale is not None and \
+                    path != self._filep and \
+                    now - os.path.getmtime(path) >= stale:
+                res.append(path)
+        return sorted(res, key=os.path.basename)
+
+    def _cursor(self) -> Tuple[str, int]:
+        '''
+        Returns the segment being replayed and the offset of its first record
+        not yet sent.
+        '''
+        try:
+            with open(os.path.join(self.path, _CURSOR_NAME),
+                      encoding='utf8') as file:
+                name, offset = file.read().split()
+                return name, int(offset)
+        except (FileNotFoundError, ValueError):
+            return '', 0
+
+    def _set_cursor(self, name: str, offset: int) -> None:
+        '''
+        Atomically records replay progress.
+        '''
+        cursorp = os.path.join(self.path, _CURSOR_NAME)
+        with open(f'{cursorp}.tmp', 'w', encoding='utf8') as file:
+            file.write(f'{name} {offset}\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(f'{cursorp}.tmp', cursorp)
+
+    def status(self, stale: Optional[float] = None) -> Dict[str, int]:
+        '''
+        Returns the numbers of segments, records, and payload bytes awaiting
+        replay (see segments()).
+        '''
+        cname, coffset = self._cursor()
+        res = {'segments': 0, 'records': 0, 'bytes': 0}
+        for segp in self.segments(stale):
+            offset = coffset if os.path.basename(segp) == cname else 0
+            res['segments'] += 1
+            try:
+                for payload, _ in _records(segp, offset):
+                    res['records'] += 1
+                    res['bytes'] += len(payload)
+            except ValueError as exception:
+                logger.log(f'# {exception}')
+        return res
+
+    def replay(
+            self,
+            send: Callable[[List[bytes]], int],
+            batch_size: int = 10000,
+            stale: Optional[float] = None
+    ) -> int:
+        '''
+        Seals the active segment, then sends the records of all segments
+        awaiting replay (see segments()) in batches of up to batch_size
+        records through send, which returns the number of records delivered.
+        Each segment is removed once all of its records are delivered.
+        Progress is recorded after every delivered batch, so a replay
+        interrupted by an exception raised by send, or by a RuntimeError
+        raised when send delivers fewer records than given, resumes with the
+        failed batch. Corrupt segments are set aside with a BAD_SUFFIX once
+        their intact records are sent. Only one replay runs at a time per
+        outbox. Returns the number of records sent.
+        '''
+        self.rotate()
+        total = 0
+        lockp = os.path.join(self.path, _LOCK_NAME)
+        with open(lockp, 'a', encoding='utf8') as lockf:
+            fcntl.flock(lockf, fcntl.LOCK_EX)
+            cname, coffset = self._cursor()
+            for segp in self.segments(stale):
+                name = os.path.basename(segp)
+                offset = coffset if name == cname else 0
+                total += self._replay_segment(segp, offset, send, batch_size)
+            fcntl.flock(lockf, fcntl.LOCK_UN)
+        return total
+
+    def _send(
+            self,
+            send: Callable[[List[bytes]], int],
+            batch: List[bytes],
+            name: str,
+            end: int
+    ) -> None:
+        '''
+        Sends the provided batch, recording progress up to end in the named
+        segment once it is delivered. Raises RuntimeError if it is not.
+        '''
+        nsent = send(batch)
+        if nsent < len(batch):
+            raise RuntimeError(f'Only {nsent} of {len(batch)} records from '
+                               f'{name} were delivered. Stopping the replay.')
+        self._set_cursor(name, end)
+
+    def _replay_segment(
+            self,
+            segp: str,
+            offset: int,
+            send: Callable[[List[bytes]], int],
+            batch_size: int
+    ) -> int:
+        '''
+        Sends the records of the provided segment from offset on, then removes
+        it. Returns the number of records sent.
+        '''
+        name = os.path.basename(segp)
+        total = 0
+        batch: List[bytes] = []
+        end = offset
+        corrupt = False
+        with contextlib.closing(_records(segp, offset)) as records:
+            while True:
+                try:
+                    payload, end = next(records)
+                except StopIteration:
+                    break
+                except ValueError as exception:
+                    logger.log(f'# {exception}')
+                    corrupt = True
+                    break
+                batch.append(payload)
+                if len(batch) >= batch_size:
+                    self._send(send, batch, name, end)
+                    total += len(batch)
+                    batch = []
+        if batch:
+            self._send(send, batch, name, end)
+            total += len(batch)
+        if corrupt:
+            os.replace(segp, segp + BAD_SUFFIX)
+        else:
+            os.unlink(segp)
+        try:
+            os.unlink(os.path.join(self.path, _CURSOR_NAME))
+        except FileNotFoundError:
+            pass
+        return total
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,322 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Statistical performance-regression detection against a stored baseline.
+'''
+
+import csv
+import os
+
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple
+)
+
+import yaml
+
+from bueno.core import metacls
+from bueno.core import stats
+
+from bueno.public import container
+from bueno.public import data
+from bueno.public import experiment
+from bueno.public import logger
+
+# Exit code used by bueno run when a regression is detected and requested.
+EXIT_REGRESSION: int = 3
+
+# Statistical methods used by regression checks.
+METHODS: Tuple[str, ...] = ('mannwhitney', 'bootstrap')
+
+# The number of samples needed on each side of a comparison to use a
+# statistical method. With fewer, medians are compared against the threshold
+# alone.
+MIN_SAMPLES: int = 3
+
+# Type alias for metric keys: (metric name, sorted stringified parameters).
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, params: Dict[str, Any]) -> _Key:
+    '''
+    Returns a metric key. Parameter values are compared as strings, since that
+    is how they are stored in CSV files.
+    '''
+    return name, tuple(sorted(
+        (str(k), str(v)) for k, v in params.items() if v is not None
+    ))
+
+
+class _Samples:
+    '''
+    Metric samples, either raw values or (if only a summary is available) a
+    median.
+    '''
+    def __init__(self) -> None:
+        self.values: Dict[_Key, List[float]] = {}
+        self.medians: Dict[_Key, float] = {}
+        # Maps command metric keys to their command strings.
+        self.commands: Dict[_Key, str] = {}
+
+    def median(self, key: _Key) -> Optional[float]:
+        '''
+        Returns the median of the given metric, if available.
+        '''
+        if key in self.values:
+            return stats.median(self.values[key])
+        return self.medians.get(key)
+
+    def keys(self) -> List[_Key]:
+        '''
+        Returns the keys of all metrics sampled.
+        '''
+        return list(self.values) + \
+            [k for k in self.medians if k not in self.values]
+
+    def add_commands(self, recs: Iterable[Dict[str, Any]]) -> None:
+        '''
+        Adds command execution times (in seconds) as metrics keyed by their
+        command identity.
+        '''
+        for rec in recs:
+            if rec.get('exectime_ns') is None:
+                continue
+            key = _key(f"command:{rec['id']}", {})
+            self.values.setdefault(key, []).append(rec['exectime_ns'] / 1e9)
+            self.commands[key] = rec['command']
+
+    @staticmethod
+    def current() -> '_Samples':
+        '''
+        Returns samples of the current run's FOMs and command timings.
+        '''
+        res = _Samples()
+        for fname, _, _, params, col in experiment.foms().items():
+            key = _key(fname, params)
+            res.values.setdefault(key, []).extend(col)
+        res.add_commands(container.commands())
+        return res
+
+    @staticmethod
+    def load(path: str) -> '_Samples':
+        '''
+        Loads baseline samples from a previous output directory (using its
+        foms.csv or foms.yaml and its commands.yaml) or from a stored summary
+        (a foms.yaml file). Raises RuntimeError if no baseline data are found.
+        '''
+        res = _Samples()
+        files = [path]
+        if os.path.isdir(path):
+            files = [
+                os.path.join(path, f) for f in
+                ('foms.csv', 'foms.yaml', 'commands.yaml')
+            ]
+        found = False
+        for fpath in files:
+            if not os.path.isfile(fpath):
+                continue
+            # Prefer raw samples over summaries.
+            if fpath.endswith('foms.yaml') and res.values:
+                continue
+            found = True
+            if fpath.endswith('.csv'):
+                res.load_csv(fpath)
+            else:
+                res.load_yaml(fpath)
+        if not found:
+            raise RuntimeError(f'No baseline data found at {path}')
+        return res
+
+    def load_csv(self, fpath: str) -> None:
+        '''
+        Loads raw FOM values from a CSV file written by FOMCollection.
+        '''
+        with open(fpath, encoding='utf8', newline='') as file:
+            for row in csv.DictReader(file):
+                value = float(row.pop('value'))
+                fname = row.pop('name')
+                params = {k: v for k, v in row.items() if v != ''}
+                self.values.setdefault(_key(fname, params), []).append(value)
+
+    def load_yaml(self, fpath: str) -> None:
+        '''
+        Loads FOM medians from a FOM summary or command execution times from a
+        command record YAML file.
+        '''
+        with open(fpath, encoding='utf8') as file:
+            ydata = yaml.safe_load(file) or {}
+        self.add_commands(ydata.get('Commands') or [])
+        for item in ydata.get('FOMs') or []:
+            key = _key(item['name'], item.get('params') or {})
+            self.medians[key] = float(item['stats']['median'])
+
+
+class Verdict:
+    '''
+    The machine-readable result of a regression check.
+    '''
+    def __init__(self, baseline: str) -> None:
+        # The baseline compared against.
+        self.baseline = baseline
+        # Per-metric comparison results.
+        self.metrics: List[Dict[str, Any]] = []
+
+    @property
+    def regressed(self) -> bool:
+        '''
+        Returns whether or not any metric regressed.
+        '''
+        return any(m['verdict'] == 'regression' for m in self.metrics)
+
+    def asdict(self) -> Dict[str, Any]:
+        '''
+        Returns the verdict as a dictionary.
+        '''
+        return {
+            'baseline': self.baseline,
+            'status': 'regression' if self.regressed else 'ok',
+            'metrics': self.metrics
+        }
+
+
+class _TheVerdicts(metaclass=metacls.Singleton):
+    '''
+    Collects the verdicts of all regression checks performed.
+    '''
+    def __init__(self) -> None:
+        self.verdicts: List[Verdict] = []
+
+
+def _compare(  # pylint: disable=too-many-arguments,too-many-locals
+        base: _Samples,
+        curr: _Samples,
+        key: _Key,
+        method: str,
+        *,
+        threshold: float,
+        alpha: float,
+        higher: bool
+) -> Optional[Dict[str, Any]]:
+    '''
+    Compares a single metric. Returns None if the metric is not present in both
+    the baseline and the current run.
+    '''
+    bmed = base.median(key)
+    cmed = curr.median(key)
+    if bmed is None or cmed is None:
+        return None
+    # Relative change in the 'worse' direction: positive means worse.
+    worse = 0.0
+    if bmed != 0.0:
+        worse = (bmed - cmed) / abs(bmed) if higher else \
+            (cmed - bmed) / abs(bmed)
+    res: Dict[str, Any] = {
+        'name': key[0],
+        'params': dict(key[1]),
+        'baseline_median': bmed,
+        'current_median': cmed,
+        'relative_change': (cmed - bmed) / abs(bmed) if bmed else None,
+        'method': method
+    }
+    if key in curr.commands:
+        res['command'] = curr.commands[key]
+    bvals = base.values.get(key)
+    cvals = curr.values.get(key)
+    regressed = worse > threshold
+    improved = -worse > threshold
+    if bvals is None or cvals is None or \
+            min(len(bvals), len(cvals)) < MIN_SAMPLES:
+        # Only a summary or too few samples are available (as is common for
+        # command timings), so compare medians only.
+        res['method'] = 'threshold'
+    elif method == 'bootstrap':
+        low, high = stats.bootstrap_median_ratio(bvals, cvals, conf=1 - alpha)
+        res['ratio_ci'] = [low, high]
+        # The interval must lie entirely beyond the threshold, above it for
+        # increases and below it for decreases.
+        increased = low > 1.0 + threshold
+        decreased = high < 1.0 - threshold
+        regressed = decreased if higher else increased
+        improved = increased if higher else decreased
+    else:
+        _, pval = stats.mann_whitney_u(bvals, cvals)
+        res['p_value'] = pval
+        regressed = regressed and pval < alpha
+        improved = improved and pval < alpha
+    verdict = 'unchanged'
+    if regressed:
+        verdict = 'regression'
+    elif improved:
+        verdict = 'improvement'
+    res['verdict'] = verdict
+    return res
+
+
+def check(  # pylint: disable=too-many-arguments
+        baseline: str,
+        method: str = 'mannwhitney',
+        threshold: float = 0.05,
+        alpha: float = 0.05,
+        higher_is_better: Iterable[str] = ()
+) -> Verdict:
+    '''
+    Compares the current run's FOMs (see experiment.foms()) and command
+    execution times against a baseline: a previous output directory or a stored
+    FOM summary (foms.yaml). A metric regresses when its median got worse by
+    more than threshold (relative) and the change is significant: either a
+    Mann-Whitney U test (method='mannwhitney') yields p < alpha or the
+    (1 - alpha) bootstrap confidence interval of the ratio of medians
+    (method='bootstrap') lies entirely beyond the threshold. When only a
+    summary or fewer than MIN_SAMPLES samples on either side are available,
+    medians are compared against the threshold alone.
+    A metric improves under the same conditions in the better direction.
+    Lower values are better, except for the FOMs named in higher_is_better.
+
+    The verdict is logged, added as a data asset (regression.yaml), and
+    returned.
+    '''
+    if method not in METHODS:
+        raise ValueError(f'Unknown regression-check method: {method}. '
+                         f'Choose one of {METHODS}.')
+    higher = set(higher_is_better)
+    base = _Samples.load(baseline)
+    curr = _Samples.current()
+    verdict = Verdict(os.path.abspath(baseline))
+    for key in curr.keys():
+        res = _compare(
+            base, curr, key, method,
+            threshold=threshold, alpha=alpha, higher=key[0] in higher
+        )
+        if res is not None:
+            verdict.metrics.append(res)
+
+    logger.emlog(f'# Regression Check Against {verdict.baseline}')
+    for met in verdict.metrics:
+        name = met.get('command', met['name'])
+        logger.log(f"# {met['verdict']:>11}: {name} {met['params'] or ''} "
+                   f"{met['baseline_median']:g} -> {met['current_median']:g}")
+    status = verdict.asdict()['status']
+    logger.log(f'# Regression Check Status: {status}\n')
+    data.add_asset(data.YAMLDictAsset(verdict.asdict(), 'regression'))
+    _TheVerdicts().verdicts.append(verdict)
+    return verdict
+
+
+def detected() -> bool:
+    '''
+    Returns whether or not any regression check performed thus far detected a
+    regression.
+    '''
+    return any(v.regressed for v in _TheVerdicts().verdicts)
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,233 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Streaming tabular results (CSV and NDJSON) writers.
+'''
+
+import collections
+import csv
+import json
+import os
+import tempfile
+import threading
+import weakref
+
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Union
+)
+
+from bueno.public import archive
+from bueno.public import data
+
+# Supported formats, by file name extension.
+FORMATS = {
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson'
+}
+
+# Type alias for column specifications: names or names mapped to types (or
+# any other callables) used to convert column values.
+Columns = Union[Sequence[str], Mapping[str, Callable[[Any], Any]]]
+
+
+def _close(file: Any, path: str) -> None:
+    '''
+    Closes and removes a staging file.
+    '''
+    file.close()
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class ResultsWriter(  # pylint: disable=too-many-instance-attributes
+        data.BaseAsset
+):
+    '''
+    Writes rows of results to a buffered staging file as they are produced,
+    so memory use does not grow with the number of rows. The writer is a data
+    asset: it registers itself when created (and again when rows are added
+    after a flush), so its file is written to the output directory by
+    experiment.flush_data().
+
+    The format (csv or ndjson) is determined by fname's extension, unless
+    provided. Columns are optional: if provided as a mapping, each column's
+    values are converted using the provided type (e.g., int or float). CSV
+    headers are written from the columns or, if none are provided, from the
+    keys of the first row. Rows may then omit columns, but not add new ones.
+    '''
+    concurrent = True
+
+    def __init__(  # pylint: disable=too-many-arguments
+            self,
+            fname: str,
+            columns: Optional[Columns] = None,
+            fmt: Optional[str] = None,
+            subd: Optional[str] = None,
+            bufsize: int = 1024 * 1024
+    ) -> None:
+        super().__init__()
+        ext = os.path.splitext(fname)[1]
+        if fmt is None:
+            if ext not in FORMATS:
+                raise ValueError(f'Cannot determine the format of {fname}. '
+                                 f'Use one of {list(FORMATS)} or provide one.')
+            fmt = FORMATS[ext]
+        if fmt not in FORMATS.values():
+            raise ValueError(f'Unknown format: {fmt}')
+        # Output file name.
+        self.fname = fname
+        # Optional subdirectory to store the results.
+        self.subd = subd
+        # Output format.
+        self.fmt = fmt
+        # Maps column names to their converters (None for no conversion).
+        self.columns: Dict[str, Optional[Callable[[Any], Any]]] = {}
+        if isinstance(columns, Mapping):
+            self.columns = dict(columns)
+        elif columns is not None:
+            self.columns = {c: None for c in columns}
+        # The number of rows written.
+        self.nrows = 0
+        self._lock = threading.Lock()
+        self._registered = False
+        # Staging file sizes recorded by snapshot(), oldest first, for the
+        # queued background writes.
+        self._sizes: Deque[int] = collections.deque()
+        fdesc, self._stagep = tempfile.mkstemp(
+            prefix='bueno-results-', dir=data._Assets().staging
+        )
+        self._file = open(  # pylint: disable=consider-using-with
+            fdesc, 'w', encoding='utf8', newline='', buffering=bufsize
+        )
+        weakref.finalize(self, _close, self._file, self._stagep)
+        self._csv: Optional['csv.DictWriter[str]'] = None
+        if self.fmt == 'csv' and self.columns:
+            self._start_csv(list(self.columns))
+        self._register()
+
+    def _register(self) -> None:
+        '''
+        Adds the writer to the data assets to be written, if not already.
+        '''
+        if not self._registered:
+            self._registered = True
+            data.add_asset(self)
+
+    def _start_csv(self, names: List[str]) -> None:
+        '''
+        Writes the CSV header.
+        '''
+        self._csv = csv.DictWriter(self._file, fieldnames=names, restval='')
+        self._csv.writeheader()
+
+    def _convert(self, row: Mapping[str, Any]) -> Dict[str, Any]:
+        '''
+        Returns the row with its values converted to their column's type.
+        '''
+        res = dict(row)
+        for name, value in row.items():
+            conv = self.columns.get(name)
+            if conv is not None and value is not None:
+                res[name] = conv(value)
+        return res
+
+    def add(
+            self,
+            row: Optional[Mapping[str, Any]] = None,
+            **kwargs: Any
+    ) -> None:
+        '''
+        Writes a row, provided as a mapping and/or as keyword arguments.
+        Raises ValueError if a CSV row has columns not in the header.
+        '''
+        full = dict(row or {}, **kwargs)
+        with self._lock:
+            crow = self._convert(full)
+            if self.fmt == 'ndjson':
+                self._file.write(json.dumps(crow, default=str) + '\n')
+            else:
+                if self._csv is None:
+                    self._start_csv(list(crow))
+                assert self._csv is not None  # nosec
+                try:
+                    self._csv.writerow(crow)
+                except ValueError as exception:
+                    estr = f'{self.fname}: row has unknown columns: {exception}'
+                    raise ValueError(estr) from exception
+            self.nrows += 1
+            self._register()
+
+    def extend(self, rows: Iterable[Mapping[str, Any]]) -> None:
+        '''
+        Writes the provided rows.
+        '''
+        for row in rows:
+            self.add(row)
+
+    def _sync(self) -> int:
+        '''
+        Flushes buffered rows to the staging file. Returns its size.
+        '''
+        with self._lock:
+            self._file.flush()
+            self._registered = False
+            return os.path.getsize(self._stagep)
+
+    def _staged(self) -> int:
+        '''
+        Returns the size of the staging file to write: the oldest snapshotted
+        size, if any, or its current size otherwise.
+        '''
+        with self._lock:
+            if self._sizes:
+                return self._sizes.popleft()
+        return self._sync()
+
+    def snapshot(self) -> None:
+        '''
+        Records the size of the staging file, so that only the rows written
+        thus far are written.
+        '''
+        size = self._sync()
+        with self._lock:
+            self._sizes.append(size)
+
+    def write(self, basep: str) -> None:
+        realbasep = self.outdir(basep) or basep
+        data._makedirs(realbasep)  # pylint: disable=protected-access
+        opath = os.path.join(realbasep, self.fname)
+        size = self._staged()
+        # Rows are only appended, so copying while more are written is safe
+        # once the copy is cut back to the rows written thus far.
+        if data.copyfile(self._stagep, opath) > size:
+            os.truncate(opath, size)
+        self.nbytes = size
+        self.record(opath)
+
+    def members(self) -> List[archive.Member]:
+        size = self._staged()
+        name = os.path.join(self.subd or '', self.fname)
+        mem = archive.Member.from_file(self._stagep, name)
+        # Only archive the rows written thus far.
+        mem.size = size
+        return [mem]
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
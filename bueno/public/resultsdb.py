@@ -0,0 +1,202 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Local SQLite database of run results.
+'''
+
+import contextlib
+import json
+import sqlite3
+
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple
+)
+
+# Type alias for FOM data: (name, description, units, parameters, values).
+FOMData = Tuple[str, str, str, Dict[str, Any], Iterable[float]]
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    user TEXT,
+    host TEXT,
+    date TEXT,
+    flush_time TEXT,
+    output_path TEXT UNIQUE
+);
+CREATE TABLE IF NOT EXISTS commands (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    command TEXT NOT NULL,
+    cmd_hash TEXT NOT NULL,
+    start_time TEXT,
+    exectime_ns INTEGER,
+    lane_batch INTEGER,
+    lane_line INTEGER
+);
+CREATE TABLE IF NOT EXISTS foms (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    description TEXT,
+    units TEXT,
+    params TEXT,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS runs_name_idx ON runs(name);
+CREATE INDEX IF NOT EXISTS runs_host_idx ON runs(host);
+CREATE INDEX IF NOT EXISTS runs_date_idx ON runs(date);
+CREATE INDEX IF NOT EXISTS commands_run_idx ON commands(run_id);
+CREATE INDEX IF NOT EXISTS commands_hash_idx ON commands(cmd_hash);
+CREATE INDEX IF NOT EXISTS foms_run_idx ON foms(run_id);
+CREATE INDEX IF NOT EXISTS foms_name_idx ON foms(name);
+'''
+
+
+class ResultsDB:
+    '''
+    A local SQLite database holding a row per run, per command, and per FOM
+    value. The database uses write-ahead logging, so it should be placed on a
+    local (not network or parallel) file system.
+    '''
+    def __init__(self, path: str) -> None:
+        # Path to the database file.
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        '''
+        Yields a connection, committing on success and rolling back on error.
+        '''
+        with contextlib.closing(sqlite3.connect(self.path, timeout=60)) as conn:
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA foreign_keys=ON')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            with conn:
+                yield conn
+
+    def add_run(
+            self,
+            run: Dict[str, Any],
+            commands: Iterable[Dict[str, Any]] = (),
+            foms: Iterable[FOMData] = ()
+    ) -> int:
+        '''
+        Adds a run, its commands (see container.commands()), and its FOMs in a
+        single transaction. run is a dictionary with name, user, host, date,
+        flush_time, and output_path keys. A run previously added with the same
+        output path is replaced. Returns the run's row ID.
+        '''
+        keys = ('name', 'user', 'host', 'date', 'flush_time', 'output_path')
+        with self._connect() as conn:
+            conn.execute(
+                'DELETE FROM runs WHERE output_path = ?',
+                (run['output_path'],)
+            )
+            cur = conn.execute(
+                'INSERT INTO runs '
+                '(name, user, host, date, flush_time, output_path) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                tuple(run.get(k) for k in keys)
+            )
+            runid = cur.lastrowid
+            assert runid is not None  # nosec
+            conn.executemany(
+                'INSERT INTO commands VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((runid, seq, c['command'], c['id'], c.get('start_time'),
+                  c.get('exectime_ns'),
+                  (c.get('lane') or {}).get('batch'),
+                  (c.get('lane') or {}).get('line'))
+                 for seq, c in enumerate(commands))
+            )
+            for fname, desc, units, params, values in foms:
+                jparams = json.dumps(params, sort_keys=True)
+                conn.executemany(
+                    'INSERT INTO foms VALUES (?, ?, ?, ?, ?, ?)',
+                    ((runid, fname, desc, units, jparams, v) for v in values)
+                )
+            return runid
+
+    def _query(
+            self,
+            sql: str,
+            conds: Dict[str, Any],
+            suffix: str = ''
+    ) -> List[Dict[str, Any]]:
+        '''
+        Runs the provided query, adding an equality condition for every
+        condition value that is not None.
+        '''
+        where = [f'{k} = ?' for k, v in conds.items() if v is not None]
+        args = [v for v in conds.values() if v is not None]
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        with self._connect() as conn:
+            return [dict(r) for r in conn.execute(sql + suffix, args)]
+
+    def runs(
+            self,
+            name: Optional[str] = None,
+            host: Optional[str] = None,
+            date: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        '''
+        Returns the runs matching the provided criteria, oldest first.
+        '''
+        conds = {'name': name, 'host': host, 'date': date}
+        return self._query('SELECT * FROM runs', conds, ' ORDER BY id')
+
+    def commands(
+            self,
+            cmd_hash: Optional[str] = None,
+            name: Optional[str] = None,
+            host: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        '''
+        Returns the commands (along with their run's name, host, and date)
+        matching the provided criteria, in execution order.
+        '''
+        sql = 'SELECT commands.*, runs.name, runs.host, runs.date ' \
+              'FROM commands JOIN runs ON commands.run_id = runs.id'
+        conds = {
+            'commands.cmd_hash': cmd_hash,
+            'runs.name': name,
+            'runs.host': host
+        }
+        return self._query(sql, conds, ' ORDER BY run_id, seq')
+
+    def foms(
+            self,
+            fom: Optional[str] = None,
+            name: Optional[str] = None,
+            host: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        '''
+        Returns the FOM values (along with their run's name, host, and date)
+        matching the provided criteria. Parameters are decoded into
+        dictionaries.
+        '''
+        sql = 'SELECT foms.*, runs.name AS run_name, runs.host, runs.date ' \
+              'FROM foms JOIN runs ON foms.run_id = runs.id'
+        conds = {'foms.name': fom, 'runs.name': name, 'runs.host': host}
+        res = self._query(sql, conds, ' ORDER BY foms.rowid')
+        for row in res:
+            row['params'] = json.loads(row['params'])
+        return res
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
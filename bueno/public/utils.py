@@ -10,21 +10,32 @@
 Utilities for good.
 '''
 
+from contextlib import contextmanager
 from datetime import datetime
 
 from typing import (
     Any,
+    Dict,
     IO,
+    Iterator,
     Iterable,
     List,
+    Optional,
     Union
 )
 
+import json
 import sys
+import time
 import yaml
 
 from bueno.public import logger
 
+# The YAML dumper used by yamls(): libyaml's (much faster) when available.
+# Unlike CSafeDumper, CDumper represents the same types as yaml.dump()'s
+# default dumper, so the output is equivalent.
+_YAMLDumper: Any = getattr(yaml, 'CDumper', yaml.Dumper)
+
 
 def module_imported(modname: str) -> bool:
     '''
@@ -73,6 +84,120 @@ def nows() -> str:
     return now().strftime('%Y-%m-%d %H:%M:%S')
 
 
+def ticks() -> int:
+    '''
+    Returns the current value (in nanoseconds) of a high-resolution monotonic
+    clock. Only differences between returned values are meaningful.
+    '''
+    return time.perf_counter_ns()
+
+
+class Timer:
+    '''
+    A lightweight, high-resolution monotonic timer. Durations are measured in
+    integer nanoseconds and are not affected by changes to the system clock.
+    Wall-clock start and end times are optionally recorded, too. Timer instances
+    can be used as context managers.
+    '''
+    __slots__ = ('wallclock', 'start_ns', 'end_ns', 'start_time', 'end_time')
+
+    def __init__(self, wallclock: bool = False) -> None:
+        # Whether or not wall-clock start and end times are recorded.
+        self.wallclock = wallclock
+        # Monotonic start and end ticks.
+        self.start_ns = 0
+        self.end_ns = 0
+        # Wall-clock start and end times (if requested).
+        self.start_time: Optional[datetime] = None
+        self.end_time: Optional[datetime] = None
+
+    def __enter__(self) -> 'Timer':
+        return self.start()
+
+    def __exit__(self, *_: Any) -> None:
+        self.stop()
+
+    def start(self) -> 'Timer':
+        '''
+        Starts (or restarts) the timer.
+        '''
+        if self.wallclock:
+            self.start_time = datetime.now()
+        self.end_ns = 0
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def stop(self) -> int:
+        '''
+        Stops the timer and returns the elapsed time in nanoseconds.
+        '''
+        self.end_ns = time.perf_counter_ns()
+        if self.wallclock:
+            self.end_time = datetime.now()
+        return self.end_ns - self.start_ns
+
+    @property
+    def elapsed_ns(self) -> int:
+        '''
+        Returns the elapsed time in nanoseconds. If the timer is still running,
+        the time elapsed thus far is returned.
+        '''
+        end = self.end_ns if self.end_ns else time.perf_counter_ns()
+        return end - self.start_ns
+
+    @property
+    def elapsed(self) -> float:
+        '''
+        Returns the elapsed time in seconds.
+        '''
+        return self.elapsed_ns / 1e9
+
+
+class PhaseTimer:
+    '''
+    Accumulates the time spent in named phases (e.g., the sub-phases of a run
+    script), possibly over many calls.
+    '''
+    def __init__(self) -> None:
+        # Maps phase names to their accumulated times (in nanoseconds).
+        self.totals_ns: Dict[str, int] = {}
+        # Maps phase names to the number of times they were timed.
+        self.counts: Dict[str, int] = {}
+
+    def add(self, name: str, nsecs: int) -> None:
+        '''
+        Adds nsecs nanoseconds to the named phase.
+        '''
+        self.totals_ns[name] = self.totals_ns.get(name, 0) + nsecs
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        '''
+        Context manager that times the enclosed code as the named phase.
+        '''
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter_ns() - start)
+
+    def results(self) -> Dict[str, Dict[str, float]]:
+        '''
+        Returns a dictionary containing per-phase totals (in seconds), counts,
+        and means (in seconds).
+        '''
+        res = {}
+        for name, total in self.totals_ns.items():
+            count = self.counts[name]
+            res[name] = {
+                'total': total / 1e9,
+                'count': count,
+                'mean': total / count / 1e9
+            }
+        return res
+
+
 def dates() -> str:
     '''
     Returns a string representation of the current date.
@@ -91,7 +216,17 @@ def yamls(idict: Any) -> str:
     '''
     Returns YAML string from the provided dictionary.
     '''
-    return chomp(yaml.dump(idict, default_flow_style=False))
+    return chomp(
+        yaml.dump(idict, Dumper=_YAMLDumper, default_flow_style=False)
+    )
+
+
+def jsons(idict: Any) -> str:
+    '''
+    Returns JSON string from the provided dictionary. Values that are not
+    JSON serializable are represented by their str().
+    '''
+    return json.dumps(idict, indent=2, default=str)
 
 
 def yamlp(idict: Any, label: Union[None, str] = None) -> None:
@@ -0,0 +1,203 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+The replay service module.
+'''
+
+import os
+
+from typing import (
+    List,
+    Optional
+)
+
+from bueno.core import service
+
+from bueno.public import datasink
+from bueno.public import logger
+from bueno.public import outbox
+
+
+class impl(service.Base):  # pylint: disable=invalid-name
+    '''
+    Implements the replay service.
+    '''
+    class _defaults:
+        '''
+        Convenience container for replay service defaults.
+        '''
+        desc = 'The replay service sends the measurements held in an ' \
+               'outbox (see datasink.RabbitMQBlockingClient) to an MQ ' \
+               'server, or shows their status.'
+        # The MQ server port.
+        port = 5671
+        # The MQ server virtual host.
+        vhost = '/'
+        # The number of measurements sent per message.
+        batch_size = 10000
+        # The maximum number of bytes sent per message.
+        batch_bytes = 16 * 1024 * 1024
+
+    def __init__(self, argv: List[str]) -> None:
+        super().__init__(impl._defaults.desc, argv)
+
+    def _addargs(self) -> None:
+        self.argp.add_argument(
+            'action',
+            type=str,
+            help='Shows what awaits replay (status) or sends it (send).',
+            choices=['status', 'send']
+        )
+
+        self.argp.add_argument(
+            'outbox',
+            type=str,
+            help='Specifies the outbox directory.'
+        )
+
+        self.argp.add_argument(
+            '--stale',
+            type=float,
+            help='Also replays unsealed segments (those of writers that '
+                 'died) not modified in the given number of seconds.',
+            default=None,
+            required=False,
+            metavar='SECONDS'
+        )
+
+        self.argp.add_argument(
+            '--host',
+            type=str,
+            help='Specifies the MQ server host. Required by send.',
+            default=None,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--port',
+            type=int,
+            help='Specifies the MQ server port. '
+                 f'Default: {impl._defaults.port}',
+            default=impl._defaults.port,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--vhost',
+            type=str,
+            help='Specifies the MQ server virtual host. '
+                 f'Default: {impl._defaults.vhost}',
+            default=impl._defaults.vhost,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--queue',
+            type=str,
+            help='Specifies the queue name.',
+            default='',
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--exchange',
+            type=str,
+            help='Specifies the exchange. Required by send.',
+            default=None,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--routing-key',
+            type=str,
+            help='Specifies the routing key. Required by send.',
+            default=None,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--certfile',
+            type=str,
+            help='Specifies the TLS certificate file.',
+            default=None,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--keyfile',
+            type=str,
+            help='Specifies the TLS private key file.',
+            default=None,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--batch-size',
+            type=int,
+            help='Specifies the number of measurements sent per message. '
+                 f'Default: {impl._defaults.batch_size}',
+            default=impl._defaults.batch_size,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--batch-bytes',
+            type=int,
+            help='Specifies the maximum size of a message. '
+                 f'Default: {impl._defaults.batch_bytes}',
+            default=impl._defaults.batch_bytes,
+            required=False,
+            metavar='BYTES'
+        )
+
+    def _client(self) -> datasink.RabbitMQBlockingClient:
+        '''
+        Returns a client configured by the provided arguments. Failed sends
+        are not appended to an outbox, so they end the replay, as do
+        measurements that could not be routed.
+        '''
+        for opt in ('host', 'exchange', 'routing_key'):
+            if getattr(self.args, opt) is None:
+                self.argp.error(f"send requires --{opt.replace('_', '-')}.")
+        tls_config: Optional[datasink.TLSConfig] = None
+        if self.args.certfile is not None or self.args.keyfile is not None:
+            tls_config = datasink.TLSConfig(
+                self.args.certfile, self.args.keyfile
+            )
+        params = datasink.RabbitMQConnectionParams(
+            self.args.host,
+            self.args.port,
+            vhost=self.args.vhost,
+            tls_config=tls_config
+        )
+        return datasink.RabbitMQBlockingClient(
+            params,
+            self.args.queue,
+            self.args.exchange,
+            self.args.routing_key,
+            batch_size=self.args.batch_size,
+            batch_bytes=self.args.batch_bytes
+        )
+
+    def start(self) -> None:
+        # Outboxes are created by their writers, so a missing one is an error.
+        if not os.path.isdir(self.args.outbox):
+            self.argp.error(f'No outbox directory at {self.args.outbox}.')
+        obox = outbox.Outbox(self.args.outbox)
+        if self.args.action == 'status':
+            for key, val in obox.status(self.args.stale).items():
+                logger.log(f'{key}: {val}')
+            return
+        with self._client() as client:
+            nsent = obox.replay(
+                client.send_lines, self.args.batch_size, self.args.stale
+            )
+        logger.log(f'# Replayed {nsent} measurement(s) from {obox.path}')
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
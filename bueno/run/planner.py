@@ -0,0 +1,280 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Campaign time estimation from the command timings of previous runs.
+'''
+
+import datetime
+import heapq
+import math
+import os
+import re
+import statistics
+
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
+
+import yaml
+
+from bueno.public import logger
+from bueno.public import resultsdb
+
+# The name of the file (written by experiment.flush_data()) that records the
+# commands launched during a run.
+COMMANDS_FILE: str = 'commands.yaml'
+
+# Regular expression used to find numeric (sweep) parameters in commands.
+_NUM_RES = r'(?<![\w.])\d+(?:\.\d+)?(?![\w.])'
+
+# Type alias for (numeric parameters, execution time in nanoseconds) samples.
+_Sample = Tuple[Tuple[float, ...], int]
+
+
+def _template(cmd: str) -> Tuple[str, Tuple[float, ...]]:
+    '''
+    Returns the provided command with its numeric parameters replaced by
+    placeholders, along with the parameters' values.
+    '''
+    ncmd = ' '.join(cmd.split())
+    params = tuple(float(p) for p in re.findall(_NUM_RES, ncmd))
+    return re.sub(_NUM_RES, '#', ncmd), params
+
+
+def _fmt_ns(nsecs: Optional[float]) -> str:
+    if nsecs is None:
+        return 'unknown'
+    return str(datetime.timedelta(milliseconds=round(nsecs / 1e6)))
+
+
+class History:
+    '''
+    Historical command execution times, keyed by command identity.
+    '''
+    def __init__(self) -> None:
+        # Maps command identities to their execution times.
+        self.byid: Dict[str, List[int]] = {}
+        # Maps command templates to their (parameters, time) samples.
+        self.bytmpl: Dict[str, List[_Sample]] = {}
+
+    def add(self, rec: Dict[str, Any]) -> None:
+        '''
+        Adds a command record (see container.commands()) to the history.
+        Records without timing information are ignored.
+        '''
+        exectime = rec.get('exectime_ns')
+        if exectime is None:
+            return
+        self.byid.setdefault(rec['id'], []).append(int(exectime))
+        tmpl, params = _template(rec['command'])
+        self.bytmpl.setdefault(tmpl, []).append((params, int(exectime)))
+
+    def load(self, basep: str) -> int:
+        '''
+        Loads the command records found under the provided base output path.
+        Returns the number of records loaded.
+        '''
+        nrecs = 0
+        for root, _, files in os.walk(basep):
+            if COMMANDS_FILE not in files:
+                continue
+            try:
+                with open(os.path.join(root, COMMANDS_FILE),
+                          encoding='utf8') as file:
+                    recs = yaml.safe_load(file)
+            except (OSError, yaml.YAMLError):
+                continue
+            if not isinstance(recs, dict):
+                continue
+            for rec in recs.get('Commands') or []:
+                self.add(rec)
+                nrecs += 1
+        return nrecs
+
+    def load_db(self, dbpath: str) -> int:
+        '''
+        Loads the command records stored in the provided results database.
+        Returns the number of records loaded.
+        '''
+        recs = resultsdb.ResultsDB(dbpath).commands()
+        for rec in recs:
+            rec['id'] = rec['cmd_hash']
+            self.add(rec)
+        return len(recs)
+
+    def _model(
+            self,
+            params: Tuple[float, ...],
+            samples: List[_Sample]
+    ) -> Optional[float]:
+        '''
+        Extrapolates an execution time for the provided parameters by fitting a
+        power law, t = a * p^b, over the first parameter that varies among the
+        samples.
+        '''
+        samples = [s for s in samples if len(s[0]) == len(params)]
+        for pidx, param in enumerate(params):
+            # Only consider samples that agree with us on all other parameters.
+            pts = [
+                (s[0][pidx], s[1]) for s in samples
+                if all(v == params[i]
+                       for i, v in enumerate(s[0]) if i != pidx)
+            ]
+            pts = [p for p in pts if p[0] > 0 and p[1] > 0]
+            if len({p[0] for p in pts}) < 2 or param <= 0:
+                continue
+            lxs = [math.log(p[0]) for p in pts]
+            lys = [math.log(p[1]) for p in pts]
+            mlx = statistics.mean(lxs)
+            mly = statistics.mean(lys)
+            sxx = sum((x - mlx) ** 2 for x in lxs)
+            sxy = sum((x - mlx) * (y - mly) for x, y in zip(lxs, lys))
+            slope = sxy / sxx
+            return math.exp(mly + slope * (math.log(param) - mlx))
+        return None
+
+    def estimate(self, cmd: str, cmdid: str) -> Tuple[Optional[float], str]:
+        '''
+        Returns the estimated execution time (in nanoseconds) of the provided
+        command and the method used to obtain it: history (previous runs of the
+        same command), model (extrapolated over a sweep parameter), constant
+        (the median of the runs of similar commands), or unknown.
+        '''
+        if cmdid in self.byid:
+            return float(statistics.median(self.byid[cmdid])), 'history'
+        tmpl, params = _template(cmd)
+        samples = self.bytmpl.get(tmpl)
+        if not samples:
+            return None, 'unknown'
+        est = self._model(params, samples)
+        if est is not None:
+            return est, 'model'
+        return float(statistics.median(s[1] for s in samples)), 'constant'
+
+
+class _Estimate:
+    '''
+    A command record along with its estimated execution time.
+    '''
+    def __init__(self, rec: Dict[str, Any], history: History) -> None:
+        self.command: str = rec['command']
+        self.lane: Optional[Dict[str, int]] = rec.get('lane')
+        self.nsecs, self.method = history.estimate(self.command, rec['id'])
+
+    @property
+    def nsecs_or_zero(self) -> float:
+        '''
+        Returns the estimate, treating unknown estimates as zero.
+        '''
+        return self.nsecs if self.nsecs is not None else 0.0
+
+
+class Plan:
+    '''
+    A campaign plan built from the commands recorded during a dry run.
+    '''
+    def __init__(
+            self,
+            recs: List[Dict[str, Any]],
+            history: History
+    ) -> None:
+        self.estimates = [_Estimate(rec, history) for rec in recs]
+        # The predicted wall-clock time and the estimates on the critical path.
+        self.wall_ns, self.critical_path = self._schedule()
+
+    @property
+    def serial_ns(self) -> float:
+        '''
+        Returns the sum of all command estimates.
+        '''
+        return sum(e.nsecs_or_zero for e in self.estimates)
+
+    @staticmethod
+    def _makespan(
+            lines: Dict[int, List[_Estimate]]
+    ) -> Tuple[float, List[_Estimate]]:
+        '''
+        Simulates the execution of concurrent lines, each started in order once
+        the resource slots it demands are available. Returns the time at which
+        the last line completes and that line's estimates.
+        '''
+        # Heap of (finish time, line id, demand) of running lines.
+        running: List[Tuple[float, int, int]] = []
+        clock = 0.0
+        finish = (0.0, -1)
+        for lid in sorted(lines):
+            lane = lines[lid][0].lane
+            assert lane is not None  # nosec
+            avail = lane['slots'] - sum(r[2] for r in running)
+            while avail < lane['demand']:
+                ftime, _, dmd = heapq.heappop(running)
+                clock = max(clock, ftime)
+                avail += dmd
+            ltime = clock + sum(e.nsecs_or_zero for e in lines[lid])
+            heapq.heappush(running, (ltime, lid, lane['demand']))
+            finish = max(finish, (ltime, lid))
+        return finish[0], lines.get(finish[1], [])
+
+    def _schedule(self) -> Tuple[float, List[_Estimate]]:
+        '''
+        Returns the predicted wall-clock time and the critical path. Commands
+        outside of concurrent batches run one after another, while batches of
+        concurrent lines are simulated.
+        '''
+        wall = 0.0
+        path: List[_Estimate] = []
+        idx = 0
+        while idx < len(self.estimates):
+            est = self.estimates[idx]
+            if est.lane is None:
+                wall += est.nsecs_or_zero
+                path.append(est)
+                idx += 1
+                continue
+            # Gather the (contiguous) commands of this batch by line.
+            batch = est.lane['batch']
+            lines: Dict[int, List[_Estimate]] = {}
+            while idx < len(self.estimates):
+                lane = self.estimates[idx].lane
+                if lane is None or lane['batch'] != batch:
+                    break
+                lines.setdefault(lane['line'], []).append(self.estimates[idx])
+                idx += 1
+            bwall, bpath = Plan._makespan(lines)
+            wall += bwall
+            path.extend(bpath)
+        return wall, path
+
+    def emit(self) -> None:
+        '''
+        Emits the plan using logger.log().
+        '''
+        logger.emlog('# Begin Dry-Run Plan')
+        for est in self.estimates:
+            lane = '' if est.lane is None else \
+                f" [batch {est.lane['batch']}, line {est.lane['line']}]"
+            logger.log(
+                f'# {_fmt_ns(est.nsecs):>14} ({est.method}){lane}: '
+                f'{est.command}'
+            )
+        unknown = sum(1 for e in self.estimates if e.nsecs is None)
+        logger.log(f'\n# Commands: {len(self.estimates)} '
+                   f'({unknown} without an estimate)')
+        logger.log(f'# Predicted Serial Time: {_fmt_ns(self.serial_ns)}')
+        logger.log(f'# Predicted Wall Time:   {_fmt_ns(self.wall_ns)}')
+        logger.log('# Critical Path:')
+        for est in self.critical_path:
+            logger.log(f'#   {_fmt_ns(est.nsecs):>14}: {est.command}')
+        logger.emlog('# End Dry-Run Plan')
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
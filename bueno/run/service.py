@@ -12,6 +12,7 @@ The run service module.
 
 import argparse
 import copy
+import datetime
 import importlib.util
 import os
 import sys
@@ -26,13 +27,17 @@ from bueno.core import cntrimg
 from bueno.core import constants
 from bueno.core import service
 
+from bueno.public import archive
 from bueno.public import container
 from bueno.public import experiment
 from bueno.public import host
 from bueno.public import logger
 from bueno.public import data
+from bueno.public import regression
 from bueno.public import utils
 
+from bueno.run import planner
+
 
 class _Runner:
     @typing.no_type_check
@@ -119,6 +124,36 @@ class impl(service.Base):  # pylint: disable=invalid-name
         image = None
         # Whether or not to skip container image staging.
         do_not_stage = False
+        # Whether or not to perform a dry run.
+        dry_run = False
+        # Path to the results database.
+        results_db = None
+        # Path to the baseline used for regression checks.
+        baseline = None
+        # Whether or not detected regressions cause a nonzero exit code.
+        fail_on_regression = False
+        # The statistical method used by regression checks.
+        regression_method = 'mannwhitney'
+        # The relative change beyond which a metric regresses or improves.
+        regression_threshold = 0.05
+        # The significance level of regression checks.
+        regression_alpha = 0.05
+        # The names of the FOMs for which higher values are better.
+        higher_is_better = None
+        # The link type used to deduplicate file assets, if any.
+        dedup = None
+        # The compression type of the archives written, if any.
+        archive = None
+        # Whether or not data are flushed in the background.
+        background_flush = False
+        # The memory budget (in bytes) of data pending a flush, if any.
+        memory_budget = None
+        # The console mode.
+        console = 'all'
+        # The number of program output lines per second shown in tail mode.
+        console_rate = 10.0
+        # Whether or not a structured (JSON lines) log is written.
+        structured_log = False
 
     class ProgramAction(argparse.Action):
         '''
@@ -225,6 +260,174 @@ class impl(service.Base):  # pylint: disable=invalid-name
             required=False
         )
 
+        self.argp.add_argument(
+            '--results-db',
+            type=str,
+            help='Specifies the path to a local SQLite database to which '
+                 'run, command, and FOM results are added when data are '
+                 'written. Dry runs also use it to estimate execution times.',
+            default=impl._defaults.results_db,
+            required=False,
+            metavar='PATH'
+        )
+
+        self.argp.add_argument(
+            '--dedup',
+            type=str,
+            help='Stores file assets (e.g., the program and extra modules) '
+                 'once in a content-addressed object store rooted at the '
+                 f'output path ({data.OBJECTS_DIR}) and links them into each '
+                 'run directory using the specified link type.',
+            default=impl._defaults.dedup,
+            choices=data.ObjectStore.links,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--archive',
+            type=str,
+            help='Streams the data written by each flush into a single tar '
+                 'archive (compressed as specified) instead of a directory. '
+                 "Use 'bueno archive' to list and extract archive members.",
+            default=impl._defaults.archive,
+            choices=archive.COMPRESSIONS,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--background-flush',
+            action='store_true',
+            help='Writes the data flushed by the program in the background, '
+                 'so the program continues while its data are written. All '
+                 'data are written before bueno exits.',
+            default=impl._defaults.background_flush,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--memory-budget',
+            type=int,
+            help='Limits the memory held by data pending a flush to the '
+                 'specified number of bytes. When the budget is exceeded, '
+                 'the largest pending data are spilled to temporary files '
+                 'that are moved into place when flushed.',
+            default=impl._defaults.memory_budget,
+            required=False,
+            metavar='BYTES'
+        )
+
+        self.argp.add_argument(
+            '--console',
+            type=str,
+            help='Selects the messages shown on the console: all messages, '
+                 "only bueno's, or bueno's and a rate-limited tail of "
+                 'program (command) output. All messages are logged '
+                 f'regardless. Default: {impl._defaults.console}',
+            default=impl._defaults.console,
+            choices=logger.CONSOLE_MODES,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--console-rate',
+            type=float,
+            help='Specifies the average number of program output lines per '
+                 'second shown in tail console mode. '
+                 f'Default: {impl._defaults.console_rate}',
+            default=impl._defaults.console_rate,
+            required=False,
+            metavar='LINES'
+        )
+
+        self.argp.add_argument(
+            '--structured-log',
+            action='store_true',
+            help='Also writes a structured log '
+                 f'({constants.SERVICE_JSONL_LOG_NAME}) holding a JSON '
+                 'object per message with its timestamps, source, command, '
+                 'and severity.',
+            default=impl._defaults.structured_log,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--baseline',
+            type=str,
+            help='Specifies a baseline (a previous output directory or a '
+                 'stored FOM summary) against which FOMs and command '
+                 'execution times are checked for performance regressions '
+                 'after the program completes.',
+            default=impl._defaults.baseline,
+            required=False,
+            metavar='PATH'
+        )
+
+        self.argp.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Exit with status '
+                 f'{regression.EXIT_REGRESSION} if a regression check '
+                 'detects a regression.',
+            default=impl._defaults.fail_on_regression,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--regression-method',
+            type=str,
+            help='Specifies the statistical method used by regression '
+                 'checks. '
+                 f'Default: {impl._defaults.regression_method}',
+            default=impl._defaults.regression_method,
+            choices=regression.METHODS,
+            required=False
+        )
+
+        self.argp.add_argument(
+            '--regression-threshold',
+            type=float,
+            help='Specifies the relative change in a median beyond which a '
+                 'metric regresses or improves. '
+                 f'Default: {impl._defaults.regression_threshold}',
+            default=impl._defaults.regression_threshold,
+            required=False,
+            metavar='FRACTION'
+        )
+
+        self.argp.add_argument(
+            '--regression-alpha',
+            type=float,
+            help='Specifies the significance level of regression checks. '
+                 f'Default: {impl._defaults.regression_alpha}',
+            default=impl._defaults.regression_alpha,
+            required=False,
+            metavar='ALPHA'
+        )
+
+        self.argp.add_argument(
+            '--higher-is-better',
+            type=str,
+            action='append',
+            help='Names a FOM for which higher values are better (e.g., a '
+                 'bandwidth), so regression checks treat its decreases as '
+                 'regressions. May be given more than once. Lower values '
+                 'are better for all other metrics.',
+            default=impl._defaults.higher_is_better,
+            required=False,
+            metavar='NAME'
+        )
+
+        self.argp.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Runs the program without executing the commands passed to '
+                 'container.run() or container.prun(), then prints their '
+                 'estimated execution times based on the results of previous '
+                 'runs found in the output directory. No data are written.',
+            default=impl._defaults.dry_run,
+            required=False
+        )
+
         imgdir_arg = self.argp.add_argument(
             '-i', '--image',
             type=str,
@@ -310,6 +513,9 @@ class impl(service.Base):  # pylint: disable=invalid-name
         # The 'we don't need or want to stage paths.'
         if not cntrimg.activator().requires_img_activation():
             return
+        if self.args.dry_run:
+            logger.log('# Dry run: skipping container image staging')
+            return
         if self.args.do_not_stage:
             # We know that imgp cannot be None.
             hlps = 'Unstaged executions require access to ' \
@@ -381,32 +587,103 @@ class impl(service.Base):  # pylint: disable=invalid-name
         _Runner.run(self.args.program)
         logger.emlog('# End Program Output')
 
+    def _plan(self) -> None:
+        '''
+        Estimates the execution time of the commands recorded during a dry run.
+        '''
+        history = planner.History()
+        srcp = self.args.output_path
+        if self.args.results_db is not None:
+            srcp = self.args.results_db
+            nrecs = history.load_db(srcp)
+        else:
+            nrecs = history.load(srcp)
+        logger.log(f'# Loaded {nrecs} Historical Command Records from {srcp}')
+        planner.Plan(container.commands(), history).emit()
+
     def _write_data(self) -> None:
         outp = experiment.flush_data()
+        # Wait for any background writes, including this one.
+        experiment.wait_for_flush()
         logger.log(f'# {self.prog} Output Written to {outp}')
 
     def _experiment_setup(self) -> None:
+        logger.console(self.args.console, self.args.console_rate)
+        if self.args.structured_log:
+            logger.structured(True)
+        if self.args.dry_run:
+            container.dry_run(True)
+            # Dry runs do not write data.
+            experiment.output_path('/dev/null')
+            return
         experiment.output_path(self.args.output_path)
+        # Keep the log next to the data, so it remains should the run die.
+        if self.args.output_path != os.devnull:
+            logger.stage(os.path.join(
+                self.args.output_path, constants.SERVICE_STAGING_DIR
+            ))
+        if self.args.background_flush:
+            data.background_writes(True)
+        if self.args.memory_budget is not None:
+            data.memory_budget(self.args.memory_budget)
+        if self.args.archive is not None:
+            data.archive_output(self.args.archive)
+        if self.args.dedup is not None:
+            objd = os.path.join(self.args.output_path, data.OBJECTS_DIR)
+            data.object_store(data.ObjectStore(objd, self.args.dedup))
+        if self.args.results_db is not None:
+            experiment.results_db(os.path.abspath(self.args.results_db))
 
     def start(self) -> None:
         logger.emlog(f'# Starting {self.prog} at {utils.nows()}')
         logger.log(F"# $ {' '.join(sys.argv)}\n")
 
         try:
-            stime = utils.now()
+            timer = utils.Timer().start()
             self._experiment_setup()
             self._emit_config()
             self._build_image_activator()
             self._stage_container_image()
             self._add_container_data()
             self._run()
-            etime = utils.now()
+            timer.stop()
 
-            logger.log(f'# {self.prog} Time {etime - stime}')
+            etime = datetime.timedelta(microseconds=timer.elapsed_ns // 1000)
+            logger.log(f'# {self.prog} Time {etime}')
             logger.log(f'# {self.prog} Done {utils.nows()}')
 
+            if self.args.dry_run:
+                self._plan()
+            elif self.args.baseline is not None:
+                regression.check(
+                    self.args.baseline,
+                    method=self.args.regression_method,
+                    threshold=self.args.regression_threshold,
+                    alpha=self.args.regression_alpha,
+                    higher_is_better=self.args.higher_is_better or ()
+                )
+
             self._write_data()
-        except Exception as exception:
-            raise exception
+
+            if self.args.fail_on_regression and regression.detected():
+                logger.log(f'# {self.prog} Detected a Performance Regression')
+                sys.exit(regression.EXIT_REGRESSION)
+        except BaseException as exception:
+            self._write_log(exception)
+            raise
+
+    def _write_log(self, exception: BaseException) -> None:
+        '''
+        Writes the log after a run that failed or exited early, so that it
+        remains on disk.
+        '''
+        logger.log(f'# {self.prog} Stopped {utils.nows()}: {exception!r}')
+        try:
+            outp = experiment.flush_log()
+        except OSError as error:
+            logger.emlog(f'# Cannot Write the Log: {error}')
+            return
+        if outp is not None:
+            logger.emlog(f'# {self.prog} Log Written to {outp}')
 
 # vim: ft=python ts=4 sts=4 sw=4 expandtab
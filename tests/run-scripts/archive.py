@@ -0,0 +1,114 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+# pylint: disable=protected-access
+
+'''
+Tests writing data assets to archives.
+'''
+
+import io
+import os
+import tempfile
+
+from bueno.public import archive
+from bueno.public import data
+from bueno.public import experiment
+from bueno.public import logger
+
+
+class _CustomAsset(data.BaseAsset):
+    '''
+    An asset archived through the default members().
+    '''
+    def write(self, basep):
+        os.makedirs(os.path.join(basep, 'custom'), exist_ok=True)
+        opath = os.path.join(basep, 'custom', 'out.txt')
+        with open(opath, 'w', encoding='utf8') as file:
+            file.write('custom')
+
+
+def _fom_asset():
+    '''
+    Returns a FOM collection asset.
+    '''
+    fomc = experiment.FOMCollection()
+    fomc.extend('t', 'Time', 's', range(100), n=1)
+    return experiment._FOMCollectionAsset(fomc)
+
+
+def _add_assets(srcf):
+    '''
+    Adds one asset of each kind.
+    '''
+    data.add_asset(data.FileAsset(srcf, 'input'))
+    data.add_asset(data.StringIOAsset(io.StringIO('hello'), 'hello.txt'))
+    data.add_asset(data.YAMLDictAsset({'a': 1}, 'a'))
+    data.add_asset(_fom_asset())
+    data.add_asset(_CustomAsset())
+
+
+def main(_):
+    '''
+    main()
+    '''
+    experiment.name('archive-test')
+
+    comps = [c for c in archive.COMPRESSIONS
+             if c != 'zst' or archive.have_zstd()]
+    # Set aside the assets (and archive settings) of this run.
+    prev = data.archive_output()
+    pending = data._Assets().assets
+    data._Assets().clear()
+
+    # Generated files are streamed from disk, not read into memory.
+    for asset in (_fom_asset(), _CustomAsset()):
+        for mem in asset.members():
+            with mem.opener() as file:
+                assert not isinstance(file, io.BytesIO)
+
+    with tempfile.TemporaryDirectory() as tmpd:
+        srcf = os.path.join(tmpd, 'input.dat')
+        with open(srcf, 'wb') as file:
+            file.write(os.urandom(1 << 20))
+
+        for comp in comps:
+            data.archive_output(comp)
+            basep = os.path.join(tmpd, comp, '0')
+            paths = []
+            for _ in range(2):
+                _add_assets(srcf)
+                paths.append(data.write(basep))
+            # Subsequent writes do not clobber earlier archives.
+            sfx = archive.suffix(comp)
+            assert paths == [basep + sfx, basep + '.1' + sfx]
+            assert not os.path.exists(basep)
+
+            arch = archive.Archive(paths[0])
+            logger.log(f'# {comp}: {arch.members()}')
+            assert arch.compression == comp
+            assert arch.names() == [
+                'input/input.dat', 'hello.txt', 'a.yaml', 'foms.yaml',
+                'foms.csv', 'custom/out.txt', 'log.txt'
+            ]
+            with open(srcf, 'rb') as file:
+                assert arch.read('input/input.dat') == file.read()
+            assert arch.read('a.yaml') == b'a: 1'
+            assert len(arch.read('foms.csv').splitlines()) == 100 + 1
+            assert arch.read('custom/out.txt') == b'custom'
+
+            extd = os.path.join(tmpd, comp, 'extracted')
+            assert arch.extract(extd, ['hello.txt']) == \
+                [os.path.join(extd, 'hello.txt')]
+            assert len(arch.extract(extd)) == 7
+            with open(os.path.join(extd, 'hello.txt'), encoding='utf8') as f:
+                assert f.read() == 'hello'
+    data._Assets().archive = prev
+    data._Assets().assets = pending
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,123 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+# pylint: disable=protected-access
+
+'''
+Tests parallel data asset writing.
+'''
+
+import filecmp
+import io
+import os
+import re
+import tempfile
+
+import yaml
+
+from bueno.core import constants
+from bueno.public import archive
+from bueno.public import data
+from bueno.public import experiment
+from bueno.public import logger
+
+
+def main(_):
+    '''
+    main()
+    '''
+    experiment.name('assets-test')
+
+    with tempfile.TemporaryDirectory() as tmpd:
+        srcd = os.path.join(tmpd, 'src')
+        os.makedirs(srcd)
+        srcfs = []
+        for i in range(64):
+            srcf = os.path.join(srcd, f'file-{i}.dat')
+            with open(srcf, 'wb') as file:
+                file.write(os.urandom(i * 4096 + i))
+            srcfs.append(srcf)
+
+        # Direct copies.
+        dstf = os.path.join(tmpd, 'copy.dat')
+        nbytes = data.copyfile(srcfs[-1], dstf)
+        assert nbytes == os.path.getsize(srcfs[-1])
+        assert filecmp.cmp(srcfs[-1], dstf, shallow=False)
+        # Pseudo-files report no size, but have contents.
+        procf = '/proc/self/status'
+        if os.path.exists(procf):
+            dstf = os.path.join(tmpd, 'status')
+            nbytes = data.copyfile(procf, dstf)
+            assert nbytes > 0 and nbytes == os.path.getsize(dstf)
+            mem = archive.Member.from_file(procf, 'status')
+            assert mem.size > 0
+
+        # Set aside the assets of this run.
+        pending = data._Assets().assets
+        data._Assets().clear()
+        for i, srcf in enumerate(srcfs):
+            data.add_asset(data.FileAsset(srcf, f'sub-{i % 4}/nested'))
+        data.add_asset(data.StringIOAsset(io.StringIO('hello'), 'hello.txt'))
+        # Spill large StringIO snapshots to disk.
+        data.StringIOAsset.spill_dir = tmpd
+        data.StringIOAsset.spill_threshold = 1024
+        bigs = 'x' * 4096 + '\u00e9'
+        bigsio = io.StringIO(bigs)
+        big = data.StringIOAsset(bigsio, 'big.txt', 'big')
+        # Later changes must not be reflected in the snapshot.
+        bigsio.write('changed')
+        assert big.spilled and big.getvalue() == bigs
+        data.add_asset(big)
+        data.add_asset(data.YAMLDictAsset({'a': 1}, 'a'))
+
+        outd = os.path.join(tmpd, 'out')
+        data.write(outd)
+
+        for i, srcf in enumerate(srcfs):
+            dstf = os.path.join(
+                outd, f'sub-{i % 4}/nested', os.path.basename(srcf)
+            )
+            assert filecmp.cmp(srcf, dstf, shallow=False)
+        with open(os.path.join(outd, 'hello.txt'), encoding='utf8') as file:
+            assert file.read() == 'hello'
+        with open(os.path.join(outd, 'big/big.txt'), encoding='utf8') as file:
+            assert file.read() == bigs
+        # The spilled snapshot was moved into place.
+        assert not any(f.startswith('bueno-asset-') for f in os.listdir(tmpd))
+        # The log is written last, so it includes the write statistics.
+        logp = os.path.join(outd, constants.SERVICE_LOG_NAME)
+        with open(logp, encoding='utf8') as file:
+            log = file.read()
+        stats = re.findall(r'# Wrote (\d+) Data Assets .* MB/s\)', log)
+        logger.log(f'# Assets Written: {stats}')
+        assert stats == ['67']
+
+        # Every file written is listed in the manifest.
+        with open(os.path.join(outd, data.MANIFEST), encoding='utf8') as file:
+            files = yaml.safe_load(file)['Manifest']['files']
+        paths = [f['path'] for f in files]
+        assert len(paths) == 68 and constants.SERVICE_LOG_NAME in paths
+        for fent in files:
+            fpath = os.path.join(outd, fent['path'])
+            assert fent['size'] == os.path.getsize(fpath)
+            assert fent['digest'] == data.digest_file(fpath)
+        assert data.verify(outd) == []
+        with open(os.path.join(outd, 'hello.txt'), 'a', encoding='utf8') as f:
+            f.write('!')
+        os.unlink(os.path.join(outd, 'a.yaml'))
+        assert data.verify(outd) == ['a.yaml', 'hello.txt']
+
+        # Later writes to the same directory are added to the manifest.
+        data.add_asset(data.YAMLDictAsset({'b': 2}, 'b'))
+        data.write(outd)
+        with open(os.path.join(outd, data.MANIFEST), encoding='utf8') as file:
+            files = yaml.safe_load(file)['Manifest']['files']
+        assert len(files) == 69
+        data._Assets().assets = pending
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
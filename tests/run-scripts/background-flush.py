@@ -0,0 +1,93 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Tests background data flushes.
+'''
+
+import os
+import tempfile
+import threading
+
+from bueno.public import data
+from bueno.public import experiment
+from bueno.public import logger
+from bueno.public import results
+
+
+class _GatedAsset(data.BaseAsset):
+    '''
+    An asset whose write blocks until released (or fails if asked to).
+    '''
+    def __init__(self, fail=False):
+        super().__init__()
+        self.fail = fail
+        self.release = threading.Event()
+
+    def write(self, basep):
+        self.release.wait()
+        if self.fail:
+            raise OSError('gated asset failure')
+        with open(os.path.join(basep, 'gated.txt'), 'w', encoding='utf8') as f:
+            f.write('gated')
+
+
+def main(_):
+    '''
+    main()
+    '''
+    experiment.name('background-flush-test')
+    assert data.background_writes()
+
+    with tempfile.NamedTemporaryFile('w', suffix='.txt') as srcf:
+        srcf.write('before the flush')
+        srcf.flush()
+        # The flush returns while the asset's write is still blocked.
+        gated = _GatedAsset()
+        data.add_asset(gated)
+        rows = results.ResultsWriter('rows.csv', columns={'step': int})
+        rows.add(step=0)
+        data.add_asset(data.YAMLDictAsset({'step': 0}, 'step'))
+        data.add_asset(data.FileAsset(srcf.name))
+        outp = experiment.flush_data()
+        logger.log(f'# Flushing in the background to {outp}')
+        assert not os.path.exists(os.path.join(outp, 'gated.txt'))
+        # Assets added now belong to the next flush.
+        data.add_asset(data.YAMLDictAsset({'step': 1}, 'next-step'))
+        # Sources changed now, and messages logged now, are not flushed.
+        srcf.write(', and after it')
+        srcf.flush()
+        rows.add(step=1)
+        logger.log('# Logged after the flush')
+        gated.release.set()
+        experiment.wait_for_flush()
+        assert os.path.exists(os.path.join(outp, 'gated.txt'))
+        assert os.path.exists(os.path.join(outp, 'step.yaml'))
+        assert not os.path.exists(os.path.join(outp, 'next-step.yaml'))
+        fname = os.path.basename(srcf.name)
+        with open(os.path.join(outp, fname), encoding='utf8') as file:
+            assert file.read() == 'before the flush'
+        with open(os.path.join(outp, 'log.txt'), encoding='utf8') as file:
+            assert 'Logged after the flush' not in file.read()
+        with open(os.path.join(outp, 'rows.csv'), encoding='utf8') as file:
+            assert file.read().split() == ['step', '0']
+        assert data.verify(outp) == []
+
+    # Errors are reported back to the main thread.
+    failing = _GatedAsset(fail=True)
+    data.add_asset(failing)
+    experiment.flush_data()
+    failing.release.set()
+    try:
+        experiment.wait_for_flush()
+        raise AssertionError('background write error not reported')
+    except RuntimeError as exception:
+        logger.log(f'# Expected error: {exception}')
+        assert isinstance(exception.__cause__, OSError)
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
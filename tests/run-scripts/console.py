@@ -0,0 +1,101 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+# pylint: disable=protected-access
+
+'''
+Tests per-source console routing.
+'''
+
+import io
+import os
+import re
+import tempfile
+
+from bueno.public import host
+from bueno.public import logger
+
+
+def _run(nlines):
+    '''
+    Runs a command printing nlines, returning the console output.
+    '''
+    handler = logger._TheLogger().console
+    cons = io.StringIO()
+    logger.flush()
+    prev = handler.setStream(cons)
+    try:
+        logger.log('# Before')
+        host.run(f'seq 1 {nlines}')
+        logger.log('# After')
+        logger.flush()
+    finally:
+        handler.setStream(prev)
+    return cons.getvalue().splitlines()
+
+
+def main(_):
+    '''
+    main()
+    '''
+    # Set by bueno run --console tail --console-rate 5.
+    assert logger.console() == 'tail'
+    nlines = 2000
+
+    lines = _run(nlines)
+    shown = [ln for ln in lines if ln.isdigit()]
+    logger.log(f'# Program Output Lines Shown: {len(shown)}')
+    assert lines[0] == '# Before' and lines[-1] == '# After'
+    assert 0 < len(shown) < nlines
+    notes = [re.match(r'# \[(\d+) lines', ln) for ln in lines]
+    nskipped = sum(int(n.group(1)) for n in notes if n)
+    # Lines not shown are accounted for, except those skipped since the last
+    # line shown.
+    assert len(shown) + nskipped + logger._TheLogger().console.skipped == nlines
+
+    logger.console('bueno')
+    lines = _run(nlines)
+    assert lines == ['# Before', '# After']
+    logger.console('all')
+    lines = _run(10)
+    # Lines not shown in tail mode are noted before the next line shown.
+    assert re.match(r'# \[\d+ lines of program output not shown\]', lines[1])
+    del lines[1]
+    assert lines == ['# Before'] + [str(i) for i in range(1, 11)] + ['# After']
+
+    # Captured messages remember their source.
+    with logger.capture() as cap:
+        logger.output('program line')
+    logger.console('bueno')
+    handler = logger._TheLogger().console
+    cons = io.StringIO()
+    logger.flush()
+    prev = handler.setStream(cons)
+    for msg in cap:
+        logger.log(msg)
+    logger.flush()
+    handler.setStream(prev)
+    assert cons.getvalue() == ''
+    logger.console('tail')
+
+    # The log holds all program output regardless of the console mode.
+    with tempfile.TemporaryDirectory() as tmpd:
+        logp = os.path.join(tmpd, 'log.txt')
+        logger.write(logp)
+        with open(logp, encoding='utf8') as file:
+            logged = [ln.strip() for ln in file]
+        assert logged.count(str(nlines)) == 2
+        assert 'program line' in logged
+
+    try:
+        logger.log('bad', source='unknown')
+        raise AssertionError('unknown source not detected')
+    except ValueError as exception:
+        logger.log(f'# Expected error: {exception}')
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
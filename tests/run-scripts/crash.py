@@ -0,0 +1,38 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Tests that a failed run leaves its log on disk. Usage: crash.py [MODE], where
+MODE is one of raise (the default), exit, or kill.
+'''
+
+import os
+import signal
+import sys
+
+from bueno.public import experiment
+from bueno.public import host
+from bueno.public import logger
+
+
+def main(argv):
+    '''
+    main()
+    '''
+    mode = argv[1] if len(argv) > 1 else 'raise'
+    experiment.name('crash-test')
+    # A fixed path, so the log can be found after the failure.
+    experiment.foutput(f'crash-{mode}')
+    host.run('echo "hello before the failure"')
+    logger.log('# Failing on Purpose')
+    if mode == 'exit':
+        sys.exit(4)
+    if mode == 'kill':
+        logger.flush()
+        os.kill(os.getpid(), signal.SIGKILL)
+    raise RuntimeError('This run fails on purpose.')
@@ -0,0 +1,85 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+# pylint: disable=protected-access
+
+'''
+Tests deduplicating file assets through an object store.
+'''
+
+import filecmp
+import os
+import tempfile
+
+import yaml
+
+from bueno.public import data
+from bueno.public import experiment
+from bueno.public import logger
+
+
+def _write_runs(store, srcf, tmpd):
+    '''
+    Writes srcf as an asset of two runs. Returns the two output paths.
+    '''
+    outds = [os.path.join(tmpd, f'run-{i}') for i in range(2)]
+    # Set aside the assets (and object store) of this run.
+    prev = data.object_store()
+    pending = data._Assets().assets
+    data._Assets().clear()
+    data.object_store(store)
+    try:
+        for outd in outds:
+            data.add_asset(data.FileAsset(srcf, 'input'))
+            data.write(outd)
+    finally:
+        data._Assets().store = prev
+        data._Assets().assets = pending
+    return [os.path.join(o, 'input', os.path.basename(srcf)) for o in outds]
+
+
+def main(argv):
+    '''
+    main()
+    '''
+    experiment.name('dedup-test')
+
+    with tempfile.TemporaryDirectory() as tmpd:
+        srcf = os.path.join(tmpd, 'input.dat')
+        with open(srcf, 'wb') as file:
+            file.write(os.urandom(1 << 20))
+
+        for link in data.ObjectStore.links:
+            store = data.ObjectStore(os.path.join(tmpd, 'objs'), link)
+            dstfs = _write_runs(store, srcf, os.path.join(tmpd, link))
+            for dstf in dstfs:
+                assert filecmp.cmp(srcf, dstf, shallow=False)
+                assert os.path.islink(dstf) == (link == 'symlink')
+            # Both runs share a single stored copy.
+            assert os.path.samefile(dstfs[0], dstfs[1])
+            digest = data.ObjectStore.digest(srcf)
+            assert os.path.samefile(dstfs[0], store.objpath(digest))
+
+            manp = os.path.join(os.path.dirname(os.path.dirname(dstfs[1])),
+                                data.OBJECTS_MANIFEST)
+            with open(manp, encoding='utf8') as file:
+                objs = yaml.safe_load(file)['Objects']
+            logger.log(f'# {link}: {objs}')
+            assert objs['files'] == [{
+                'path': 'input/input.dat',
+                'digest': f'sha256:{digest}',
+                'size': os.path.getsize(srcf),
+                'link': link
+            }]
+
+    # When run with --dedup, the program is stored in the object store.
+    if data.object_store() is not None:
+        logger.log(f'# Object Store: {data.object_store().root}')
+        assert os.path.basename(argv[0]) == 'dedup.py'
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,72 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Tests for experiment.FOMCollection.
+'''
+
+import os
+import time
+
+from bueno.core import stats
+
+from bueno.public import experiment
+from bueno.public import logger
+
+
+def main(_):
+    '''
+    main()
+    '''
+    experiment.name('foms-test')
+
+    fomc = experiment.foms()
+    for nprocs in (1, 2, 4):
+        for trial in range(5):
+            fom = experiment.FOM('runtime', 'Wall time', 's', nprocs + trial)
+            fomc.add(fom, nprocs=nprocs, input='small')
+
+    summary = fomc.summarize()
+    logger.log(f'# Summary: {summary}')
+    assert len(summary) == 3
+    for item in summary:
+        nprocs = item['params']['nprocs']
+        assert item['stats']['count'] == 5
+        assert item['stats']['mean'] == nprocs + 2
+        assert item['stats']['median'] == nprocs + 2
+        assert item['stats']['min'] == nprocs
+        assert item['stats']['max'] == nprocs + 4
+
+    # Group across all parameters except input.
+    summary = fomc.summarize(by=['input'], percentiles=[25])
+    assert len(summary) == 1
+    assert summary[0]['stats']['count'] == 15
+    assert len(fomc.values('runtime', nprocs=2)) == 5
+    # The values returned are a copy, so the collection can still grow.
+    copyc = fomc.copy()
+    vals = copyc.values('runtime', nprocs=2)
+    copyc.add(experiment.FOM('runtime', 'Wall time', 's', 0.0), nprocs=2,
+              input='small')
+    assert len(vals) == 5 and len(copyc.values('runtime', nprocs=2)) == 6
+
+    with open(os.devnull, 'w', encoding='utf8') as file:
+        fomc.write_csv(file)
+
+    # Summarize a large number of samples in a separate collection.
+    bigc = experiment.FOMCollection()
+    bigc.extend('bw', 'Bandwidth', 'GB/s', range(10**6), size=1024)
+    stime = time.perf_counter()
+    summary = bigc.summarize()
+    etime = time.perf_counter()
+    logger.log(f'# NumPy available: {stats.have_numpy()}')
+    logger.log(f'# Summarized 10^6 samples in {etime - stime:.4f} s')
+    assert summary[0]['stats']['max'] == 10**6 - 1
+
+    experiment.flush_data()
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
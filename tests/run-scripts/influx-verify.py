@@ -0,0 +1,99 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+# pylint: disable=protected-access
+
+'''
+Benchmarks InfluxDB line protocol verification. Usage: influx-verify.py [N],
+where N is the number of measurements verified (default: 100000).
+'''
+
+import os
+import tempfile
+
+import lark
+
+from bueno.public import datasink
+from bueno.public import experiment
+from bueno.public import logger
+from bueno.public import utils
+
+
+def _measurement(i):
+    '''
+    Returns a measurement with a variety of tag and field types.
+    '''
+    return datasink.InfluxDBMeasurement(
+        f'app-{i % 7}.run',
+        values={
+            'time': i * 0.001,
+            'iters': i,
+            'converged': i % 2 == 0,
+            'solver': f'cg {i % 3}',
+            'nested': {'tol': 1e-08, 'rank': i % 36}
+        },
+        tags={'host': f'node{i % 64}', 'nodes': str(2 ** (i % 8))},
+        verify_data=True
+    )
+
+
+def main(argv):
+    '''
+    main()
+    '''
+    experiment.name('influx-verify-bench')
+    nmeas = int(argv[1]) if len(argv) > 1 else 100000
+    parser = datasink._InfluxLineProtocolParser
+    with tempfile.TemporaryDirectory() as tmpd:
+        os.environ['XDG_CACHE_HOME'] = tmpd
+        parser._lark = None
+        with utils.Timer() as build:
+            parser._parser()
+        assert os.path.isfile(parser._cache_path())
+        parser._lark = None
+        with utils.Timer() as load:
+            parser._parser()
+    logger.log(f'# Parser Build (s): {build.elapsed:.4f}')
+    logger.log(f'# Parser Cache Load (s): {load.elapsed:.4f}')
+
+    meas = [_measurement(i) for i in range(nmeas)]
+    with utils.Timer() as verified:
+        lines = [m.data() for m in meas]
+    # The common case never reaches the Lark parser.
+    assert all(parser._fast.fullmatch(ln) for ln in lines)
+    logger.log(f'# Verified {nmeas} Measurements (s): {verified.elapsed:.4f}')
+
+    # Lark alone, on a sample: once with the cached parser and once building
+    # a parser per measurement (as every verification once did).
+    nsample = min(nmeas, 1000)
+    with utils.Timer() as cached:
+        for line in lines[:nsample]:
+            parser._parser().parse(line)
+    nbuilds = min(nmeas, 20)
+    with utils.Timer() as rebuilt:
+        for line in lines[:nbuilds]:
+            lark.Lark(parser.grammar, parser='lalr', start='line').parse(line)
+    logger.log(f"# {'Method':<24} {'us/measurement':>14}")
+    for name, secs, count in (
+            ('fast path', verified.elapsed, nmeas),
+            ('cached Lark parser', cached.elapsed, nsample),
+            ('Lark parser per call', rebuilt.elapsed, nbuilds)
+    ):
+        logger.log(f'# {name:<24} {secs / count * 1e6:>14.2f}')
+
+    # Lines the fast path does not accept still get detailed errors.
+    bad = lines[0].replace('=', '=:', 1)
+    try:
+        parser().parse(bad)
+        raise AssertionError('bad line accepted')
+    except lark.exceptions.UnexpectedInput as exception:
+        logger.log(f'# Expected error: {type(exception).__name__}')
+    # As do lines it accepts only by way of the Lark parser.
+    parser().parse('name,tk0=+1 fk0=1 1\n')
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
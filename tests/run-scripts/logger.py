@@ -0,0 +1,114 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+# pylint: disable=protected-access
+
+'''
+Tests the file-backed central logger.
+'''
+
+import concurrent.futures
+import os
+import tempfile
+
+from bueno.core import constants
+from bueno.public import archive
+from bueno.public import data
+from bueno.public import experiment
+from bueno.public import logger
+
+
+def main(_):
+    '''
+    main()
+    '''
+    experiment.name('logger-test')
+
+    logp, size = logger.snapshot()
+    assert os.path.isfile(logp) and size > 0
+    for i in range(2 * logger.TAIL_LINES):
+        logger.log(f'# Message {i}')
+    # Only a small tail is kept in memory.
+    assert len(logger.tail()) == logger.TAIL_LINES
+    assert logger.tail(2) == [
+        f'# Message {2 * logger.TAIL_LINES - 2}',
+        f'# Message {2 * logger.TAIL_LINES - 1}'
+    ]
+
+    with tempfile.TemporaryDirectory() as tmpd:
+        dest = os.path.join(tmpd, 'log.txt')
+        nbytes = logger.write(dest)
+        assert nbytes == os.path.getsize(dest) == logger.snapshot()[1]
+        with open(dest, encoding='utf8') as file:
+            first = file.read()
+        inode = os.stat(dest).st_ino
+
+        # Later writes only append what was logged since.
+        logger.log('# After the first write')
+        nbytes = logger.write(dest)
+        assert nbytes == len('# After the first write\n')
+        assert os.stat(dest).st_ino == inode
+        with open(dest, encoding='utf8') as file:
+            assert file.read() == first + '# After the first write\n'
+        assert logger.write(dest) == 0
+
+        # Modified destinations are rewritten in full.
+        with open(dest, 'a', encoding='utf8') as file:
+            file.write('tampered\n')
+        assert logger.write(dest) == logger.snapshot()[1]
+        with open(dest, encoding='utf8') as file:
+            assert 'tampered' not in file.read()
+
+        # Messages logged concurrently by more threads than the queue holds
+        # are all written, each thread's in order.
+        nthreads = 8
+        nmsgs = logger.QUEUE_SIZE // 2
+
+        def _logn(tid):
+            for i in range(nmsgs):
+                logger.log(f'# Thread {tid} Message {i}')
+
+        with concurrent.futures.ThreadPoolExecutor(nthreads) as pool:
+            list(pool.map(_logn, range(nthreads)))
+        logger.write(dest)
+        with open(dest, encoding='utf8') as file:
+            lines = [ln for ln in file if ln.startswith('# Thread ')]
+        assert len(lines) == nthreads * nmsgs
+        for tid in range(nthreads):
+            tlines = [ln for ln in lines if ln.startswith(f'# Thread {tid} ')]
+            assert tlines == [
+                f'# Thread {tid} Message {i}\n' for i in range(nmsgs)
+            ]
+
+        # Data writes append to the log asset, too.
+        pending = data._Assets().assets
+        data._Assets().clear()
+        outd = os.path.join(tmpd, 'out')
+        data.write(outd)
+        outlog = os.path.join(outd, constants.SERVICE_LOG_NAME)
+        with open(outlog, encoding='utf8') as file:
+            first = file.read()
+        inode = os.stat(outlog).st_ino
+        logger.log('# Between data writes')
+        data.write(outd)
+        assert os.stat(outlog).st_ino == inode
+        with open(outlog, encoding='utf8') as file:
+            second = file.read()
+        assert second.startswith(first)
+        assert '# Between data writes' in second[len(first):]
+        assert data.verify(outd) == []
+
+        # Archived logs hold the messages logged thus far.
+        data.archive_output('none')
+        path = data.write(os.path.join(tmpd, 'arch'))
+        data._Assets().archive = None
+        alog = archive.Archive(path).read(constants.SERVICE_LOG_NAME)
+        assert b'# Between data writes' in alog
+        data._Assets().assets = pending
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,101 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+# pylint: disable=protected-access
+
+'''
+Tests the memory budget of pending data assets.
+'''
+
+import io
+import json
+import os
+import tempfile
+
+import yaml
+
+from bueno.public import data
+from bueno.public import experiment
+from bueno.public import logger
+
+
+def main(_):
+    '''
+    main()
+    '''
+    experiment.name('memory-budget-test')
+    # Set by bueno run --memory-budget.
+    budget = data.memory_budget()
+    logger.log(f'# Memory Budget: {budget} B')
+    assert budget == 4096
+
+    with tempfile.TemporaryDirectory() as tmpd:
+        staging = os.path.join(tmpd, 'staging')
+        os.makedirs(staging)
+        # Set aside the assets of this run.
+        pending = data._Assets().assets
+        data._Assets().clear()
+        data.memory_budget(64 * 1024, staging)
+
+        strs = {}
+        for i in range(16):
+            strs[f's{i}.txt'] = str(i) * (i * 1024)
+            data.add_asset(
+                data.StringIOAsset(io.StringIO(strs[f's{i}.txt']), f's{i}.txt')
+            )
+        ydict = {'values': list(range(2048)), 'name': 'y'}
+        data.add_asset(data.YAMLDictAsset(ydict, 'y'))
+        jdict = {'values': [str(i) for i in range(4096)]}
+        data.add_asset(data.JSONAsset(jdict, 'j'))
+        data.add_asset(data.StringIOAsset(io.StringIO('small'), 'small.txt'))
+        # FOM collections count toward the budget, too.
+        fomc = experiment.FOMCollection()
+        fomc.extend('t', 'Time', 's', range(16384), n=1)
+        fasset = experiment._FOMCollectionAsset(fomc)
+        assert fasset.resident() >= 16384 * 8
+        data.add_asset(fasset)
+        assert fasset.spilled and fasset.resident() == 0
+        assert fasset.spilled_bytes() > 16384
+
+        stats = data.pending_bytes()
+        logger.log(f'# Pending Data Assets: {stats}')
+        assert stats['assets'] == 20
+        assert 0 < stats['resident'] <= 64 * 1024
+        assert stats['spilled'] > 0
+        assert len(os.listdir(staging)) > 0
+        # The largest assets spill first, so small ones stay in memory.
+        assets = data._Assets().assets
+        assert assets[15].spilled and not assets[18].spilled
+
+        outd = os.path.join(tmpd, 'out')
+        data.write(outd)
+        assert data.pending_bytes()['assets'] == 0
+        for fname, sval in strs.items():
+            with open(os.path.join(outd, fname), encoding='utf8') as file:
+                assert file.read() == sval
+        with open(os.path.join(outd, 'y.yaml'), encoding='utf8') as file:
+            assert yaml.safe_load(file) == ydict
+        with open(os.path.join(outd, 'j.json'), encoding='utf8') as file:
+            assert json.load(file) == jdict
+        with open(os.path.join(outd, 'foms.csv'), encoding='utf8') as file:
+            assert len(file.readlines()) == 16384 + 1
+        assert os.path.isfile(os.path.join(outd, 'foms.yaml'))
+        # Spilled assets were moved into place.
+        assert os.listdir(staging) == []
+        assert data.verify(outd) == []
+
+        # A zero budget keeps nothing in memory.
+        data.memory_budget(0, staging)
+        data.add_asset(data.JSONAsset(jdict, 'j'))
+        assert data.pending_bytes()['resident'] == 0
+        data._Assets().clear()
+
+        data._Assets().limit(None, None)
+        data._Assets().assets = pending
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,153 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Tests durable outboxes and spooling measurements to them.
+'''
+
+import json
+import os
+import shutil
+
+import pika
+
+from bueno.public import datasink
+from bueno.public import logger
+from bueno.public import outbox
+
+
+class _DownConnection:  # pylint: disable=too-few-public-methods
+    '''
+    Stand-in blocking connection to an unreachable broker.
+    '''
+    def __init__(self, params):
+        raise pika.exceptions.AMQPConnectionError('Broker is down.')
+
+
+class _Sink:  # pylint: disable=too-few-public-methods
+    '''
+    Collects replayed records, optionally failing after some batches or
+    delivering only some records.
+    '''
+    def __init__(self, fail_after=None, deliver=None):
+        self.records = []
+        self.batches = 0
+        self.fail_after = fail_after
+        self.deliver = deliver
+
+    def __call__(self, batch):
+        if self.fail_after is not None and self.batches >= self.fail_after:
+            raise pika.exceptions.AMQPConnectionError('Broker is down.')
+        if self.deliver is not None:
+            return self.deliver
+        self.batches += 1
+        self.records.extend(batch)
+        return len(batch)
+
+
+def _payloads(start, stop):
+    '''
+    Returns test payloads.
+    '''
+    return [f'{i}\n'.encode('utf8') for i in range(start, stop)]
+
+
+def main(_):
+    '''
+    main()
+    '''
+    path = os.path.abspath(os.path.join('output', 'outbox'))
+    shutil.rmtree(path, ignore_errors=True)
+
+    # Segments rotate at the size limit and only sealed ones are replayed.
+    obox = outbox.Outbox(path, segment_bytes=1024, fsync='interval')
+    nrecs = 1000
+    assert obox.append(_payloads(0, nrecs)) == nrecs
+    nsegs = len(obox.segments())
+    assert nsegs > 1 and len(os.listdir(path)) == nsegs + 1
+    obox.close()
+    assert len(obox.segments()) == nsegs + 1
+    assert obox.status() == {
+        'segments': nsegs + 1,
+        'records': nrecs,
+        'bytes': sum(len(p) for p in _payloads(0, nrecs))
+    }
+
+    # Interrupted replays resume where they stopped.
+    sink = _Sink(fail_after=3)
+    try:
+        obox.replay(sink, batch_size=7)
+        raise AssertionError('replay failure not raised')
+    except pika.exceptions.AMQPConnectionError as exception:
+        logger.log(f'# Expected error: {exception!r}')
+    assert sink.records == _payloads(0, 21)
+    sink.fail_after = None
+    assert obox.replay(sink, batch_size=7) == nrecs - 21
+    assert sink.records == _payloads(0, nrecs)
+    assert not obox.segments()
+
+    # Batches not fully delivered (e.g., unroutable) stop the replay, keeping
+    # their records.
+    obox.append(_payloads(0, 10))
+    try:
+        obox.replay(_Sink(deliver=0))
+        raise AssertionError('undelivered records not detected')
+    except RuntimeError as exception:
+        logger.log(f'# Expected error: {exception!r}')
+    assert obox.status()['records'] == 10
+    sink = _Sink()
+    assert obox.replay(sink) == 10 and sink.records == _payloads(0, 10)
+
+    # Truncated records end a segment, corrupt ones set it aside.
+    obox.append(_payloads(0, 10))
+    obox.rotate()
+    segp = obox.segments()[0]
+    with open(segp, 'ab') as file:
+        file.write(outbox.RECORD_HEADER.pack(100, 0) + b'partial')
+    obox.append(_payloads(10, 20))
+    obox.rotate()
+    with open(obox.segments()[1], 'r+b') as file:
+        file.seek(-1, os.SEEK_END)
+        file.write(b'X')
+    sink = _Sink()
+    assert obox.replay(sink) == 19
+    assert sink.records == _payloads(0, 19)
+    assert len([f for f in os.listdir(path)
+                if f.endswith(outbox.BAD_SUFFIX)]) == 1
+
+    # Measurements that cannot be sent are spooled to the outbox.
+    obox.segment_bytes = 1024 * 1024
+    real = pika.BlockingConnection
+    pika.BlockingConnection = _DownConnection
+    try:
+        params = datasink.RabbitMQConnectionParams('localhost', 5671)
+        client = datasink.RabbitMQBlockingClient(
+            params, 'queue', 'exchange', 'bueno', spool=obox
+        )
+        meas = [datasink.JSONMeasurement({'i': i}, 1.0) for i in range(100)]
+        client.send(meas[0])
+        assert client.send_batch(meas[1:]) == 99
+        assert client.spooled == 100
+        # Deferred measurements are spooled without connecting.
+        client = datasink.RabbitMQBlockingClient(
+            params, 'queue', 'exchange', 'bueno', spool=obox, defer=True
+        )
+        client.send_batch(meas)
+        assert client.spooled == 100 and client.connections == 0
+    finally:
+        pika.BlockingConnection = real
+    sink = _Sink()
+    assert obox.replay(sink, batch_size=1000) == 200
+    assert sink.batches == 1
+    assert [json.loads(r)['i'] for r in sink.records] == list(range(100)) * 2
+
+    # Leave some measurements for bueno replay status.
+    obox.append(_payloads(0, 10))
+    obox.close()
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
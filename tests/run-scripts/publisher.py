@@ -0,0 +1,289 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Tests background publishing against a stand-in broker (a mocked pika
+transport).
+'''
+
+import json
+import os
+import threading
+import time
+
+import pika
+
+from bueno.public import datasink
+from bueno.public import experiment
+from bueno.public import logger
+from bueno.public import outbox
+from bueno.public import utils
+
+
+class _Broker:
+    '''
+    Stand-in broker state.
+    '''
+    def __init__(self):
+        self.messages = []
+        # Whether or not the broker accepts connections.
+        self.down = False
+        # Publishes wait until set.
+        self.gate = threading.Event()
+        self.gate.set()
+
+
+BROKER = _Broker()
+
+
+class _Channel:
+    '''
+    Stand-in channel.
+    '''
+    def __init__(self, conn):
+        self.conn = conn
+
+    @property
+    def is_open(self):
+        '''
+        Returns whether or not the channel is open.
+        '''
+        return self.conn.is_open
+
+    def confirm_delivery(self):
+        '''
+        Enables publisher confirms.
+        '''
+
+    def basic_publish(  # pylint: disable=unused-argument
+            self, exchange, routing_key, body, properties=None, mandatory=False
+    ):
+        '''
+        Publishes a message.
+        '''
+        BROKER.gate.wait()
+        if BROKER.down:
+            self.conn.is_open = False
+            raise pika.exceptions.StreamLostError('Stream lost.')
+        BROKER.messages.append(body)
+
+
+class _Connection:
+    '''
+    Stand-in blocking connection.
+    '''
+    def __init__(self, params):
+        if BROKER.down:
+            raise pika.exceptions.AMQPConnectionError('Broker is down.')
+        self.params = params
+        self.is_open = True
+
+    def channel(self):
+        '''
+        Returns a new channel.
+        '''
+        return _Channel(self)
+
+    def process_data_events(self, time_limit=0):  # pylint: disable=W0613
+        '''
+        Services heartbeats.
+        '''
+
+    def close(self):
+        '''
+        Closes the connection.
+        '''
+        self.is_open = False
+
+
+def _received():
+    '''
+    Returns the measurement indices received by the broker, then forgets them.
+    '''
+    lines = b''.join(BROKER.messages).splitlines()
+    BROKER.messages = []
+    return [json.loads(ln)['i'] for ln in lines]
+
+
+def _meas(i):
+    '''
+    Returns a measurement.
+    '''
+    return datasink.JSONMeasurement({'i': i}, 1.0)
+
+
+def _publisher(policy, maxsize=10, **kwargs):
+    '''
+    Returns a background publisher sending one measurement per message.
+    '''
+    params = datasink.RabbitMQConnectionParams('localhost', 5671)
+    client = datasink.RabbitMQBlockingClient(
+        params, 'queue', 'exchange', 'bueno', batch_size=1
+    )
+    return datasink.BackgroundPublisher(client, maxsize, policy, **kwargs)
+
+
+class _FailingClient(datasink.RabbitMQBlockingClient):
+    '''
+    A client whose sends raise the provided exception.
+    '''
+    def __init__(self, exception):
+        params = datasink.RabbitMQConnectionParams('localhost', 5671)
+        super().__init__(params, 'queue', 'exchange', 'bueno')
+        self.exception = exception
+
+    def send_lines(self, lines, verbose=False):
+        raise self.exception
+
+
+def _hold(pub):
+    '''
+    Holds the publisher's worker in a publish of measurement 0.
+    '''
+    BROKER.gate.clear()
+    pub.publish(_meas(0))
+    while pub.queued:
+        time.sleep(0.01)
+
+
+def main(_):
+    '''
+    main()
+    '''
+    real = pika.BlockingConnection
+    pika.BlockingConnection = _Connection
+    try:
+        # Publishers are drained by experiment.flush_data().
+        pub = _publisher('block')
+        hooks = experiment._TheExperiment().flush_hooks  # pylint: disable=W0212
+        assert datasink.drain in hooks
+        for i in range(100):
+            pub.publish(_meas(i))
+        assert datasink.drain()
+        assert _received() == list(range(100))
+
+        # The block policy waits for room in the queue.
+        _hold(pub)
+        thread = threading.Thread(
+            target=lambda: [pub.publish(_meas(i)) for i in range(1, 100)]
+        )
+        thread.start()
+        time.sleep(0.2)
+        assert thread.is_alive() and pub.queued == 10
+        BROKER.gate.set()
+        thread.join()
+        assert pub.drain(10)
+        assert _received() == list(range(100))
+        assert pub.counters()['sent'] == 200
+        assert pub.close()
+
+        # The drop-oldest policy discards the oldest queued measurements.
+        pub = _publisher('drop-oldest')
+        _hold(pub)
+        for i in range(1, 21):
+            pub.publish(_meas(i))
+        assert not pub.drain(0.1)
+        BROKER.gate.set()
+        assert pub.drain(10)
+        assert _received() == [0] + list(range(11, 21))
+        counts = pub.counters()
+        assert counts['sent'] == 11 and counts['dropped'] == 10
+        pub.close()
+
+        # The spill policy sends spilled measurements once the queue empties.
+        spilld = os.path.abspath('spill')
+        os.makedirs(spilld, exist_ok=True)
+        pub = _publisher('spill', spill_dir=spilld, retry_interval=0.1)
+        _hold(pub)
+        for i in range(1, 31):
+            pub.publish(_meas(i))
+        assert pub.counters()['spilled'] == 20
+        assert len(os.listdir(spilld)) == 1
+        BROKER.gate.set()
+        assert pub.drain(10)
+        assert _received() == list(range(31))
+        assert not os.listdir(spilld)
+
+        # It also retains measurements while the broker is down.
+        BROKER.down = True
+        for i in range(50):
+            pub.publish(_meas(i))
+        time.sleep(0.3)
+        assert not _received()
+        assert pub.spillp is not None
+        # Drains stop at the first failed send, leaving the spill on disk.
+        with utils.Timer() as timer:
+            assert not datasink.drain()
+        assert timer.elapsed < 5 and os.path.getsize(pub.spillp) > 0
+        BROKER.down = False
+        # A send started while the broker was down may still fail.
+        assert any(pub.drain(10) for _ in range(3))
+        assert sorted(_received()) == list(range(50))
+        counts = pub.counters()
+        logger.log(f'# Spill Counters: {counts}')
+        assert counts['sent'] == 81 and counts['failed'] == 0
+        pub.close()
+        os.rmdir(spilld)
+
+        # Measurements appended to the client's outbox are not counted as
+        # sent.
+        obox = outbox.Outbox(os.path.abspath(os.path.join('output', 'pobox')))
+        params = datasink.RabbitMQConnectionParams('localhost', 5671)
+        client = datasink.RabbitMQBlockingClient(
+            params, 'queue', 'exchange', 'bueno', spool=obox
+        )
+        pub = datasink.BackgroundPublisher(client)
+        BROKER.down = True
+        for i in range(5):
+            pub.publish(_meas(i))
+        assert pub.drain(10)
+        counts = pub.counters()
+        assert counts['outboxed'] == 5 and counts['sent'] == 0
+        BROKER.down = False
+        pub.close()
+
+        # Other policies count measurements not sent as failed.
+        pub = _publisher('block')
+        BROKER.down = True
+        for i in range(5):
+            pub.publish(_meas(i))
+        assert pub.drain(10)
+        assert pub.counters()['failed'] == 5
+        BROKER.down = False
+        pub.close()
+        try:
+            pub.publish(_meas(0))
+            raise AssertionError('publish after close not refused')
+        except RuntimeError as exception:
+            logger.log(f'# Expected error: {exception!r}')
+
+        # Negative acknowledgments are counted as failures, too.
+        nack = pika.exceptions.NackError([])
+        pub = datasink.BackgroundPublisher(_FailingClient(nack), 2, 'block')
+        for i in range(5):
+            pub.publish(_meas(i))
+        assert pub.drain(10)
+        assert pub.counters()['failed'] == 5
+        pub.close()
+
+        # Should the worker stop, publishes and drains do not wait for it.
+        fail = RuntimeError('unexpected')
+        pub = datasink.BackgroundPublisher(_FailingClient(fail), 2, 'block')
+        try:
+            for i in range(5):
+                pub.publish(_meas(i))
+            raise AssertionError('publish to a stopped worker not refused')
+        except RuntimeError as exception:
+            logger.log(f'# Expected error: {exception!r}')
+        assert not pub.drain(1)
+        pub.close(1)
+    finally:
+        BROKER.gate.set()
+        pika.BlockingConnection = real
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,261 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Tests the RabbitMQ client against a stand-in broker (a mocked pika transport).
+'''
+
+import json
+import time
+
+import pika
+
+from bueno.public import datasink
+from bueno.public import logger
+
+
+class _Broker:
+    '''
+    Stand-in broker state.
+    '''
+    def __init__(self):
+        self.messages = []
+        self.connects = 0
+        self.heartbeats = 0
+        # The number of publishes that fail with a lost connection.
+        self.failures = 0
+        # Whether or not the broker accepts connections.
+        self.down = False
+        self.routes = {'bueno'}
+        self.connections = []
+
+
+BROKER = _Broker()
+
+
+class _Channel:
+    '''
+    Stand-in channel.
+    '''
+    def __init__(self, conn):
+        self.conn = conn
+        self.confirming = False
+
+    @property
+    def is_open(self):
+        '''
+        Returns whether or not the channel is open.
+        '''
+        return self.conn.is_open
+
+    def confirm_delivery(self):
+        '''
+        Enables publisher confirms.
+        '''
+        self.confirming = True
+
+    def basic_publish(  # pylint: disable=unused-argument
+            self, exchange, routing_key, body, properties=None, mandatory=False
+    ):
+        '''
+        Publishes a message.
+        '''
+        if not self.is_open:
+            raise pika.exceptions.ChannelWrongStateError('Channel is closed.')
+        if BROKER.failures > 0:
+            BROKER.failures -= 1
+            self.conn.is_open = False
+            raise pika.exceptions.StreamLostError('Stream lost.')
+        if mandatory and routing_key not in BROKER.routes:
+            raise pika.exceptions.UnroutableError([])
+        BROKER.messages.append(body)
+
+
+class _Connection:
+    '''
+    Stand-in blocking connection.
+    '''
+    def __init__(self, params):
+        if BROKER.down:
+            raise pika.exceptions.AMQPConnectionError('Broker is down.')
+        self.params = params
+        self.is_open = True
+        BROKER.connects += 1
+        BROKER.connections.append(self)
+
+    def channel(self):
+        '''
+        Returns a new channel.
+        '''
+        return _Channel(self)
+
+    def process_data_events(self, time_limit=0):  # pylint: disable=W0613
+        '''
+        Services heartbeats.
+        '''
+        if not self.is_open:
+            raise pika.exceptions.ConnectionWrongStateError('Closed.')
+        BROKER.heartbeats += 1
+
+    def close(self):
+        '''
+        Closes the connection.
+        '''
+        self.is_open = False
+
+
+def main(_):
+    '''
+    main()
+    '''
+    real = pika.BlockingConnection
+    pika.BlockingConnection = _Connection
+    try:
+        params = datasink.RabbitMQConnectionParams(
+            'localhost', 5671, heartbeat=1
+        )
+        client = datasink.RabbitMQBlockingClient(
+            params, 'queue', 'exchange', 'bueno'
+        )
+        # No connection is made until the first send.
+        assert client.connections == 0
+        nmsgs = 100
+        for i in range(nmsgs):
+            client.send(datasink.JSONMeasurement({'i': i}, 1.0))
+        # A single connection serves all sends.
+        assert client.connections == 1 and BROKER.connects == 1
+        assert len(BROKER.messages) == nmsgs
+
+        # Heartbeats are serviced while idle.
+        time.sleep(1.6)
+        assert BROKER.heartbeats >= 1
+        logger.log(f'# Heartbeats Serviced: {BROKER.heartbeats}')
+
+        # Connections lost while publishing are replaced transparently.
+        BROKER.failures = 1
+        client.send(datasink.JSONMeasurement({'i': nmsgs}, 1.0))
+        assert client.connections == 2
+        assert len(BROKER.messages) == nmsgs + 1
+
+        # So are connections closed by the broker while idle.
+        BROKER.connections[-1].is_open = False
+        client.send(datasink.JSONMeasurement({'i': nmsgs + 1}, 1.0))
+        assert client.connections == 3
+        assert len(BROKER.messages) == nmsgs + 2
+
+        # Unroutable messages are reported, but not retried.
+        BROKER.routes = set()
+        client.send(datasink.JSONMeasurement({'i': -1}, 1.0))
+        assert client.connections == 3
+        BROKER.routes = {'bueno'}
+
+        # Connection failures persisting across retries are raised.
+        BROKER.down = True
+        BROKER.failures = 1
+        try:
+            client.send(datasink.JSONMeasurement({'i': -1}, 1.0))
+            raise AssertionError('connection failure not raised')
+        except pika.exceptions.AMQPConnectionError as exception:
+            logger.log(f'# Expected error: {exception!r}')
+        BROKER.down = False
+        client.send(datasink.JSONMeasurement({'i': nmsgs + 2}, 1.0))
+        assert len(BROKER.messages) == nmsgs + 3
+
+        client.close()
+        assert not BROKER.connections[-1].is_open
+
+        # Connections made after a close are kept alive, too.
+        beats = BROKER.heartbeats
+        client.send(datasink.JSONMeasurement({'i': nmsgs + 3}, 1.0))
+        time.sleep(1.6)
+        assert BROKER.heartbeats > beats
+        client.close()
+
+        # Batches are packed into few, newline-delimited messages.
+        BROKER.messages = []
+        client = datasink.RabbitMQBlockingClient(
+            params, 'queue', 'exchange', 'bueno', batch_size=1000
+        )
+        nmsgs = 10000
+        meas = [datasink.JSONMeasurement({'i': i}, 1.0) for i in range(nmsgs)]
+        assert client.send_batch(meas) == nmsgs
+        assert len(BROKER.messages) == nmsgs // 1000
+        lines = b''.join(BROKER.messages).splitlines()
+        assert [json.loads(ln)['i'] for ln in lines] == list(range(nmsgs))
+        # Line protocol data already end in newlines.
+        BROKER.messages = []
+        idbm = datasink.InfluxDBMeasurement('m', {'v': 1.0})
+        assert client.send_batch([idbm, idbm]) == 2
+        assert BROKER.messages == [idbm.data().encode('utf8') * 2]
+
+        # Batches honor the byte limit, too.
+        BROKER.messages = []
+        client.batch_bytes = 1024
+        assert client.send_batch(meas[:1000]) == 1000
+        assert all(len(m) <= 1024 for m in BROKER.messages)
+        assert len(BROKER.messages) > 1
+
+        # Routing failures are reported per batch.
+        BROKER.routes = set()
+        assert client.send_batch(meas[:10]) == 0
+        BROKER.routes = {'bueno'}
+
+        # Buffered measurements are sent once a limit is reached.
+        BROKER.messages = []
+        client.batch_bytes = 1024 * 1024
+        client.batch_size = 100
+        client.batch_age = 3600.0
+        for mea in meas[:250]:
+            client.add(mea)
+        assert len(BROKER.messages) == 2
+        client.batch_age = 0.1
+        time.sleep(0.2)
+        client.add(meas[250])
+        assert len(BROKER.messages) == 3
+        client.add(meas[251])
+        assert client.flush() == 1
+        client.add(meas[252])
+        client.close()
+        lines = b''.join(BROKER.messages).splitlines()
+        assert [json.loads(ln)['i'] for ln in lines] == list(range(253))
+
+        # Buffered measurements are also sent on age alone.
+        BROKER.messages = []
+        client.add(meas[0])
+        time.sleep(0.5)
+        assert len(BROKER.messages) == 1
+        # Measurements that such sends fail to send stay buffered.
+        BROKER.down = True
+        BROKER.failures = 1
+        client.add(meas[1])
+        time.sleep(0.5)
+        assert len(BROKER.messages) == 1
+        BROKER.down = False
+        assert client.flush() == 1
+
+        # So do those that flushes fail to send, which raise the failure.
+        client.batch_age = 3600.0
+        for mea in meas[2:12]:
+            client.add(mea)
+        BROKER.down = True
+        BROKER.failures = 1
+        try:
+            client.flush()
+            raise AssertionError('connection failure not raised')
+        except pika.exceptions.AMQPConnectionError as exception:
+            logger.log(f'# Expected error: {exception!r}')
+        BROKER.down = False
+        BROKER.failures = 0
+        assert client.flush() == 10
+        client.close()
+        lines = b''.join(BROKER.messages).splitlines()
+        assert [json.loads(ln)['i'] for ln in lines] == list(range(12))
+    finally:
+        pika.BlockingConnection = real
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
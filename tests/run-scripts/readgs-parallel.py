@@ -0,0 +1,63 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Test for experiment.GSExecutor.
+'''
+
+from bueno.public import container
+from bueno.public import experiment
+from bueno.public import logger
+
+
+def run_line(genspec, config):
+    '''
+    Runs a single generate specification line.
+    '''
+    logger.log(f'genspec:    {genspec}')
+    logger.log(f'csv_output: {config.args.csv_output}')
+    container.run(f'sleep 0.2 && echo "{config.args.executable}"')
+    return config.args.csv_output
+
+
+def main(argv):
+    '''
+    main()
+    '''
+    experiment.name('readgs-parallel-test')
+    desc = 'Test for experiment.GSExecutor'
+    defaults = experiment.DefaultCLIConfiguration.Defaults
+    defaults.csv_output = 'data0.csv'
+    defaults.description = desc
+    defaults.name = str(experiment.name())
+    defaults.executable = 'path-to-exe'
+    defaults.input = 'readgs.input'
+    config = experiment.DefaultCLIConfiguration(desc, argv, defaults)
+    config.parseargs()
+
+    # The resolved configurations must match those produced by readgs().
+    expected = []
+    for _ in experiment.readgs(config.args.input, config):
+        expected.append(config.args.csv_output)
+
+    config = experiment.DefaultCLIConfiguration(desc, argv, defaults)
+    config.parseargs()
+    # Every line demands two of four slots, so two lines run at a time.
+    gsx = experiment.GSExecutor(slots=4, demand=lambda g, c: 2)
+    results = gsx.run(config.args.input, run_line, config)
+
+    actual = [res.value for res in results]
+    logger.log(f'# Expected: {expected}')
+    logger.log(f'# Actual:   {actual}')
+    assert actual == expected
+    # The caller's configuration is left untouched.
+    assert config.args.csv_output == 'data0.csv'
+    for res in results:
+        assert res.output[0] == f'genspec:    {res.genspec}'
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
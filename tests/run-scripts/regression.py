@@ -0,0 +1,75 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Tests for regression checks. Usage: regression.py MODE CENTER [BASELINE], where
+MODE is one of record, same, slower, or faster.
+'''
+
+from bueno.public import experiment
+from bueno.public import regression
+
+
+def main(argv):
+    '''
+    main()
+    '''
+    mode = argv[1]
+    center = float(argv[2])
+    experiment.name(f'regression-{mode}')
+    experiment.foutput('%n')
+
+    fomc = experiment.foms()
+    for idx in range(20):
+        jitter = ((idx * 7) % 11 - 5) / 100.0
+        fomc.add(
+            experiment.FOM('runtime', 'Wall time', 's', center + jitter),
+            nprocs=4
+        )
+        fomc.add(
+            experiment.FOM('bandwidth', 'Bandwidth', 'GB/s', 100 / center),
+            nprocs=4
+        )
+    # A single sample, like a command's execution time.
+    fomc.add(experiment.FOM('startup', 'Startup time', 's', center))
+
+    if mode == 'record':
+        return
+
+    for method in ('mannwhitney', 'bootstrap'):
+        verdict = regression.check(
+            argv[3], method=method, higher_is_better=['bandwidth']
+        )
+        bymetric = {m['name']: m['verdict'] for m in verdict.metrics}
+        bymethod = {m['name']: m['method'] for m in verdict.metrics}
+        # Too few samples for a statistical test.
+        assert bymethod == {'runtime': method,
+                            'bandwidth': method,
+                            'startup': 'threshold'}
+        if mode == 'same':
+            assert not verdict.regressed
+            assert bymetric == {'runtime': 'unchanged',
+                                'bandwidth': 'unchanged',
+                                'startup': 'unchanged'}
+        elif mode == 'slower':
+            assert verdict.regressed
+            assert bymetric == {'runtime': 'regression',
+                                'bandwidth': 'regression',
+                                'startup': 'regression'}
+        else:
+            assert not verdict.regressed
+            assert bymetric == {'runtime': 'improvement',
+                                'bandwidth': 'improvement',
+                                'startup': 'improvement'}
+        # Summaries also work as baselines.
+        verdict = regression.check(
+            f'{argv[3]}/foms.yaml', higher_is_better=['bandwidth']
+        )
+        assert verdict.regressed == (mode == 'slower')
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,76 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Tests streaming results writers.
+'''
+
+import csv
+import json
+import os
+import tracemalloc
+
+from bueno.public import experiment
+from bueno.public import logger
+from bueno.public import results
+
+
+def main(argv):
+    '''
+    main()
+    '''
+    experiment.name('results-writer-test')
+    desc = 'Test for streaming results writers'
+    defaults = experiment.DefaultCLIConfiguration.Defaults
+    defaults.csv_output = 'results.csv'
+    defaults.description = desc
+    config = experiment.DefaultCLIConfiguration(desc, argv, defaults)
+    config.parseargs()
+
+    table = config.results_writer({'nodes': int, 'time': float, 'app': str})
+    nrows = 200000
+    tracemalloc.start()
+    for i in range(nrows):
+        table.add(nodes=str(i % 64), time=i * 0.5, app='a')
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    logger.log(f'# Peak Memory Writing {nrows} Rows: {peak} B')
+    # Memory use does not grow with the number of rows.
+    assert peak < 4 * 1024 * 1024
+
+    # Rows may not add columns to a CSV file.
+    if table.fmt == 'csv':
+        try:
+            table.add(nodes=1, time=1.0, app='a', extra=True)
+            raise AssertionError('unknown column not detected')
+        except ValueError as exception:
+            logger.log(f'# Expected error: {exception}')
+
+    ndjson = results.ResultsWriter('results.ndjson', subd='extra')
+    ndjson.add({'step': 0, 'ok': True})
+    ndjson.add(step=1, ok=False, note=None)
+
+    outp = experiment.flush_data()
+    with open(os.path.join(outp, table.fname), encoding='utf8') as file:
+        if table.fmt == 'csv':
+            rows = list(csv.DictReader(file))
+            assert rows[3] == {'nodes': '3', 'time': '1.5', 'app': 'a'}
+        else:
+            rows = [json.loads(line) for line in file]
+            assert rows[3] == {'nodes': 3, 'time': 1.5, 'app': 'a'}
+    assert len(rows) == nrows
+    with open(os.path.join(outp, 'extra', 'results.ndjson'),
+              encoding='utf8') as file:
+        recs = [json.loads(line) for line in file]
+    assert recs == [{'step': 0, 'ok': True},
+                    {'step': 1, 'ok': False, 'note': None}]
+
+    # Rows added after a flush are written by the next one.
+    table.add(nodes=0, time=0.0, app='b')
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,43 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Tests for resultsdb queries. Expects the path to a results database populated
+by runs of foms.py and timing.py.
+'''
+
+from bueno.public import container
+from bueno.public import experiment
+from bueno.public import logger
+from bueno.public import resultsdb
+
+
+def main(argv):
+    '''
+    main()
+    '''
+    experiment.name('resultsdb-test')
+
+    rdb = resultsdb.ResultsDB(argv[1])
+
+    runs = rdb.runs(name='foms-test')
+    logger.log(f'# foms-test runs: {runs}')
+    assert len(runs) >= 1
+
+    foms = rdb.foms(fom='runtime', name='foms-test')
+    assert len(foms) >= 15
+    assert all('nprocs' in row['params'] for row in foms)
+
+    cmdid = container.command_id('sleep 0.1')
+    cmds = rdb.commands(cmd_hash=cmdid)
+    logger.log(f'# Commands matching {cmdid}: {cmds}')
+    assert len(cmds) >= 1
+    assert all(c['exectime_ns'] > 0 for c in cmds)
+    assert not rdb.runs(name='no-such-experiment')
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
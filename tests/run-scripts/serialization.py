@@ -0,0 +1,98 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+# pylint: disable=protected-access
+
+'''
+Benchmarks structured-output serialization: pure-Python YAML, utils.yamls()
+(libyaml when available), and JSON. Usage: serialization.py [SIZE ...], where
+each SIZE is the number of sweep entries in the dictionary serialized.
+'''
+
+import json
+import os
+import tempfile
+
+import yaml
+
+from bueno.public import data
+from bueno.public import experiment
+from bueno.public import logger
+from bueno.public import utils
+
+
+def _config(nentries):
+    '''
+    Returns a dictionary resembling a large sweep configuration along with a
+    captured environment.
+    '''
+    return {
+        'Environment': {f'VAR_{i}': f'/opt/pkg-{i}/bin:/usr/bin'
+                        for i in range(200)},
+        'Sweep': [
+            {
+                'id': i,
+                'command': f'mpirun -n {2 ** (i % 10)} ./app --size {i * 64}',
+                'params': {'nodes': i % 64, 'ppn': 36, 'tol': 1.0e-6 * i},
+                'tags': ['strong', 'scaling', f'group-{i % 7}'],
+                'enabled': i % 3 != 0
+            }
+            for i in range(nentries)
+        ]
+    }
+
+
+def _time(fun, *args, **kwargs):
+    '''
+    Returns the result of fun(*args, **kwargs) and the time it took in seconds.
+    '''
+    with utils.Timer() as timer:
+        res = fun(*args, **kwargs)
+    return res, timer.elapsed
+
+
+def _write(asset, basep):
+    '''
+    Writes the provided asset.
+    '''
+    asset.write(basep)
+
+
+def main(argv):
+    '''
+    main()
+    '''
+    experiment.name('serialization-bench')
+    sizes = [int(s) for s in argv[1:]] or [1000, 10000]
+
+    logger.log(f'# libyaml Available: {yaml.__with_libyaml__}')
+    logger.log(f"# {'Entries':>8} {'PyYAML (s)':>11} {'yamls (s)':>10} "
+               f"{'jsons (s)':>10} {'YAMLDictAsset (s)':>18} "
+               f"{'JSONAsset (s)':>14}")
+    with tempfile.TemporaryDirectory() as tmpd:
+        for size in sizes:
+            cfg = _config(size)
+            pyys, pyyt = _time(
+                yaml.dump, cfg, Dumper=yaml.Dumper, default_flow_style=False
+            )
+            ys, yst = _time(utils.yamls, cfg)
+            js, jst = _time(utils.jsons, cfg)
+            # Both dumpers produce equivalent YAML.
+            assert yaml.safe_load(ys) == yaml.safe_load(pyys)
+            assert json.loads(js) == yaml.safe_load(ys)
+
+            yasset, yat = _time(data.YAMLDictAsset, cfg, 'config')
+            _, yawt = _time(_write, yasset, tmpd)
+            jasset, jat = _time(data.JSONAsset, cfg, 'config')
+            _, jawt = _time(_write, jasset, tmpd)
+            with open(os.path.join(tmpd, 'config.json'), encoding='utf8') as f:
+                assert json.load(f) == json.loads(js)
+            logger.log(f'# {size:>8} {pyyt:>11.4f} {yst:>10.4f} {jst:>10.4f} '
+                       f'{yat + yawt:>18.4f} {jat + jawt:>14.4f}')
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,92 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+# pylint: disable=protected-access
+
+'''
+Tests structured (JSON lines) logging.
+'''
+
+import json
+import os
+import tempfile
+
+from bueno.core import constants
+from bueno.public import archive
+from bueno.public import container
+from bueno.public import data
+from bueno.public import experiment
+from bueno.public import logger
+
+
+def _records(path):
+    '''
+    Returns the records of the structured log at path.
+    '''
+    with open(path, encoding='utf8') as file:
+        return [json.loads(line) for line in file]
+
+
+def main(_):
+    '''
+    main()
+    '''
+    experiment.name('structured-log-test')
+    # Set by bueno run --structured-log.
+    assert logger.structured()
+
+    cmd = 'echo structured; echo output'
+    logger.log('# Before the command')
+    container.run(cmd)
+
+    with tempfile.TemporaryDirectory() as tmpd:
+        pending = data._Assets().assets
+        data._Assets().clear()
+        outd = os.path.join(tmpd, 'out')
+        data.write(outd)
+        logp = os.path.join(outd, constants.SERVICE_JSONL_LOG_NAME)
+        recs = _records(logp)
+        keys = {'mono', 'wall', 'source', 'command', 'level', 'msg'}
+        assert all(set(r) == keys for r in recs)
+        assert all(r['level'] == 'INFO' for r in recs)
+        # Messages were logged by this thread, so their timestamps are
+        # ordered.
+        monos = [r['mono'] for r in recs]
+        assert monos == sorted(monos)
+        prog = [r for r in recs if r['source'] == 'program']
+        assert [r['msg'] for r in prog] == ['structured', 'output']
+        assert all(r['command'] == container.command_id(cmd) for r in prog)
+        before = [r for r in recs if r['msg'] == '# Before the command']
+        assert before[0]['source'] == 'bueno' and before[0]['command'] is None
+        # The write statistics are logged before the logs are written.
+        assert any(r['msg'].startswith('# Wrote ') for r in recs)
+
+        # Later writes append.
+        logger.log('# After the first write')
+        data.write(outd)
+        recs2 = _records(logp)
+        assert recs2[:len(recs)] == recs
+        assert any(r['msg'] == '# After the first write' for r in recs2)
+        assert data.verify(outd) == []
+
+        # Archives hold the structured log, too.
+        data.archive_output('none')
+        path = data.write(os.path.join(tmpd, 'arch'))
+        data._Assets().archive = None
+        jlog = archive.Archive(path).read(constants.SERVICE_JSONL_LOG_NAME)
+        assert b'# After the first write' in jlog
+        data._Assets().assets = pending
+
+    # Disabled structured logging records nothing more.
+    logger.structured(False)
+    size = logger.snapshot(structured_log=True)[1]
+    logger.log('# Not recorded')
+    assert logger.snapshot(structured_log=True)[1] == size
+    logger.structured(True)
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
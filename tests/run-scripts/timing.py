@@ -0,0 +1,57 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+'''
+Tests for timing utilities.
+'''
+
+from bueno.public import container
+from bueno.public import experiment
+from bueno.public import logger
+from bueno.public import utils
+
+
+def post_action(**kwargs):
+    '''
+    Checks timing values provided to post-actions.
+    '''
+    tns = kwargs.pop('exectime_ns')
+    tet = kwargs.pop('exectime')
+    stm = kwargs.pop('start_time')
+    etm = kwargs.pop('end_time')
+    logger.log(f'# exectime_ns={tns} exectime={tet} start={stm} end={etm}')
+    assert isinstance(tns, int) and tns > 0
+    assert tet == tns / 1e9
+    assert stm <= etm
+
+
+def main(_):
+    '''
+    main()
+    '''
+    experiment.name('timing-test')
+
+    container.run('sleep 0.1', postaction=post_action)
+
+    with utils.Timer(wallclock=True) as timer:
+        pass
+    assert timer.elapsed_ns >= 0
+    assert timer.start_time <= timer.end_time
+
+    phases = utils.PhaseTimer()
+    for _ in range(1000):
+        with phases.phase('loop'):
+            pass
+        start = utils.ticks()
+        phases.add('manual', utils.ticks() - start)
+    res = phases.results()
+    logger.log(f'# Phases: {res}')
+    assert res['loop']['count'] == 1000
+    assert res['manual']['total'] >= 0
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab
@@ -0,0 +1,80 @@
+#
+# Copyright (c)      2023 Triad National Security, LLC
+#                         All rights reserved.
+#
+# This file is part of the bueno project. See the LICENSE file at the
+# top-level directory of this distribution for more information.
+#
+
+# pylint: disable=protected-access
+
+'''
+Tests flattening of nested measurement values. Usage: unroll-dict.py [N],
+where N is the number of nested dictionaries in the timed payload (default:
+10000).
+'''
+
+import copy
+
+from bueno.public import datasink
+from bueno.public import logger
+from bueno.public import utils
+
+
+def _expect_error(indict, msg):
+    '''
+    Checks that flattening indict fails with the provided message.
+    '''
+    try:
+        datasink._unroll_dict(indict)
+        raise AssertionError(f'duplicate not detected in {indict}')
+    except ValueError as exception:
+        assert str(exception) == msg, str(exception)
+
+
+def main(argv):
+    '''
+    main()
+    '''
+    nested = {'a': {'b': 1, 'c': {'d': 'Double Nest'}}, 'e': 10.1, 'f': {}}
+    orig = copy.deepcopy(nested)
+    flat = datasink._unroll_dict(nested)
+    # Keys are ordered breadth first, and the input is left untouched.
+    assert list(flat.items()) == [
+        ('e', 10.1), ('a_b', 1), ('a_c_d', 'Double Nest')
+    ]
+    assert nested == orig
+
+    # Generated keys may not duplicate pending or produced keys.
+    _expect_error(
+        {'a': {'b': 1, 'c': True}, 'a_c': False},
+        'Duplicate key generated for {a_c: True}. Previous value was False.'
+    )
+    _expect_error(
+        {'a_b': 1, 'a': {'b': 2}},
+        'Duplicate key generated for {a_b: 2}. Previous value was 1.'
+    )
+    # Unless they are expanded into other keys.
+    assert datasink._unroll_dict({'a_b': 1, 'a': {'b': {'c': 2}}}) == \
+        {'a_b': 1, 'a_b_c': 2}
+
+    # Deep nesting does not exhaust the stack.
+    deep = {}
+    cur = deep
+    for _ in range(10000):
+        cur['k'] = {}
+        cur = cur['k']
+    cur['v'] = 1
+    assert datasink._unroll_dict(deep) == {'_'.join(['k'] * 10000 + ['v']): 1}
+
+    # Flattening time grows linearly with the payload.
+    nnested = int(argv[1]) if len(argv) > 1 else 10000
+    payload = {f'm{i}': {'min': i, 'max': i, 'stats': {'avg': i, 'sd': 0.0}}
+               for i in range(nnested)}
+    with utils.Timer() as timer:
+        flat = datasink._unroll_dict(payload)
+    assert len(flat) == 4 * nnested
+    logger.log(f'# Flattened {nnested} Nested Dictionaries '
+               f'({len(flat)} Values) in {timer.elapsed:.4f} s')
+
+# vim: ft=python ts=4 sts=4 sw=4 expandtab